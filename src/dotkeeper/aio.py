@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from functools import partial
+from typing import TYPE_CHECKING
+
+from .links import LinkState
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+
+    import anyio
+
+    from .links import FileOps, SyscallCounter
+    from .state import LinkIndex
+
+# Filesystem calls kept in flight when no limit is given. Network filesystems serve many concurrent
+# requests well; the local kernel does not mind either.
+DEFAULT_LIMIT = 64
+
+
+class OperationTimeoutError(TimeoutError):
+    """Raised when filesystem operations did not finish within their timeout."""
+
+    def __init__(self, paths: Iterable[Path | str], timeout: float) -> None:
+        self.paths = sorted(str(path) for path in paths)
+        self.timeout = timeout
+        super().__init__(f'No response within {timeout:g}s for {", ".join(self.paths)}')
+
+
+class LatencyFS:
+    """The local filesystem with a fixed delay added to every call, like an NFS or SSHFS home.
+
+    The delay blocks the calling thread, as a network round trip does. Calls in flight are tracked, so tests
+    and benchmarks can check how much concurrency a backend achieves.
+
+    Parameters
+    ----------
+    latency : float
+        Delay per call, in seconds
+    """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _call[T](self, fn: Callable[[Path | str], T], path: Path | str) -> T:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return fn(path)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stat(self, path: Path | str) -> os.stat_result:
+        return self._call(os.stat, path)
+
+    def lstat(self, path: Path | str) -> os.stat_result:
+        return self._call(os.lstat, path)
+
+    def readlink(self, path: Path | str) -> str:
+        return self._call(os.readlink, path)
+
+
+async def run_blocking[T](
+    fn: Callable[[], T],
+    *,
+    limiter: anyio.CapacityLimiter,
+    timeout: float | None = None,  # noqa: ASYNC109 - applies to the one call, not to the caller
+    abandon: bool = True,
+) -> T:
+    """Run a blocking filesystem call in a worker thread.
+
+    Parameters
+    ----------
+    fn : Callable[[], T]
+        Call to run
+    limiter : anyio.CapacityLimiter
+        Bounds the number of calls in flight
+    timeout : float | None, default=None
+        Seconds to wait for the call; ``None`` waits forever
+    abandon : bool, default=True
+        Stop waiting for a call that timed out and let it finish in the background; calls that modify the
+        filesystem must not be abandoned, so their timeout is only reported once they are done
+
+    Returns
+    -------
+    T
+        Result of the call
+
+    Raises
+    ------
+    TimeoutError
+        If the call did not finish in time
+    """
+
+    import anyio
+    import anyio.to_thread
+
+    with anyio.fail_after(timeout):
+        return await anyio.to_thread.run_sync(fn, limiter=limiter, abandon_on_cancel=abandon)
+
+
+async def scan_links_async(
+    pairs: Iterable[tuple[Path, Path]],
+    *,
+    limit: int | None = None,
+    timeout: float | None = None,  # noqa: ASYNC109 - applies to each link, not to the whole scan
+    counter: SyscallCounter | None = None,
+    index: LinkIndex | None = None,
+    fs: FileOps | None = None,
+) -> list[LinkState]:
+    """Classify links with many of them in flight at once, see `scan_links`."""
+    import anyio
+
+    scan = index.scan if index is not None else LinkState.scan
+    pairs = list(pairs)
+    limiter = anyio.CapacityLimiter(limit or DEFAULT_LIMIT)
+    states: list[LinkState | None] = [None] * len(pairs)
+    timed_out: list[Path] = []
+
+    async def _scan(i: int, source: Path, target: Path) -> None:
+        try:
+            states[i] = await run_blocking(
+                partial(scan, source, target, counter=counter, fs=fs), limiter=limiter, timeout=timeout
+            )
+        except TimeoutError:
+            timed_out.append(source)
+
+    async with anyio.create_task_group() as tg:
+        for i, (source, target) in enumerate(pairs):
+            tg.start_soon(_scan, i, source, target)
+
+    if timed_out:
+        raise OperationTimeoutError(timed_out, timeout or 0)
+    return [state for state in states if state is not None]
+
+
+def scan_links(
+    pairs: Iterable[tuple[Path, Path]],
+    *,
+    limit: int | None = None,
+    timeout: float | None = None,
+    counter: SyscallCounter | None = None,
+    index: LinkIndex | None = None,
+    fs: FileOps | None = None,
+) -> list[LinkState]:
+    """Classify links on an event loop that keeps up to ``limit`` filesystem calls in flight.
+
+    Every link is classified exactly like `LinkState.scan` (or `LinkIndex.scan`) does, in a worker thread,
+    so the results are identical to a synchronous scan; only the scheduling differs. On high-latency
+    filesystems the scan takes about as long as the slowest ``len(pairs) / limit`` links instead of all of
+    them.
+
+    Parameters
+    ----------
+    pairs : Iterable[tuple[Path, Path]]
+        Expanded ``(source, target)`` paths
+    limit : int | None, default=None
+        Links classified concurrently, defaults to `DEFAULT_LIMIT`
+    timeout : float | None, default=None
+        Seconds to wait for each link; ``None`` waits forever
+    counter : SyscallCounter | None, default=None
+        Counter to record the issued filesystem calls in
+    index : LinkIndex | None, default=None
+        Persistent index to reuse unchanged link states from and record new ones in
+    fs : FileOps | None, default=None
+        Filesystem to query, e.g. a `LatencyFS`
+
+    Returns
+    -------
+    list[LinkState]
+        State of every link, in the order of ``pairs``
+
+    Raises
+    ------
+    OperationTimeoutError
+        If any link took longer than ``timeout``, listing all of them
+    """
+
+    import anyio
+
+    return anyio.run(
+        partial(scan_links_async, pairs, limit=limit, timeout=timeout, counter=counter, index=index, fs=fs)
+    )
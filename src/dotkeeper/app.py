@@ -0,0 +1,828 @@
+from __future__ import annotations
+
+import os
+import shutil
+import socket
+import sys
+import time
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from cyclopts import App
+
+from .bench import bench
+from .config import get_app_version
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from .backupstore import BackupStore
+    from .credentials import CredentialResolver
+    from .models import Config
+    from .vault import SecretsReport, SecretStore
+
+app = App(
+    name='dk',
+    version=get_app_version,
+)
+app.command(bench)
+
+secrets = App(name='secrets', help='Keep sensitive dotfiles encrypted with age.')
+app.command(secrets)
+
+backup = App(name='backup', help='Inspect and restore the files replaced by symlinks.')
+app.command(backup)
+
+
+@cache
+def get_console(*, stderr: bool = False) -> Console:
+    """Get the Rich console shared by all commands.
+
+    Parameters
+    ----------
+    stderr : bool, default=False
+        Write to standard error, for commands that emit data on standard output
+
+    Returns
+    -------
+    Console
+        Console honouring ``NO_COLOR``
+    """
+
+    from rich.console import Console
+
+    return Console(
+        no_color=os.getenv('NO_COLOR') is not None,
+        force_terminal=True,
+        stderr=stderr,
+    )
+
+
+@app.command
+def create_config_file(*, overwrite: bool = False) -> None:
+    import yaml
+
+    from .cli import resolve
+    from .config import get_default_config
+
+    console = get_console()
+    cwd = resolve(Path.cwd(), resolve_links=True)
+    cfg_file = cwd / 'dotkeeper.yml'
+    if not cfg_file.exists() or overwrite:
+        cfg_file.write_text(yaml.safe_dump(get_default_config().model_dump()))
+        console.print(f'[green]Wrote config file to: {cfg_file}[/green]')
+    elif cfg_file.exists():
+        console.print(f'[yellow]Refusing to overwrite existing config file: {cfg_file} [/yellow]')
+        console.print('[yellow]Use flag --overwrite to force.[/yellow]')
+
+
+def _find_config_file() -> Path:
+    from dotenv import load_dotenv
+
+    from .cli import get_config_file_path, resolve
+
+    load_dotenv()
+
+    _here: Path = Path(__file__).resolve().parent
+    if _project_root := os.getenv('PROJECT_ROOT'):
+        project_root: Path = resolve(_project_root)
+    else:
+        project_root: Path = _here.parents[1]
+
+    os.environ['PROJECT_ROOT'] = str(project_root)
+    _maybe_config_names: tuple[str, ...] = (
+        'config.yml',
+        'config.yaml',
+        'dotkeeper.yml',
+        'dotkeeper.yaml',
+        'dotkeeper_config.yml',
+        'dotkeeper_config.yaml',
+    )
+    maybe_configs: list[Path | str] = [Path(project_root, fn) for fn in _maybe_config_names]
+    return get_config_file_path(maybe_configs)
+
+
+def load_config(console: Console, profile: str | None = None) -> Config | None:
+    """Locate and load the DotKeeper configuration.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    profile : str | None, default=None
+        Profile to flatten the configuration for, defaults to ``DOTKEEPER_PROFILE``; the overlay of the
+        current host is always applied
+
+    Returns
+    -------
+    Config | None
+        Loaded configuration, the default configuration if none exists yet, or ``None`` if loading failed
+    """
+
+    from .cli import load_yaml_config
+    from .config import ensure_config_exists, get_default_config
+
+    try:
+        return load_yaml_config(
+            _find_config_file(),
+            profile=profile or os.getenv('DOTKEEPER_PROFILE'),
+            host=socket.gethostname(),
+        )
+    except FileNotFoundError:
+        console.print('[yellow]No config file found. Creating default config...[/yellow]')
+        config_file = ensure_config_exists()
+        console.print(f'[green]Created default config at {config_file}[/green]')
+        return get_default_config()
+    except Exception as e:
+        console.print(f'[red]Error loading config: {e}[/red]')
+        return None
+
+
+def _open_resolver(config: Config) -> CredentialResolver:
+    from .credentials import CredentialCache, CredentialResolver
+
+    ttl = config.dotfiles.secrets.cache_ttl
+    return CredentialResolver(cache=CredentialCache(ttl) if ttl else None)
+
+
+def _ask_passphrase(config: Config | None = None) -> str:
+    if (passphrase := os.getenv('DOTKEEPER_AGE_PASSPHRASE')) is not None:
+        return passphrase
+    if config is not None and (ref := config.dotfiles.secrets.passphrase):
+        with _open_resolver(config) as resolver:
+            return resolver.resolve(ref)
+
+    from rich.prompt import Prompt
+
+    return Prompt.ask('Passphrase for the age identity', password=True, console=get_console(stderr=True))
+
+
+def _open_secret_store(config: Config, *, workers: int | None = None) -> tuple[SecretStore, list[Path]]:
+    from .cli import resolve
+    from .vault import SecretStore
+
+    settings = config.dotfiles.secrets
+    store = SecretStore(
+        resolve(settings.identity) if settings.identity else None,
+        settings.recipients,
+        passphrase=lambda: _ask_passphrase(config),
+        workers=workers,
+    )
+    return store, [resolve(name) for name in config.dotfiles.obfuscate.get('file_names', [])]
+
+
+def _print_secrets_report(
+    console: Console, report: SecretsReport, direction: Literal['encrypt', 'decrypt']
+) -> None:
+    for path in report.results.get('modified', []):
+        console.print(f'[yellow]{path} was edited since it was decrypted; run `dk secrets encrypt`[/yellow]')
+    missing = 'encrypted copy' if direction == 'decrypt' else 'file'
+    for path in report.results.get('missing', []):
+        console.print(f'[yellow]{path}: no {missing} to {direction}[/yellow]')
+    summary = ', '.join(f'{outcome}: {len(paths)}' for outcome, paths in sorted(report.results.items()))
+    console.print(f'[dim]Secrets: {summary or "none configured"}[/dim]')
+
+
+def _sync_secrets(
+    console: Console,
+    config: Config,
+    direction: Literal['encrypt', 'decrypt'],
+    *,
+    workers: int | None = None,
+) -> bool:
+    import pyrage
+
+    store, paths = _open_secret_store(config, workers=workers)
+    try:
+        report = store.decrypt(paths) if direction == 'decrypt' else store.encrypt(paths)
+    except (OSError, ValueError, LookupError, pyrage.DecryptError, pyrage.EncryptError) as e:
+        console.print(f'[red]Could not {direction} secrets: {e}[/red]')
+        return False
+    _print_secrets_report(console, report, direction)
+    return True
+
+
+def _render_templates(console: Console, config: Config, *, workers: int | None = None) -> bool:
+    from .cli import resolve
+    from .gitstate import GitChanges
+    from .templates import TemplateEngine
+
+    templates = {resolve(output): resolve(source) for output, source in config.dotfiles.templates.items()}
+    with _open_resolver(config) as resolver:
+        root = resolve(project_root) if (project_root := os.getenv('PROJECT_ROOT')) else None
+        repo = GitChanges.open(root) if root is not None else None
+        engine = TemplateEngine(templates, resolver=resolver, root=root, workers=workers, repo=repo)
+        report = engine.render()
+    for path in report.results.get('rendered', []):
+        console.print(f'[green]Rendered {path}[/green]')
+    for error in report.errors.values():
+        console.print(f'[red]Could not render {error}[/red]')
+    summary = ', '.join(f'{outcome}: {len(paths)}' for outcome, paths in sorted(report.results.items()))
+    console.print(f'[dim]Templates: {summary}[/dim]')
+    return not report.errors
+
+
+@secrets.command
+def keygen(*, identity: Path | None = None) -> int:
+    """Create the age identity used to encrypt and decrypt secrets.
+
+    Parameters
+    ----------
+    identity : Path | None
+        Where to write the identity; defaults to ``dotfiles.secrets.identity`` from the config, or
+        ``identity.txt`` in the config directory
+    """
+
+    from .cli import resolve
+    from .vault import generate_identity, get_identity_path
+
+    console = get_console()
+    if identity is None and (config := load_config(console)) is not None and config.dotfiles.secrets.identity:
+        identity = resolve(config.dotfiles.secrets.identity)
+    identity = identity or get_identity_path()
+
+    try:
+        recipient = generate_identity(identity)
+    except FileExistsError:
+        console.print(f'[red]{identity} already exists[/red]')
+        return 1
+    console.print(f'[green]Wrote identity to {identity}[/green]')
+    console.print(f'Public key: {recipient}')
+    return 0
+
+
+@secrets.command
+def encrypt(*, workers: int | None = None) -> int:
+    """Encrypt the files listed in ``dotfiles.obfuscate.file_names`` that changed since the last run.
+
+    Parameters
+    ----------
+    workers : int | None
+        Number of files processed in parallel
+    """
+
+    console = get_console()
+    if (config := load_config(console)) is None:
+        return 1
+    return 0 if _sync_secrets(console, config, 'encrypt', workers=workers) else 1
+
+
+@secrets.command
+def decrypt(*, workers: int | None = None) -> int:
+    """Decrypt the files listed in ``dotfiles.obfuscate.file_names`` whose encrypted copy changed.
+
+    Plaintext edited since it was last decrypted is left alone. ``dk apply`` does this automatically.
+
+    Parameters
+    ----------
+    workers : int | None
+        Number of files processed in parallel
+    """
+
+    console = get_console()
+    if (config := load_config(console)) is None:
+        return 1
+    return 0 if _sync_secrets(console, config, 'decrypt', workers=workers) else 1
+
+
+@secrets.command
+def forget(*refs: str) -> int:
+    """Remove secrets fetched from 1Password or keyring from the local credential cache.
+
+    Parameters
+    ----------
+    refs : str
+        References to forget, e.g. ``op://vault/item/field``; everything if none are given
+    """
+
+    from .credentials import CredentialCache
+
+    console = get_console()
+    cache = CredentialCache(0)
+    count = cache.evict(refs or None)
+    cache.flush()
+    console.print(f'[green]Removed {count} cached secrets[/green]')
+    return 0
+
+
+def _open_backup_store(config: Config | None) -> BackupStore:
+    from .backupstore import BackupStore
+    from .cli import resolve
+
+    path = config.dotfiles.backups.path if config is not None else None
+    return BackupStore(resolve(path) if path else None)
+
+
+def _collect_garbage(
+    console: Console, store: BackupStore, max_size: int | None, *, quiet: bool = False
+) -> None:
+    from .backup import format_size
+
+    report = store.gc(max_size)
+    if report.snapshots or not quiet:
+        console.print(
+            f'[dim]Removed {len(report.snapshots)} backups and {report.blobs} blobs, '
+            f'{format_size(report.bytes_freed)} freed[/dim]'
+        )
+
+
+@backup.command(name='list')
+def list_backups() -> int:
+    """List the stored backups, oldest first."""
+
+    from .backup import format_size
+
+    console = get_console()
+    store = _open_backup_store(load_config(console))
+    snapshots = store.snapshots()
+    if not snapshots:
+        console.print('[yellow]No backups stored.[/yellow]')
+        return 0
+
+    for snapshot in snapshots:
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.created_ns / 1e9))
+        console.print(
+            f'[bold]{snapshot.id}[/bold]  {created}  {snapshot.host}  {format_size(snapshot.size)}',
+            highlight=False,
+        )
+        for root in snapshot.roots:
+            console.print(f'  {root}', highlight=False)
+    console.print(f'[dim]{len(snapshots)} backups, {format_size(store.size())} stored[/dim]')
+    return 0
+
+
+@backup.command
+def restore(snapshot: str, *paths: Path, to: Path | None = None, force: bool = False) -> int:
+    """Restore files from a backup.
+
+    Parameters
+    ----------
+    snapshot : str
+        Backup id, or a unique prefix of it
+    paths : Path
+        Original paths to restore, with everything below them; the whole backup if none are given
+    to : Path | None
+        Restore below this directory, under the original paths, instead of in place
+    force : bool
+        Replace files and symlinks that exist where a backed up file is restored
+    """
+
+    from .cli import resolve
+
+    console = get_console()
+    store = _open_backup_store(load_config(console))
+    try:
+        restored, skipped = store.restore(
+            store.find(snapshot), [resolve(path) for path in paths], destination=to, overwrite=force
+        )
+    except (OSError, ValueError) as e:
+        console.print(f'[red]Could not restore: {e}[/red]')
+        return 1
+
+    for path in restored:
+        console.print(f'[green]Restored {path}[/green]')
+    for path in skipped:
+        console.print(f'[yellow]Skipped {path}, it already exists (use --force to replace it)[/yellow]')
+    return 0
+
+
+@backup.command
+def gc(*, max_size: str | None = None) -> int:
+    """Delete the oldest backups beyond the size limit, and data no backup refers to.
+
+    Parameters
+    ----------
+    max_size : str | None
+        Size limit such as ``500MiB``; defaults to ``dotfiles.backups.max_size`` from the config
+    """
+
+    from pydantic import ByteSize, TypeAdapter, ValidationError
+
+    console = get_console()
+    config = load_config(console)
+    try:
+        limit = TypeAdapter(ByteSize).validate_python(max_size) if max_size is not None else None
+    except ValidationError:
+        console.print(f'[red]Invalid size: {max_size}[/red]')
+        return 1
+    if limit is None and config is not None:
+        limit = config.dotfiles.backups.max_size
+    _collect_garbage(console, _open_backup_store(config), limit)
+    return 0
+
+
+@app.command
+def apply(
+    *,
+    workers: int | None = None,
+    full: bool = False,
+    plan: Path | None = None,
+    yes: bool = False,
+    profile: str | None = None,
+    trace: Path | None = None,
+    roots: str | None = None,
+    roots_file: Path | None = None,
+    processes: int | None = None,
+    async_io: bool = False,
+    timeout: float | None = None,
+) -> int:
+    """Create, update and repair the configured symlinks.
+
+    Parameters
+    ----------
+    workers : int | None
+        Number of threads used to scan link status; overrides ``dotfiles.workers`` from the config
+    full : bool
+        Re-check every link instead of trusting the link-state cache from the previous run
+    plan : Path | None
+        Apply a plan written by ``dk plan`` instead of scanning the configuration
+    yes : bool
+        Do not prompt for confirmation
+    profile : str | None
+        Profile to apply, see ``dotfiles.profiles``; defaults to ``DOTKEEPER_PROFILE``
+    trace : Path | None
+        Record how long each phase took, with its filesystem calls and bytes copied, as a Chrome trace-event
+        file, or as JSON log lines if the name ends in ``.jsonl``
+    roots : str | None
+        Comma-separated home directories to apply the config to instead of the current one, e.g. for
+        service accounts or container images; ``$HOME`` and ``~`` in the config stand for each root
+    roots_file : Path | None
+        File listing more home directories, one per line
+    processes : int | None
+        Number of roots handled in parallel; defaults to the number of CPUs
+    async_io : bool
+        Keep up to ``workers`` filesystem operations in flight on an async event loop, for homes on slow
+        network filesystems
+    timeout : float | None
+        With ``--async-io``, give up on a link whose filesystem operations take longer than this many seconds
+    """
+
+    from . import tracing
+
+    console = get_console()
+    with tracing.trace(trace), tracing.span('dk apply', profile=profile, full=full):
+        if roots or roots_file:
+            status = _apply_fleet(
+                console, roots, roots_file, workers=workers, processes=processes, yes=yes, profile=profile
+            )
+        else:
+            status = _apply(
+                console,
+                workers=workers,
+                full=full,
+                plan=plan,
+                yes=yes,
+                profile=profile,
+                async_io=async_io,
+                timeout=timeout,
+            )
+    if trace is not None:
+        console.print(f'[dim]Wrote trace to {trace}[/dim]')
+    return status
+
+
+def _apply_fleet(
+    console: Console,
+    roots: str | None,
+    roots_file: Path | None,
+    *,
+    workers: int | None,
+    processes: int | None,
+    yes: bool,
+    profile: str | None,
+) -> int:
+    from .cli import resolve
+    from .fleet import apply_fleet, read_roots
+
+    try:
+        homes = read_roots(roots, roots_file)
+        config_path = _find_config_file()
+    except OSError as e:
+        console.print(f'[red]Error: {e}[/red]')
+        return 1
+    if not homes:
+        console.print('[red]No roots given[/red]')
+        return 1
+
+    # Settings shared by every root, like the backup store, come from the config for the current home.
+    if (config := load_config(console, profile)) is None:
+        return 1
+    store_root = resolve(config.dotfiles.backups.path) if config.dotfiles.backups.path else None
+    ok = apply_fleet(
+        console,
+        config_path,
+        homes,
+        profile=profile or os.getenv('DOTKEEPER_PROFILE'),
+        host=socket.gethostname(),
+        workers=workers or config.dotfiles.workers,
+        processes=processes,
+        assume_yes=yes,
+        store_root=store_root,
+    )
+    _collect_garbage(console, _open_backup_store(config), config.dotfiles.backups.max_size, quiet=True)
+    return 0 if ok else 1
+
+
+def _apply(
+    console: Console,
+    *,
+    workers: int | None,
+    full: bool,
+    plan: Path | None,
+    yes: bool,
+    profile: str | None,
+    async_io: bool = False,
+    timeout: float | None = None,
+) -> int:
+    from . import tracing
+
+    if plan is not None:
+        from .plan import apply_plan, load_plan
+
+        try:
+            change_plan = load_plan(plan)
+        except (OSError, ValueError) as e:
+            console.print(f'[red]Error loading plan: {e}[/red]')
+            return 1
+        store = _open_backup_store(load_config(console, profile))
+        return 1 if apply_plan(console, change_plan, assume_yes=yes, store=store) else 0
+
+    from .aio import OperationTimeoutError
+    from .cli import manage_symlinks
+
+    if (config := load_config(console, profile)) is None:
+        return 1
+
+    if config.dotfiles.obfuscate.get('file_names'):
+        with tracing.span('secrets'):
+            if not _sync_secrets(console, config, 'decrypt'):
+                return 1
+
+    if config.dotfiles.templates:
+        with tracing.span('render', templates=len(config.dotfiles.templates)):
+            if not _render_templates(console, config):
+                return 1
+
+    links_config = config.all_links()
+    console.print('[bold cyan]Managing symlinks...[/bold cyan]')
+
+    store = _open_backup_store(config)
+    try:
+        manage_symlinks(
+            console=console,
+            config=links_config,
+            workers=workers or config.dotfiles.workers,
+            full=full,
+            assume_yes=yes,
+            store=store,
+            async_io=async_io,
+            timeout=timeout,
+        )
+    except OperationTimeoutError as e:
+        console.print(f'[red]Error: {e}[/red]')
+        return 1
+
+    if copies := config.copies():
+        from .sync import sync_copies
+
+        console.print('[bold cyan]Syncing copies...[/bold cyan]')
+        with tracing.span('copy', copies=len(copies)):
+            if not sync_copies(
+                console, copies, workers=workers or config.dotfiles.workers, assume_yes=yes, store=store
+            ):
+                return 1
+
+    with tracing.span('backup.gc'):
+        _collect_garbage(console, store, config.dotfiles.backups.max_size, quiet=True)
+
+    return 0
+
+
+@app.command
+def render(*, workers: int | None = None, profile: str | None = None) -> int:
+    """Render the templates in ``dotfiles.templates``, rewriting only the outputs that changed.
+
+    ``dk apply`` does this automatically, before linking.
+
+    Parameters
+    ----------
+    workers : int | None
+        Number of templates rendered in parallel
+    profile : str | None
+        Profile to render, see ``dotfiles.profiles``; defaults to ``DOTKEEPER_PROFILE``
+    """
+
+    console = get_console()
+    if (config := load_config(console, profile)) is None:
+        return 1
+    return 0 if _render_templates(console, config, workers=workers) else 1
+
+
+@app.command
+def plan(
+    *, output: Path | None = None, workers: int | None = None, full: bool = False, profile: str | None = None
+) -> int:
+    """Write the changes ``dk apply`` would make as a JSON plan.
+
+    Parameters
+    ----------
+    output : Path | None
+        File to write the plan to; the plan goes to standard output (and messages to standard error) if unset
+    workers : int | None
+        Number of threads used to scan link status; overrides ``dotfiles.workers`` from the config
+    full : bool
+        Re-check every link instead of trusting the link-state cache from the previous run
+    profile : str | None
+        Profile to apply, see ``dotfiles.profiles``; defaults to ``DOTKEEPER_PROFILE``
+    """
+
+    from .cli import collect_link_states
+    from .plan import build_plan, dump_plan
+    from .render import StatusRenderer, TableRenderer
+
+    console = get_console(stderr=output is None)
+    if (config := load_config(console, profile)) is None:
+        return 1
+
+    # The status table is streamed while scanning, unless the plan itself goes to standard output.
+    with TableRenderer(console) if output is not None else StatusRenderer() as renderer:
+        states = collect_link_states(
+            console,
+            config.all_links(),
+            workers=workers or config.dotfiles.workers,
+            full=full,
+            on_state=renderer.add,
+        )
+    change_plan = build_plan(states)
+
+    if output is None:
+        sys.stdout.buffer.write(dump_plan(change_plan))
+        sys.stdout.flush()
+    else:
+        output.write_bytes(dump_plan(change_plan))
+        console.print(f'[green]Wrote plan with {len(change_plan.links)} changes to {output}[/green]')
+
+    if change_plan.missing_targets:
+        console.print(f'[yellow]{len(change_plan.missing_targets)} planned targets do not exist[/yellow]')
+    return 0
+
+
+@app.command
+def diff(*paths: Path, workers: int | None = None, full: bool = False, profile: str | None = None) -> int:
+    """Show how real files standing where links belong differ from their targets.
+
+    Exits with 1 if any of them differ, like ``diff``; identical ones are replaced without a backup by
+    ``dk apply``.
+
+    Parameters
+    ----------
+    paths : Path
+        Link paths to compare; every conflicting link if none are given
+    workers : int | None
+        Number of threads used to scan and compare; overrides ``dotfiles.workers`` from the config
+    full : bool
+        Re-check every link instead of trusting the link-state cache from the previous run
+    profile : str | None
+        Profile to compare, see ``dotfiles.profiles``; defaults to ``DOTKEEPER_PROFILE``
+    """
+
+    from .cli import collect_link_states, resolve
+    from .diff import compare_states, print_comparisons
+
+    console = get_console()
+    if (config := load_config(console, profile)) is None:
+        return 1
+
+    workers = workers or config.dotfiles.workers
+    states = collect_link_states(console, config.all_links(), workers=workers, full=full)
+    conflicts = [states[i] for i in states.indices('NONLINK')]
+    if paths:
+        wanted = {resolve(path).absolute() for path in paths}
+        conflicts = [state for state in conflicts if state.source in wanted]
+    if not conflicts:
+        console.print('[green]No conflicting files[/green]')
+        return 0
+
+    comparisons = compare_states(conflicts, workers=workers)
+    print_comparisons(console, comparisons)
+    return 0 if all(comparison.identical for comparison in comparisons) else 1
+
+
+@app.command
+def status(
+    *,
+    format: Literal['table', 'summary', 'jsonl'] = 'table',  # noqa: A002
+    page_size: int | None = None,
+    watch: bool = False,
+    repair: bool = False,
+    workers: int | None = None,
+    full: bool = False,
+    profile: str | None = None,
+) -> int:
+    """Show the status of the configured symlinks, optionally watching them for drift.
+
+    Rows are printed as links are scanned, in configuration order.
+
+    Parameters
+    ----------
+    format : Literal['table', 'summary', 'jsonl']
+        ``table`` for one row per link, ``summary`` for counts per status, or ``jsonl`` for one JSON object
+        per link on standard output (messages go to standard error)
+    page_size : int | None
+        Repeat the table header every this many rows
+    watch : bool
+        Keep running and report links that change, using inotify on their parent directories (Linux only)
+    repair : bool
+        With ``--watch``, re-link sources that drift away from their target
+    workers : int | None
+        Number of threads used to scan link status; overrides ``dotfiles.workers`` from the config
+    full : bool
+        Re-check every link instead of trusting the link-state cache from the previous run
+    profile : str | None
+        Profile to show, see ``dotfiles.profiles``; defaults to ``DOTKEEPER_PROFILE``
+    """
+
+    from .cli import collect_link_states
+    from .render import get_renderer
+
+    console = get_console(stderr=format == 'jsonl')
+    if (config := load_config(console, profile)) is None:
+        return 1
+
+    with get_renderer(format, console, page_size=page_size) as renderer:
+        states = collect_link_states(
+            console,
+            config.all_links(),
+            workers=workers or config.dotfiles.workers,
+            full=full,
+            on_state=renderer.add,
+        )
+    if not watch:
+        return 1 if states.indices('MISSING', 'NONLINK', 'INCORRECT') else 0
+
+    from .watch import watch_links
+
+    try:
+        watch_links(
+            console,
+            [(state.source, state.target) for state in states],
+            states,
+            repair=repair,
+            store=_open_backup_store(config),
+        )
+    except OSError as e:
+        console.print(f'[red]Cannot watch links: {e}[/red]')
+        return 1
+    return 0
+
+
+@app.command
+def recover(*, rollback: bool = False) -> int:
+    """Finish or undo ``dk apply`` runs that were interrupted.
+
+    By default every interrupted transaction is rolled forward, creating the links it had planned. Originals
+    are restored from the transaction's backups instead when rolling back.
+
+    Parameters
+    ----------
+    rollback : bool
+        Undo interrupted transactions instead of completing them
+    """
+
+    from .journal import Transaction
+
+    console = get_console()
+    store = _open_backup_store(load_config(console))
+    pending = Transaction.pending()
+    if not pending:
+        console.print('[green]No interrupted transactions.[/green]')
+        return 0
+
+    failed = 0
+    for path in pending:
+        try:
+            txn = Transaction.load(path)
+        except ValueError:
+            # The journal is removed first when a transaction finishes; only leftovers remain.
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+
+        console.print(
+            f'[bold cyan]{"Rolling back" if rollback else "Completing"} transaction {txn.id} '
+            f'({len(txn.header.entries)} links)[/bold cyan]'
+        )
+        try:
+            if rollback:
+                txn.rollback(console)
+            else:
+                txn.apply(console)
+                txn.commit(store)
+        except OSError as e:
+            failed += 1
+            console.print(f'[red]Could not recover transaction {txn.id}: {e}[/red]')
+    return 1 if failed else 0
+
+
+def main() -> None:
+    app(console=get_console())
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import stat
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from . import tracing
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# `FICLONE` from <linux/fs.h>: share the source's extents with the destination (btrfs, XFS, bcachefs, ...).
+FICLONE = 0x40049409
+
+
+@dataclass(slots=True)
+class BackupReport:
+    """Summary of a backup run.
+
+    Attributes
+    ----------
+    bytes_total : int
+        Size of the regular files that were backed up
+    bytes_copied : int
+        Bytes that had to be duplicated with a byte-for-byte copy
+    copy_seconds : float
+        Time spent on byte-for-byte copies
+    elapsed : float
+        Wall-clock time of the whole backup, in seconds
+    strategies : Counter[str]
+        Number of items (files, or whole trees for moves) backed up with each strategy
+    moved : list[Path]
+        Originals that were moved into the backup and therefore no longer exist
+    """
+
+    bytes_total: int = 0
+    bytes_copied: int = 0
+    copy_seconds: float = 0.0
+    elapsed: float = 0.0
+    strategies: Counter[str] = field(default_factory=Counter)
+    moved: list[Path] = field(default_factory=list)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Bytes that were backed up without being copied."""
+        return self.bytes_total - self.bytes_copied
+
+    @property
+    def seconds_saved(self) -> float | None:
+        """Estimated copy time avoided, extrapolated from this run's copy throughput if there was any."""
+        if not self.bytes_copied or not self.copy_seconds:
+            return None
+        return self.bytes_saved * self.copy_seconds / self.bytes_copied
+
+    def merge(self, other: BackupReport) -> None:
+        self.bytes_total += other.bytes_total
+        self.bytes_copied += other.bytes_copied
+        self.copy_seconds += other.copy_seconds
+        self.elapsed += other.elapsed
+        self.strategies.update(other.strategies)
+        self.moved.extend(other.moved)
+
+
+def _tree_size(path: Path) -> int:
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size if stat.S_ISREG(st.st_mode) else 0
+
+    total, stack = 0, [os.fspath(path)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def _reflink(source: Path, destination: Path) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflinks are not supported on this platform')
+
+    with source.open('rb') as src, destination.open('wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            # Filesystems without clone support may accept the ioctl as a no-op; never trust an empty clone.
+            if os.fstat(dst.fileno()).st_size != os.fstat(src.fileno()).st_size:
+                raise OSError(errno.EOPNOTSUPP, 'reflink did not clone any data')
+        except BaseException:
+            destination.unlink(missing_ok=True)
+            raise
+    shutil.copystat(source, destination, follow_symlinks=False)
+
+
+def _backup_file(
+    source: Path,
+    destination: Path,
+    strategies: tuple[Literal['reflink', 'hardlink'], ...],
+    report: BackupReport,
+) -> None:
+    if source.is_symlink():
+        # Back up the link itself rather than whatever it points to.
+        os.symlink(os.readlink(source), destination)
+        report.strategies['copy'] += 1
+        return
+
+    size = source.stat().st_size
+    report.bytes_total += size
+    for strategy in strategies:
+        try:
+            (_reflink if strategy == 'reflink' else os.link)(source, destination)
+        except OSError:
+            continue
+        report.strategies[strategy] += 1
+        return
+
+    start = time.perf_counter()
+    shutil.copy2(source, destination, follow_symlinks=False)
+    report.copy_seconds += time.perf_counter() - start
+    report.bytes_copied += size
+    report.strategies['copy'] += 1
+    tracing.add_bytes(size)
+
+
+def backup_item(source: Path, destination: Path, *, move: bool = False, rename: bool = True) -> BackupReport:
+    """Back up a file, symlink or directory tree as cheaply as possible.
+
+    Strategies are tried from cheapest to most expensive:
+
+    1. ``move``: rename the original into the backup (same filesystem only, O(1) for whole trees)
+    2. ``reflink``: clone file extents with ``FICLONE`` (copy-on-write filesystems)
+    3. ``hardlink``: link every file of the tree into the backup
+    4. ``copy``: byte-for-byte copy
+
+    Moving and hard-linking are only used when ``move`` is set, because they are only safe when the original
+    is about to be removed: a hard-linked backup would otherwise change along with in-place edits.
+
+    Parameters
+    ----------
+    source : Path
+        File, symlink or directory to back up
+    destination : Path
+        Path of the backup; must not exist
+    move : bool, default=False
+        Whether the original is about to be replaced and may be moved or hard-linked
+    rename : bool, default=True
+        With ``move``, whether the original may be renamed into the backup; otherwise it stays in place
+        (hard-linked or copied) until the caller replaces it
+
+    Returns
+    -------
+    BackupReport
+        Bytes backed up, bytes copied and strategies used
+    """
+
+    report = BackupReport()
+    start = time.perf_counter()
+
+    if move and rename:
+        try:
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        else:
+            report.bytes_total += _tree_size(destination)
+            report.strategies['move'] += 1
+            report.moved.append(source)
+            report.elapsed = time.perf_counter() - start
+            return report
+
+    strategies: tuple[Literal['reflink', 'hardlink'], ...] = ('reflink', 'hardlink') if move else ('reflink',)
+    if source.is_dir() and not source.is_symlink():
+        for root, dirs, files in os.walk(source):
+            rel = Path(root).relative_to(source)
+            (destination / rel).mkdir(parents=True, exist_ok=True)
+            for name in files + [d for d in dirs if Path(root, d).is_symlink()]:
+                _backup_file(Path(root, name), destination / rel / name, strategies, report)
+            shutil.copystat(root, destination / rel)
+    else:
+        _backup_file(source, destination, strategies, report)
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def format_size(size: float) -> str:
+    """Format a byte count with a binary unit, e.g. ``1.5 MiB``."""
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.0f} B' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+def format_report(report: BackupReport) -> str:
+    """Render a one-line summary of a backup run.
+
+    Parameters
+    ----------
+    report : BackupReport
+        Report to summarize
+
+    Returns
+    -------
+    str
+        Human readable summary with Rich markup
+    """
+
+    used = ', '.join(f'{name}: {count}' for name, count in sorted(report.strategies.items()))
+    summary = (
+        f'[dim]Backed up {format_size(report.bytes_total)} in {report.elapsed * 1000:.1f} ms '
+        f'({used or "nothing to back up"}); {format_size(report.bytes_saved)} not copied'
+    )
+    if (seconds := report.seconds_saved) is not None:
+        summary += f', ~{seconds * 1000:.0f} ms saved'
+    return summary + '[/dim]'
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import socket
+import stat
+import tempfile
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+import msgspec
+
+from . import tracing
+from .config import APP_AUTHOR, APP_NAME
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# Dotfiles are nearly always smaller than one chunk, so they are deduplicated as whole files; larger files
+# only store the chunks that changed in place.
+CHUNK_SIZE = 1 << 20
+
+type EntryKind = Literal['file', 'dir', 'symlink']
+
+
+class SnapshotEntry(msgspec.Struct, frozen=True, omit_defaults=True):
+    """A file, directory or symlink as it was when it was backed up."""
+
+    path: str
+    kind: EntryKind
+    mode: int = 0
+    mtime_ns: int = 0
+    size: int = 0
+    chunks: list[str] = msgspec.field(default_factory=list)
+    link: str | None = None
+
+
+class Snapshot(msgspec.Struct, frozen=True):
+    """The originals replaced by one ``dk apply``, keyed by the paths they were backed up from."""
+
+    id: str
+    host: str
+    created_ns: int
+    roots: list[str]
+    entries: list[SnapshotEntry]
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+
+@dataclass(slots=True)
+class GcReport:
+    """What `BackupStore.gc` removed."""
+
+    snapshots: list[str] = field(default_factory=list)
+    blobs: int = 0
+    bytes_freed: int = 0
+
+
+def _digests(snapshot: Snapshot) -> set[str]:
+    return {digest for entry in snapshot.entries for digest in entry.chunks}
+
+
+def get_backup_store_dir() -> Path:
+    """Get the default location of the backup store.
+
+    Backups must outlive upgrades, so unlike `get_data_dir` the directory is not versioned.
+
+    Returns
+    -------
+    Path
+        Path to ``backups`` in the unversioned DotKeeper data directory
+    """
+
+    import platformdirs
+
+    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)) / 'backups'
+
+
+class BackupStore:
+    """Content-addressed store of the files ``dk apply`` replaces.
+
+    Files are split into chunks of `CHUNK_SIZE` bytes that are stored once, named by their BLAKE2b hash, in
+    ``objects/``; each backup run is a small snapshot in ``snapshots/`` listing the chunks of every file.
+    Backing up content that is already stored, by any earlier run or any host sharing the store, only costs
+    hashing it. Blobs and snapshots are written atomically, and a lock file keeps `gc` from removing blobs
+    while a snapshot that needs them is being written.
+
+    Parameters
+    ----------
+    root : Path | None, default=None
+        Store directory, defaults to `get_backup_store_dir`
+    """
+
+    def __init__(self, root: Path | None = None) -> None:
+        self.root = root or get_backup_store_dir()
+        self.objects = self.root / 'objects'
+        self.snapshots_dir = self.root / 'snapshots'
+
+    @contextlib.contextmanager
+    def _lock(self, *, exclusive: bool) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with (self.root / 'lock').open('a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def _put(self, chunk: bytes) -> tuple[str, int]:
+        digest = hashlib.blake2b(chunk, digest_size=32).hexdigest()
+        path = self._blob_path(digest)
+        if path.exists():
+            return digest, 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(chunk)
+                os.fsync(f.fileno())
+            # A blob is immutable once it exists; never replace one written concurrently.
+            with contextlib.suppress(FileExistsError):
+                os.link(tmp, path)
+        finally:
+            os.unlink(tmp)
+        tracing.add_bytes(len(chunk))
+        return digest, len(chunk)
+
+    def _get(self, digest: str) -> bytes:
+        data = self._blob_path(digest).read_bytes()
+        if hashlib.blake2b(data, digest_size=32).hexdigest() != digest:
+            raise ValueError(f'Blob {digest} is corrupt')
+        return data
+
+    def _entries(self, original: Path, current: Path) -> Iterator[tuple[SnapshotEntry, int]]:
+        st = os.lstat(current)
+        if stat.S_ISLNK(st.st_mode):
+            yield SnapshotEntry(str(original), 'symlink', link=os.readlink(current)), 0
+        elif stat.S_ISDIR(st.st_mode):
+            yield SnapshotEntry(str(original), 'dir', stat.S_IMODE(st.st_mode), st.st_mtime_ns), 0
+            for name in sorted(os.listdir(current)):
+                yield from self._entries(original / name, current / name)
+        elif stat.S_ISREG(st.st_mode):
+            chunks, added = [], 0
+            with current.open('rb') as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    digest, written = self._put(chunk)
+                    chunks.append(digest)
+                    added += written
+            yield (
+                SnapshotEntry(
+                    str(original), 'file', stat.S_IMODE(st.st_mode), st.st_mtime_ns, st.st_size, chunks
+                ),
+                added,
+            )
+
+    def snapshot(
+        self, items: Iterable[tuple[Path, Path]], *, snapshot_id: str | None = None
+    ) -> tuple[Snapshot, int] | None:
+        """Store files, symlinks and directory trees as a new snapshot.
+
+        Parameters
+        ----------
+        items : Iterable[tuple[Path, Path]]
+            ``(original, current)`` pairs: the path something was backed up from, and where it is now (the
+            same path if it was not moved)
+        snapshot_id : str | None, default=None
+            Snapshot id, e.g. the id of the transaction that replaced the originals; generated if ``None``
+
+        Returns
+        -------
+        tuple[Snapshot, int] | None
+            The snapshot and the number of bytes added to the store, or ``None`` if there was nothing to store
+        """
+
+        items = [(original, current) for original, current in items if os.path.lexists(current)]
+        if not items:
+            return None
+
+        snapshot_id = snapshot_id or f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        entries, added = [], 0
+        with self._lock(exclusive=False):
+            for original, current in items:
+                for entry, written in self._entries(original, current):
+                    entries.append(entry)
+                    added += written
+            snapshot = Snapshot(
+                snapshot_id, socket.gethostname(), time.time_ns(), [str(o) for o, _ in items], entries
+            )
+            self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+            path = self.snapshots_dir / f'{snapshot_id}.json'
+            fd, tmp = tempfile.mkstemp(dir=self.snapshots_dir, prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(msgspec.json.encode(snapshot))
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+        return snapshot, added
+
+    def snapshots(self) -> list[Snapshot]:
+        """All snapshots in the store, oldest first; unreadable ones are skipped."""
+        decoder = msgspec.json.Decoder(Snapshot)
+        snapshots = []
+        for path in self.snapshots_dir.glob('*.json'):
+            with contextlib.suppress(OSError, msgspec.DecodeError):
+                snapshots.append(decoder.decode(path.read_bytes()))
+        return sorted(snapshots, key=lambda snapshot: snapshot.created_ns)
+
+    def find(self, prefix: str) -> Snapshot:
+        """Find a snapshot by a unique prefix of its id, or of the random part after its timestamp.
+
+        Raises
+        ------
+        ValueError
+            If no snapshot or more than one matches
+        """
+
+        matches = [
+            snapshot
+            for snapshot in self.snapshots()
+            if snapshot.id.startswith(prefix) or snapshot.id.rpartition('-')[2].startswith(prefix)
+        ]
+        if len(matches) != 1:
+            raise ValueError(f'{"No" if not matches else "More than one"} snapshot matches {prefix!r}')
+        return matches[0]
+
+    def restore(
+        self,
+        snapshot: Snapshot,
+        paths: Iterable[Path] = (),
+        *,
+        destination: Path | None = None,
+        overwrite: bool = False,
+    ) -> tuple[list[Path], list[Path]]:
+        """Restore the contents of a snapshot.
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            Snapshot to restore from
+        paths : Iterable[Path], default=()
+            Original paths to restore, including everything below them; everything if empty
+        destination : Path | None, default=None
+            Restore below this directory (under the full original path) instead of in place
+        overwrite : bool, default=False
+            Replace files and symlinks that exist where an entry is restored, including a symlink where a
+            directory is restored; they are skipped otherwise, along with everything below such a symlink
+
+        Returns
+        -------
+        tuple[list[Path], list[Path]]
+            Restored and skipped paths
+
+        Raises
+        ------
+        ValueError
+            If a blob is missing or corrupt
+        """
+
+        def contains(path: str, prefix: str) -> bool:
+            return path == prefix or path.startswith(prefix.rstrip(os.sep) + os.sep)
+
+        def place(path: str) -> Path:
+            return (
+                Path(path) if destination is None else destination / Path(path).relative_to(Path(path).anchor)
+            )
+
+        selected = [str(path) for path in paths]
+        restored, skipped = [], []
+        for entry in snapshot.entries:
+            if selected and not any(contains(entry.path, path) for path in selected):
+                continue
+            target = place(entry.path)
+            # Below the backed up original, a symlink is most likely the one `dk apply` replaced it with;
+            # never write through it into whatever it points to (e.g. the dotfiles repository).
+            root = place(next((root for root in snapshot.roots if contains(entry.path, root)), entry.path))
+            if any(parent.is_symlink() for parent in target.parents if parent.is_relative_to(root)):
+                skipped.append(target)
+                continue
+
+            if entry.kind == 'dir':
+                if target.is_symlink() and overwrite:
+                    target.unlink()
+                elif os.path.lexists(target) and not (target.is_dir() and not target.is_symlink()):
+                    skipped.append(target)
+                    continue
+                target.mkdir(parents=True, exist_ok=True)
+                os.chmod(target, entry.mode)
+                restored.append(target)
+                continue
+            if os.path.lexists(target):
+                if not overwrite or (target.is_dir() and not target.is_symlink()):
+                    skipped.append(target)
+                    continue
+                target.unlink()
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if entry.link is not None:
+                os.symlink(entry.link, target)
+            else:
+                fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f'.{target.name}.', suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        for digest in entry.chunks:
+                            f.write(self._get(digest))
+                    os.chmod(tmp, entry.mode)
+                    os.utime(tmp, ns=(entry.mtime_ns, entry.mtime_ns))
+                    os.replace(tmp, target)
+                except BaseException:
+                    Path(tmp).unlink(missing_ok=True)
+                    raise
+            restored.append(target)
+        return restored, skipped
+
+    def _blobs(self) -> Iterator[Path]:
+        if not self.objects.is_dir():
+            return
+        for directory in self.objects.iterdir():
+            for path in directory.iterdir():
+                if not path.name.startswith('.'):
+                    yield path
+
+    def size(self) -> int:
+        """Bytes stored in blobs."""
+        return sum(path.stat().st_size for path in self._blobs())
+
+    def gc(self, max_size: int | None = None, *, keep: int = 1) -> GcReport:
+        """Apply the retention policy and delete blobs no snapshot refers to.
+
+        Parameters
+        ----------
+        max_size : int | None, default=None
+            Delete the oldest snapshots until the blobs the remaining ones refer to fit in this many bytes;
+            only unreferenced blobs are deleted if ``None``
+        keep : int, default=1
+            Number of newest snapshots that are never deleted, even if they exceed ``max_size``
+
+        Returns
+        -------
+        GcReport
+            Deleted snapshots, and the number and size of deleted blobs
+        """
+
+        report = GcReport()
+        with self._lock(exclusive=True):
+            snapshots = self.snapshots()
+            sizes = {path.parent.name + path.name: path.stat().st_size for path in self._blobs()}
+            # Blobs are shared between snapshots: a blob only frees space once no remaining snapshot uses it.
+            uses = Counter(digest for snapshot in snapshots for digest in _digests(snapshot))
+            live_size = sum(sizes.get(digest, 0) for digest in uses)
+            while max_size is not None and len(snapshots) > keep and live_size > max_size:
+                oldest = snapshots.pop(0)
+                (self.snapshots_dir / f'{oldest.id}.json').unlink(missing_ok=True)
+                report.snapshots.append(oldest.id)
+                for digest in _digests(oldest):
+                    uses[digest] -= 1
+                    if not uses[digest]:
+                        del uses[digest]
+                        live_size -= sizes.get(digest, 0)
+
+            for digest, size in sizes.items():
+                if digest not in uses:
+                    path = self._blob_path(digest)
+                    path.unlink(missing_ok=True)
+                    with contextlib.suppress(OSError):
+                        path.parent.rmdir()
+                    report.blobs += 1
+                    report.bytes_freed += size
+        return report
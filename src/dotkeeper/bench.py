@@ -0,0 +1,524 @@
+from __future__ import annotations
+
+import gc
+import os
+import re
+import stat
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from cyclopts import App
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from .links import LinkState
+
+# `dotkeeper.app` registers this sub-app on every start, so everything else is imported where it is used.
+
+bench = App(name='bench', help='Measure DotKeeper performance.')
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+@dataclass(slots=True)
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """Parse the output of ``python -X importtime``.
+
+    Parameters
+    ----------
+    output : str
+        Captured stderr of the interpreter
+
+    Returns
+    -------
+    list[ImportTiming]
+        One entry per imported module, in the order reported by the interpreter
+    """
+
+    timings = []
+    for line in output.splitlines():
+        if match := _IMPORTTIME_LINE.match(line):
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return timings
+
+
+def measure_startup(module: str = 'dotkeeper', *, runs: int = 5) -> tuple[float, float, list[ImportTiming]]:
+    """Measure the cost of importing a module in a fresh interpreter.
+
+    Every run spawns a new interpreter, so module caches in this process do not skew the result. The fastest
+    run is kept for the wall-clock figures and per-module timings, which filters out scheduler noise.
+
+    Parameters
+    ----------
+    module : str, default='dotkeeper'
+        Module to import
+    runs : int, default=5
+        Number of interpreter launches
+
+    Returns
+    -------
+    tuple[float, float, list[ImportTiming]]
+        Bare interpreter wall time, wall time including the import (both in seconds), and per-module timings
+    """
+
+    import subprocess
+
+    def _run(code: str, *, importtime: bool = False) -> tuple[float, str]:
+        args = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', code]
+        start = time.perf_counter()
+        proc = subprocess.run(args, capture_output=True, text=True, check=True)
+        return time.perf_counter() - start, proc.stderr
+
+    # Warm up once so bytecode compilation is not attributed to the first run.
+    _run(f'import {module}')
+    baseline = min(_run('pass')[0] for _ in range(runs))
+    best_wall, best_timings = float('inf'), []
+    for _ in range(runs):
+        wall, _ = _run(f'import {module}')
+        _, stderr = _run(f'import {module}', importtime=True)
+        if wall < best_wall:
+            best_wall, best_timings = wall, parse_importtime(stderr)
+    return baseline, best_wall, best_timings
+
+
+@bench.command
+def startup(*, module: str = 'dotkeeper', runs: int = 5, top: int = 15) -> None:
+    """Show startup cost and the slowest imports.
+
+    Parameters
+    ----------
+    module : str
+        Module to import, e.g. ``dotkeeper.app`` to include the command layer
+    runs : int
+        Number of interpreter launches to take the best of
+    top : int
+        Number of modules to list, ordered by cumulative import time
+    """
+
+    from rich.table import Table
+
+    from .app import get_console
+
+    console = get_console()
+    baseline, wall, timings = measure_startup(module, runs=runs)
+
+    table = Table(title=f'Import time: {module}')
+    table.add_column('Module', justify='left', style='cyan', no_wrap=True)
+    table.add_column('Self (ms)', justify='right')
+    table.add_column('Cumulative (ms)', justify='right')
+    for timing in sorted(timings, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+        table.add_row(
+            f'{"  " * timing.depth}{timing.module}',
+            f'{timing.self_us / 1000:.2f}',
+            f'{timing.cumulative_us / 1000:.2f}',
+        )
+
+    console.print(table)
+    console.print(
+        f'[bold]Interpreter:[/bold] {baseline * 1000:.1f} ms  '
+        f'[bold]With import:[/bold] {wall * 1000:.1f} ms  '
+        f'[bold]Import cost:[/bold] {(wall - baseline) * 1000:.1f} ms'
+    )
+
+
+def synthetic_states(count: int) -> Iterator[LinkState]:
+    """Generate realistic link states without touching the filesystem.
+
+    Seven in ten links are correct, the rest are split between missing, non-link and incorrect sources.
+
+    Parameters
+    ----------
+    count : int
+        Number of states to generate
+
+    Yields
+    ------
+    LinkState
+        Freshly built state, as a scan would produce it
+    """
+
+    from .links import LinkState
+
+    for i in range(count):
+        source = Path(f'/home/user/.config/app{i}/settings.conf')
+        target = Path(f'/home/user/dotfiles/config/app{i}/settings.conf')
+        target_id = (2049, 1_000_000 + i)
+        match i % 10:
+            case 7:
+                yield LinkState(source, target, 'MISSING', None, None, target_id)
+            case 8:
+                yield LinkState(source, target, 'NONLINK', stat.S_IFREG | 0o644, None, target_id)
+            case 9:
+                yield LinkState(source, target, 'INCORRECT', stat.S_IFLNK | 0o777, f'/tmp/app{i}', target_id)
+            case _:
+                yield LinkState(source, target, 'CORRECT', stat.S_IFLNK | 0o777, str(target), target_id)
+
+
+def measure_retained(build: Callable[[], Iterable[LinkState]]) -> int:
+    """Measure the memory retained by a collection of link states.
+
+    Parameters
+    ----------
+    build : Callable[[], Iterable[LinkState]]
+        Builds the collection to measure
+
+    Returns
+    -------
+    int
+        Bytes still allocated once ``build`` has returned, as traced by ``tracemalloc``
+    """
+
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        collection = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        del collection
+    finally:
+        tracemalloc.stop()
+    return retained
+
+
+@bench.command
+def memory(*, links: int = 100_000) -> None:
+    """Compare the memory held by link records in a plain list and in a `LinkTable`.
+
+    Parameters
+    ----------
+    links : int
+        Number of synthetic links to hold
+    """
+
+    from rich.table import Table
+
+    from .app import get_console
+    from .backup import format_size
+    from .links import LinkTable
+
+    console = get_console()
+    results = {
+        'list[LinkState]': measure_retained(lambda: list(synthetic_states(links))),
+        'LinkTable': measure_retained(lambda: LinkTable(synthetic_states(links))),
+    }
+
+    table = Table(title=f'Memory held by {links:,} link records')
+    table.add_column('Container', justify='left', style='cyan', no_wrap=True)
+    table.add_column('Total', justify='right')
+    table.add_column('Per link', justify='right')
+    for name, size in results.items():
+        table.add_row(name, format_size(size), f'{size / max(links, 1):.0f} B')
+
+    console.print(table)
+    baseline, compact = results['list[LinkState]'], results['LinkTable']
+    console.print(f'[bold]Reduction:[/bold] {baseline / max(compact, 1):.1f}x')
+
+
+@dataclass(frozen=True, slots=True)
+class PhaseTiming:
+    """Timings of one pipeline phase at one config size, in seconds."""
+
+    links: int
+    phase: str
+    best: float
+    median: float
+    runs: int
+
+
+@dataclass(slots=True)
+class PipelineBaseline:
+    """Results of `run_pipeline`, with enough context to compare them across commits and machines."""
+
+    commit: str | None
+    version: str
+    python: str
+    host: str
+    filesystem: str
+    created: str
+    timings: list[PhaseTiming]
+
+
+def build_pipeline_fixture(root: Path, links: int) -> Path:
+    """Create dotfiles, a home directory and a config with the given number of links under ``root``.
+
+    The link states follow the mix of `synthetic_states`: seven in ten correct, the rest missing, blocked by
+    a regular file or pointing elsewhere. Links are spread over directories of 100, and every path goes
+    through ``${DK_BENCH_ROOT}`` so interpolation does real work.
+
+    Parameters
+    ----------
+    root : Path
+        Empty directory, ideally on a tmpfs
+    links : int
+        Number of links
+
+    Returns
+    -------
+    Path
+        Path to the config file
+    """
+
+    lines = ['dotfiles:', '  links:']
+    for i in range(links):
+        rel = f'.config/app{i // 100}/file{i}.conf'
+        source, target = root / 'home' / rel, root / 'dotfiles' / rel
+        if i % 100 == 0:
+            source.parent.mkdir(parents=True, exist_ok=True)
+            target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(f'setting = {i}\n')
+        match i % 10:
+            case 7:
+                pass
+            case 8:
+                source.write_text(f'local setting = {i}\n')
+            case 9:
+                os.symlink(root / 'elsewhere', source)
+            case _:
+                os.symlink(target, source)
+        lines.append(f'    ${{DK_BENCH_ROOT}}/home/{rel}: ${{DK_BENCH_ROOT}}/dotfiles/{rel}')
+
+    config = root / 'config.yml'
+    config.write_text('\n'.join(lines) + '\n')
+    return config
+
+
+def _filesystem(path: Path) -> str:
+    # The type of the filesystem holding `path`, from the longest matching mount point.
+    best, fstype = '', 'unknown'
+    try:
+        mounts = Path('/proc/mounts').read_text().splitlines()
+    except OSError:
+        return fstype
+    for line in mounts:
+        fields = line.split()
+        if len(fields) > 2 and path.is_relative_to(fields[1]) and len(fields[1]) > len(best):
+            best, fstype = fields[1], fields[2]
+    return fstype
+
+
+def default_bench_root() -> Path:
+    """``/dev/shm`` if it is a writable tmpfs, else the temporary directory."""
+    import tempfile
+
+    shm = Path('/dev/shm')
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+def _time_phase(fn: Callable[[int], object], runs: int) -> tuple[float, float]:
+    import statistics
+
+    durations = []
+    for run in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        fn(run)
+        durations.append(time.perf_counter() - start)
+    return min(durations), statistics.median(durations)
+
+
+def _time_pipeline(base: Path, config_path: Path, size: int, runs: int) -> list[PhaseTiming]:
+    import io
+
+    from rich.console import Console
+
+    from .backupstore import BackupStore
+    from .cli import iter_symlinks, load_yaml_config, preview_changes, recurse_yaml_config
+    from .fleet import load_raw_config
+    from .interp import Interpolator
+    from .links import LinkTable
+
+    raw = load_raw_config(config_path)
+    links = load_yaml_config(config_path, use_cache=False).all_links()
+    states = LinkTable(iter_symlinks(links))
+    blocked = [(Path(source), Path(source)) for source in map(states.source, states.indices('NONLINK'))]
+    sink = Console(file=io.StringIO(), width=200)
+    phases: dict[str, Callable[[int], object]] = {
+        'load_yaml_config': lambda _: load_yaml_config(config_path, use_cache=False),
+        'recurse_yaml_config': lambda _: recurse_yaml_config(raw, interpolator=Interpolator()),
+        'scan': lambda _: LinkTable(iter_symlinks(links)),
+        'preview': lambda _: preview_changes(console=sink, states=states),
+        # A fresh store per run, or every run after the first would only find duplicates.
+        'backup': lambda run: BackupStore(base / f'store-{run}').snapshot(blocked),
+    }
+    return [PhaseTiming(size, phase, *_time_phase(fn, runs), runs) for phase, fn in phases.items()]
+
+
+def run_pipeline(sizes: Iterable[int], *, root: Path | None = None, runs: int = 3) -> PipelineBaseline:
+    """Time every phase of the link pipeline on synthetic configs of the given sizes.
+
+    The phases are ``load_yaml_config`` (uncached), ``recurse_yaml_config`` (interpolation alone), ``scan``
+    (every link, without the link index), ``preview`` (rendering the status table) and ``backup`` (storing
+    the regular files that would be replaced in a fresh backup store).
+
+    Parameters
+    ----------
+    sizes : Iterable[int]
+        Config sizes, in links
+    root : Path | None, default=None
+        Directory to create the fixtures in, defaults to `default_bench_root`
+    runs : int, default=3
+        Runs per phase; the best and median are reported
+
+    Returns
+    -------
+    PipelineBaseline
+        Timings of every phase at every size
+    """
+
+    import platform
+    import shutil
+    import socket
+    import tempfile
+
+    from .config import get_app_version
+    from .gitstate import find_git_dir, read_head
+
+    root = root or default_bench_root()
+    timings: list[PhaseTiming] = []
+    previous = os.environ.get('DK_BENCH_ROOT')
+    with tempfile.TemporaryDirectory(prefix='dk-bench-', dir=root) as tmp:
+        for size in sizes:
+            base = Path(tmp, str(size))
+            config_path = build_pipeline_fixture(base, size)
+            os.environ['DK_BENCH_ROOT'] = str(base)
+            try:
+                timings.extend(_time_pipeline(base, config_path, size, runs))
+            finally:
+                if previous is None:
+                    os.environ.pop('DK_BENCH_ROOT', None)
+                else:
+                    os.environ['DK_BENCH_ROOT'] = previous
+            shutil.rmtree(base)
+
+    found = find_git_dir(Path(__file__).resolve().parent)
+    return PipelineBaseline(
+        commit=read_head(found[1]) if found else None,
+        version=get_app_version(),
+        python=platform.python_version(),
+        host=socket.gethostname(),
+        filesystem=_filesystem(root.resolve()),
+        created=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        timings=timings,
+    )
+
+
+def compare_baselines(
+    current: PipelineBaseline, previous: PipelineBaseline, *, threshold: float = 0.1
+) -> list[tuple[PhaseTiming, PhaseTiming, bool]]:
+    """Pair up the timings of two runs by size and phase.
+
+    Parameters
+    ----------
+    current : PipelineBaseline
+        New results
+    previous : PipelineBaseline
+        Results to compare against, e.g. from the base commit
+    threshold : float, default=0.1
+        Relative slowdown of the best time that counts as a regression
+
+    Returns
+    -------
+    list[tuple[PhaseTiming, PhaseTiming, bool]]
+        Current timing, previous timing and whether it regressed, for every phase measured in both runs
+    """
+
+    before = {(timing.links, timing.phase): timing for timing in previous.timings}
+    return [
+        (timing, old, timing.best > old.best * (1 + threshold))
+        for timing in current.timings
+        if (old := before.get((timing.links, timing.phase))) is not None
+    ]
+
+
+@bench.command
+def pipeline(
+    *,
+    links: str = '100,10000,100000',
+    runs: int = 3,
+    root: Path | None = None,
+    output: Path | None = None,
+    compare: Path | None = None,
+    threshold: float = 0.1,
+) -> int:
+    """Time the phases of the link pipeline on synthetic configs, and compare them with a baseline.
+
+    Parameters
+    ----------
+    links : str
+        Comma-separated config sizes, in links
+    runs : int
+        Runs per phase; the best time is compared
+    root : Path | None
+        Directory for the fixtures; defaults to ``/dev/shm`` (tmpfs) where available
+    output : Path | None
+        Write the results as a JSON baseline
+    compare : Path | None
+        Baseline to compare against; exits with status 1 if any phase regressed
+    threshold : float
+        Relative slowdown that counts as a regression
+    """
+
+    import msgspec
+    from rich.table import Table
+
+    from .app import get_console
+
+    console = get_console()
+    previous = msgspec.json.decode(compare.read_bytes(), type=PipelineBaseline) if compare else None
+    sizes = [int(size) for size in links.split(',') if size.strip()]
+    current = run_pipeline(sizes, root=root, runs=runs)
+    if output is not None:
+        output.write_bytes(msgspec.json.format(msgspec.json.encode(current)) + b'\n')
+
+    table = Table(title=f'Link pipeline ({current.filesystem}, best of {runs})')
+    table.add_column('Links', justify='right')
+    table.add_column('Phase', justify='left', style='cyan', no_wrap=True)
+    table.add_column('Best (ms)', justify='right')
+    table.add_column('Median (ms)', justify='right')
+    table.add_column('Per link (us)', justify='right')
+    rows = compare_baselines(current, previous, threshold=threshold) if previous else []
+    if previous is not None:
+        table.add_column(f'vs {(previous.commit or previous.version)[:10]}', justify='right')
+    changes = {(timing.links, timing.phase): (old, regressed) for timing, old, regressed in rows}
+    for timing in current.timings:
+        cells = [
+            f'{timing.links:,}',
+            timing.phase,
+            f'{timing.best * 1000:.2f}',
+            f'{timing.median * 1000:.2f}',
+            f'{timing.best * 1e6 / max(timing.links, 1):.2f}',
+        ]
+        if previous is not None:
+            if (change := changes.get((timing.links, timing.phase))) is None:
+                cells.append('')
+            else:
+                old, regressed = change
+                ratio = f'{timing.best / old.best:.2f}x' if old.best else ''
+                cells.append(f'[red]{ratio}[/red]' if regressed else ratio)
+        table.add_row(*cells)
+
+    console.print(table)
+    if output is not None:
+        console.print(f'[dim]Wrote baseline to {output}[/dim]')
+    regressions = [timing for timing, _, regressed in rows if regressed]
+    if regressions:
+        console.print(f'[red]{len(regressions)} phases regressed by more than {threshold:.0%}[/red]')
+        return 1
+    return 0
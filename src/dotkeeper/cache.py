@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from .config import get_cache_dir
+
+
+def get_cache_file(name: str) -> Path:
+    """Get the path of a named file in the DotKeeper cache directory.
+
+    Parameters
+    ----------
+    name : str
+        File name, relative to the cache directory
+
+    Returns
+    -------
+    Path
+        Path to the cache file
+    """
+
+    return get_cache_dir() / name
+
+
+def read_cache[T](name: str, type: type[T]) -> T | None:  # noqa: A002
+    """Read a JSON cache file written by `write_cache`.
+
+    Parameters
+    ----------
+    name : str
+        File name, relative to the cache directory
+    type : type[T]
+        msgspec-compatible type to decode into
+
+    Returns
+    -------
+    T | None
+        Decoded object, or ``None`` if the file is missing, unreadable or in an outdated format
+    """
+
+    import msgspec
+
+    try:
+        data = get_cache_file(name).read_bytes()
+    except OSError:
+        return None
+
+    try:
+        return msgspec.json.decode(data, type=type)
+    except msgspec.DecodeError:
+        return None
+
+
+def write_cache(name: str, obj: Any) -> Path:
+    """Atomically write an object to a JSON cache file.
+
+    The data is written to a temporary file next to the destination and moved into place, so concurrent
+    readers never observe a partially written file.
+
+    Parameters
+    ----------
+    name : str
+        File name, relative to the cache directory
+    obj : Any
+        msgspec-serializable object
+
+    Returns
+    -------
+    Path
+        Path to the written cache file
+    """
+
+    import msgspec
+
+    path = get_cache_file(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(msgspec.json.encode(obj))
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path
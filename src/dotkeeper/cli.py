@@ -1,31 +1,47 @@
+from __future__ import annotations
+
 import os
-import shutil
-from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from string import Template
-from tempfile import TemporaryDirectory
-from typing import Any, Literal, cast
-
-import yaml
-from dotenv import load_dotenv
-from rich.console import Console
-from rich.prompt import Confirm
-from rich.table import Table
+from typing import TYPE_CHECKING, Any, Literal, cast
 
+from . import tracing
+from .backup import BackupReport, backup_item, format_report, format_size
 from .config import ensure_config_exists
-from .models import Config
+from .interp import Interpolator
+from .links import LinkState, LinkTable, SyscallCounter
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+
+    from rich.console import Console
 
-load_dotenv()
+    from .backupstore import BackupStore
+    from .models import Config
+    from .state import LinkIndex
 
 
-@dataclass
+@dataclass(slots=True)
 class LinkStatus:
     source: Path | str
     target: Path | str
     status: Literal['CORRECT', 'MISSING', 'INCORRECT', 'NONLINK']
     style: Literal['green1', 'yellow1', 'red1']
 
+    @classmethod
+    def from_state(cls, state: LinkState) -> LinkStatus:
+        """Summarize a scanned `LinkState`, styled as in the status table."""
+        from .render import STATUS_STYLES
+
+        return cls(
+            state.source,
+            state.target,
+            state.status,
+            cast("Literal['green1', 'yellow1', 'red1']", STATUS_STYLES[state.status]),
+        )
+
 
 def expand_path(path: Path | str) -> Path:
     return Path(os.path.expanduser(path)).expanduser()
@@ -62,13 +78,19 @@ def interpolate(value: str) -> str:
     -------
     str
         String with environment variables replaced
+
+    Raises
+    ------
+    MissingVariablesError
+        If a referenced variable is not set
     """
-    value = Template(value).substitute(os.environ)
-    return os.path.expandvars(value)
+    return Interpolator().expand(value)
 
 
 def recurse_yaml_config(
     config: dict[str, Any] | list | str,
+    *,
+    interpolator: Interpolator | None = None,
 ) -> dict[str, Any] | list | str:
     """Recursively interpolate environment variables in a YAML config.
 
@@ -76,19 +98,20 @@ def recurse_yaml_config(
     ----------
     config : dict[str, Any] | list | str
         Configuration to process
+    interpolator : Interpolator | None, default=None
+        Interpolator to use, e.g. to inspect the variables it looked up afterwards
 
     Returns
     -------
     dict[str, Any] | list | str
         Processed configuration with interpolated values
+
+    Raises
+    ------
+    MissingVariablesError
+        If any referenced variable is not set, listing all of them
     """
-    if isinstance(config, dict):
-        return {interpolate(k): recurse_yaml_config(v) for k, v in config.items()}
-    if isinstance(config, list):
-        return [recurse_yaml_config(item) for item in config]
-    if isinstance(config, str):
-        return interpolate(config)
-    return config
+    return (interpolator or Interpolator()).expand(config)
 
 
 def check_symlink_status(
@@ -112,14 +135,98 @@ def check_symlink_status(
         - CORRECT: symlink points to correct target
         - INCORRECT: symlink points to wrong target
     """
-    source, target = resolve(source), resolve(target)
-    if not source.exists():
-        return 'MISSING'
-    if not source.is_symlink():
-        return 'NONLINK'
-    if source.resolve() == target.resolve():
-        return 'CORRECT'
-    return 'INCORRECT'
+    return LinkState.scan(resolve(source), resolve(target)).status
+
+
+def expand_pairs(config: dict[str, str]) -> list[tuple[Path, Path]]:
+    """Expand the ``(source, target)`` paths of every configured symlink."""
+    return [(Path(source).expanduser(), Path(target).expanduser()) for source, target in config.items()]
+
+
+def iter_symlinks(
+    config: dict[str, str],
+    *,
+    workers: int | None = None,
+    counter: SyscallCounter | None = None,
+    index: LinkIndex | None = None,
+) -> Iterator[LinkState]:
+    """Capture the state of every configured symlink, yielding each state as soon as it is known.
+
+    Each link is classified by a single task so its stat/readlink calls are issued back to back, and the
+    tasks run on a thread pool because the work is dominated by filesystem latency (e.g. NFS-backed homes).
+
+    Parameters
+    ----------
+    config : dict[str, str]
+        Mapping of source paths to target paths
+    workers : int | None, default=None
+        Number of scanner threads; ``None`` uses the thread pool default and ``1`` scans serially
+    counter : SyscallCounter | None, default=None
+        Counter to record the issued filesystem calls in
+    index : LinkIndex | None, default=None
+        Persistent index to reuse unchanged link states from and record new ones in
+
+    Yields
+    ------
+    LinkState
+        State of every link, in configuration order
+
+    Raises
+    ------
+    ValueError
+        If ``workers`` is less than 1
+    """
+
+    if workers is not None and workers < 1:
+        raise ValueError(f'workers must be at least 1, got {workers}')
+
+    pairs = expand_pairs(config)
+
+    scan = index.scan if index is not None else LinkState.scan
+
+    def _scan(pair: tuple[Path, Path]) -> LinkState:
+        return scan(*pair, counter=counter)
+
+    if workers == 1 or len(pairs) < 2:
+        yield from map(_scan, pairs)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dk-scan') as executor:
+        yield from executor.map(_scan, pairs)
+
+
+def scan_symlinks(
+    config: dict[str, str],
+    *,
+    workers: int | None = None,
+    counter: SyscallCounter | None = None,
+    index: LinkIndex | None = None,
+) -> list[LinkState]:
+    """Capture the state of every configured symlink.
+
+    Parameters
+    ----------
+    config : dict[str, str]
+        Mapping of source paths to target paths
+    workers : int | None, default=None
+        Number of scanner threads, see `iter_symlinks`
+    counter : SyscallCounter | None, default=None
+        Counter to record the issued filesystem calls in
+    index : LinkIndex | None, default=None
+        Persistent index to reuse unchanged link states from and record new ones in
+
+    Returns
+    -------
+    list[LinkState]
+        State of every link, in configuration order
+
+    Raises
+    ------
+    ValueError
+        If ``workers`` is less than 1
+    """
+
+    return list(iter_symlinks(config, workers=workers, counter=counter, index=index))
 
 
 def check_target_validity(target: Path | str) -> Literal['EXISTS', 'MISSING']:
@@ -144,7 +251,8 @@ def backup_before_modifying(
     console: Console,
     backup_path: Path,
     items_to_backup: list[tuple[Path, Path]],
-) -> None:
+    move: bool = False,
+) -> BackupReport:
     """Backup files and directories before modification.
 
     Parameters
@@ -155,86 +263,122 @@ def backup_before_modifying(
         Directory to store backups
     items_to_backup : list[tuple[Path, Path]]
         List of (original, source) paths to backup
+    move : bool, default=False
+        Whether the sources are about to be replaced, allowing them to be moved or hard-linked into the
+        backup instead of copied, see `dotkeeper.backup.backup_item`
+
+    Returns
+    -------
+    BackupReport
+        Bytes backed up, bytes copied and strategies used
     """
+
+    report = BackupReport()
     for original, source in items_to_backup:
-        if source.exists():
+        if os.path.lexists(source):
             backup_target = backup_path / source.name
-            if source.is_dir():
-                shutil.copytree(source, backup_target)
-            else:
-                shutil.copy2(source, backup_target)
+            report.merge(backup_item(source, backup_target, move=move))
             console.print(f'[blue]Backed up {original} to {backup_target}[/blue]')
+    return report
 
 
 def preview_changes(
     *,
     console: Console,
-    correct: list[str],
-    missing: list[str],
-    incorrect: list[str],
-    nonlink: list[str],
+    states: Sequence[LinkState],
 ) -> None:
-    """Display a table of symlink statuses.
+    """Display a table of symlink statuses, grouped by status.
 
     Parameters
     ----------
     console : Console
         Rich console for output
-    correct : list[str]
-        List of correct symlinks
-    missing : list[str]
-        List of missing symlinks
-    incorrect : list[str]
-        List of incorrect symlinks
-    nonlink : list[str]
-        List of non-symlink items
+    states : Sequence[LinkState]
+        Captured link states, as returned by `scan_symlinks`
     """
 
-    table = Table(title='Symlink Status')
-    table.add_column('Source', justify='left', style='cyan', no_wrap=True)
-    table.add_column('Target', justify='left', style='cyan', no_wrap=True)
-    table.add_column('Link Status', justify='left', style='cyan', no_wrap=True)
-    table.add_column('Target Status', justify='left', style='cyan', no_wrap=True)
-
-    all_statuses = [
-        *[LinkStatus(source, target, 'CORRECT', 'green1') for source, target in correct],
-        *[LinkStatus(source, target, 'MISSING', 'yellow1') for source, target in missing],
-        *[LinkStatus(source, target, 'INCORRECT', 'red1') for source, target in incorrect],
-        *[LinkStatus(source, target, 'NONLINK', 'red1') for source, target in nonlink],
-    ]
-
-    for status in all_statuses:
-        target_status = check_target_validity(status.target)
-        table.add_row(
-            str(status.source),
-            str(status.target),
-            f'[{status.style}]{status.status}[/{status.style}]',
-            '[green1]EXISTS[/green1]' if target_status == 'EXISTS' else '[red1]MISSING[/red1]',
-        )
+    from .render import STATUS_STYLES, TableRenderer
 
-    console.print(table)
+    table = states if isinstance(states, LinkTable) else LinkTable(states)
+    with tracing.span('preview', links=len(table)), TableRenderer(console) as renderer:
+        for status in STATUS_STYLES:
+            renderer.extend(table[i] for i in table.indices(status))
 
 
 def load_yaml_config(
     config_path: Path | str,
+    *,
+    profile: str | None = None,
+    host: str | None = None,
+    use_cache: bool = True,
 ) -> Config:
     """Load and process a YAML configuration file.
 
+    The processed configuration, and the merged view of every profile loaded from it, are cached under the
+    cache directory (see `dotkeeper.configcache`) and reused until the file or one of the environment
+    variables it references changes.
+
     Parameters
     ----------
     config_path : Path | str
         Path to YAML config file
+    profile : str | None, default=None
+        Profile to merge into the links and templates, see `Config.resolve_profile`
+    host : str | None, default=None
+        Host whose overlay is merged last
+    use_cache : bool, default=True
+        Whether to read and update the compiled config cache
 
     Returns
     -------
     Config
-        Processed configuration with interpolated values
-    """
-    with Path(config_path).open() as f:
-        raw_config = yaml.safe_load(f)
+        Processed configuration with interpolated values, flattened for the profile and host
 
-    processed_config = cast(dict, recurse_yaml_config(raw_config))
-    return Config.from_dict(processed_config)
+    Raises
+    ------
+    ValueError
+        If the profile is unknown or its layers extend each other in a cycle
+    """
+    from .configcache import load_compiled_config, store_compiled_config, store_config_view
+
+    path = Path(config_path).absolute()
+    view = (profile, host)
+    with tracing.span('config.load', path=str(path), profile=profile) as span:
+        if use_cache and (cached := load_compiled_config(path, view)) is not None:
+            if span is not None:
+                span.attrs['cache'] = 'view'
+            return cached
+        if use_cache and (cached := load_compiled_config(path)) is not None:
+            if span is not None:
+                span.attrs['cache'] = 'config'
+            merged = cached.resolve_profile(profile, host)
+            store_config_view(path, profile, host, merged)
+            return merged
+
+        import yaml
+
+        from .models import Config
+
+        if span is not None:
+            span.attrs['cache'] = 'miss'
+        with tracing.span('config.parse'):
+            with path.open('rb') as f:
+                st = os.fstat(f.fileno())
+                data = f.read()
+            # libyaml's loader is an order of magnitude faster than the pure-Python one when it is available.
+            raw_config = yaml.load(data, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))  # noqa: S506
+
+        with tracing.span('config.interpolate'):
+            interpolator = Interpolator()
+            processed_config = cast('dict', recurse_yaml_config(raw_config, interpolator=interpolator))
+        with tracing.span('config.validate'):
+            config = Config.from_dict(processed_config)
+            merged = config.resolve_profile(profile, host)
+        if use_cache:
+            store_compiled_config(path, st, data, config, interpolator.used)
+            if config.dotfiles.profiles or config.dotfiles.hosts:
+                store_config_view(path, profile, host, merged)
+        return merged
 
 
 def get_config_file_path(
@@ -261,16 +405,185 @@ def get_config_file_path(
         If no configuration file is found
     """
 
-    if _yaml_confg := os.getenv(env_variable):
-        return resolve(_yaml_confg)
-
-    for cfg in possible_file_names:
-        if (_yaml_confg := Path(cfg)).exists():
+    with tracing.span('config.discover'):
+        if _yaml_confg := os.getenv(env_variable):
             return resolve(_yaml_confg)
-    return ensure_config_exists()
 
+        for cfg in possible_file_names:
+            if (_yaml_confg := Path(cfg)).exists():
+                return resolve(_yaml_confg)
+        return ensure_config_exists()
+
+
+def collect_link_states(
+    console: Console,
+    config: dict,
+    *,
+    workers: int | None = None,
+    full: bool = False,
+    on_state: Callable[[LinkState], None] | None = None,
+    async_io: bool = False,
+    timeout: float | None = None,
+) -> LinkTable:
+    """Scan the configured links through the persistent link index.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    config : dict
+        Configuration mapping source paths to target paths
+    workers : int | None, default=None
+        Number of threads used to scan link status, see `scan_symlinks`
+    full : bool, default=False
+        Re-check every link instead of reusing unchanged states from the persistent link index
+    on_state : Callable[[LinkState], None] | None, default=None
+        Called with each state as soon as it is scanned, e.g. `dotkeeper.render.StatusRenderer.add`
+    async_io : bool, default=False
+        Scan on the async backend (see `dotkeeper.aio.scan_links`), keeping up to ``workers`` links in flight
+    timeout : float | None, default=None
+        Seconds each link may take on the async backend
+
+    Returns
+    -------
+    LinkTable
+        State of every link, in configuration order
+    """
+
+    from .gitstate import GitChanges
+    from .state import LinkIndex
+
+    counter = SyscallCounter()
+    with tracing.span('scan', links=len(config), full=full) as span:
+        repo = GitChanges.open(project_root) if (project_root := os.getenv('PROJECT_ROOT')) else None
+        index = LinkIndex.load(full=full, repo=repo)
+        states = LinkTable()
+        if async_io:
+            from . import aio
+
+            scanned = aio.scan_links(
+                expand_pairs(config), limit=workers, timeout=timeout, counter=counter, index=index
+            )
+        else:
+            scanned = iter_symlinks(config, workers=workers, counter=counter, index=index)
+        for state in scanned:
+            states.append(state)
+            if on_state is not None:
+                on_state(state)
+        tracing.count(counter.snapshot())
+        if span is not None:
+            span.attrs['reused'] = index.reused
+
+    calls = ', '.join(f'{op}: {count}' for op, count in sorted(counter.snapshot().items()))
+    console.print(
+        f'[dim]Checked {len(states)} links ({index.reused} unchanged since last run) '
+        f'with {counter.total} filesystem calls ({calls})[/dim]'
+    )
+
+    # Links that are about to be modified must be re-checked next time; everything else stays valid even if
+    # the changes are never applied.
+    index.discard(states.source(i) for i in states.indices('MISSING', 'NONLINK', 'INCORRECT'))
+    index.save()
+    return states
+
+
+def apply_changes(
+    *,
+    console: Console,
+    states: Sequence[LinkState],
+    assume_yes: bool = False,
+    store: BackupStore | None = None,
+    async_io: bool = False,
+    workers: int | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Back up, replace and link the given links in one journaled transaction.
+
+    If DotKeeper is interrupted, the transaction is left behind and can be finished or undone with
+    ``dk recover``. Once the changes are kept, the replaced originals are added to the backup store.
+    Conflicting files that are byte-identical to their targets are replaced without a backup, since the
+    dotfiles repository already holds their contents.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    states : Sequence[LinkState]
+        States of the links to (re)create; whatever occupies a source is backed up or replaced atomically
+    assume_yes : bool, default=False
+        Keep the changes without asking for a final confirmation
+    store : BackupStore | None, default=None
+        Store for the replaced originals, defaults to the store in the data directory
+    async_io : bool, default=False
+        Perform the swaps on the async backend, see `dotkeeper.journal.Transaction.apply_async`
+    workers : int | None, default=None
+        Threads used to compare conflicting files with their targets, and swaps in flight at once on the
+        async backend
+    timeout : float | None, default=None
+        Seconds each swap may take on the async backend
+    """
+
+    from rich.prompt import Confirm
+
+    from .backupstore import BackupStore
+    from .diff import identical_sources
+    from .journal import Transaction
+
+    with tracing.span('compare') as span:
+        identical = identical_sources(states, workers=workers)
+        if span is not None:
+            span.attrs['identical'] = len(identical)
+    if identical:
+        console.print(
+            f'[dim]{len(identical)} conflicting files are identical to their targets, '
+            'replacing them without a backup[/dim]'
+        )
+
+    # The transaction keeps its backups in the data directory, which is usually on the same filesystem as
+    # the dotfiles, so the originals can simply be moved aside instead of copied.
+    txn = Transaction.begin(states, identical=identical)
+    try:
+        with tracing.span('apply', links=len(states), async_io=async_io):
+            if async_io:
+                import anyio
+
+                anyio.run(partial(txn.apply_async, console, limit=workers, timeout=timeout))
+            else:
+                txn.apply(console)
+    except BaseException:
+        console.print('[red]Applying failed, rolling back...[/red]')
+        txn.rollback(console)
+        raise
+
+    if txn.report.strategies:
+        console.print(format_report(txn.report))
+
+    if not assume_yes and not Confirm.ask('Is everything correct?'):
+        console.print('[yellow]Restoring from backup...[/yellow]')
+        txn.rollback(console)
+        console.print('[green]Restore completed[/green]')
+        return
 
-def manage_symlinks(console: Console, config: dict) -> None:
+    with tracing.span('backup'):
+        snapshot = txn.commit(store or BackupStore())
+    if snapshot is not None:
+        console.print(
+            f'[dim]Stored backup {snapshot.id} ({len(snapshot.roots)} items, '
+            f'{format_size(txn.stored_bytes)} new data)[/dim]'
+        )
+
+
+def manage_symlinks(
+    console: Console,
+    config: dict,
+    *,
+    workers: int | None = None,
+    full: bool = False,
+    assume_yes: bool = False,
+    store: BackupStore | None = None,
+    async_io: bool = False,
+    timeout: float | None = None,
+) -> None:
     """Manage symlinks according to configuration.
 
     Creates, updates, and repairs symlinks based on the provided configuration.
@@ -282,90 +595,59 @@ def manage_symlinks(console: Console, config: dict) -> None:
         Rich console for output
     config : dict
         Configuration mapping source paths to target paths
+    workers : int | None, default=None
+        Number of threads used to scan link status, see `scan_symlinks`
+    full : bool, default=False
+        Re-check every link instead of reusing unchanged states from the persistent link index
+    assume_yes : bool, default=False
+        Answer every confirmation prompt with yes, for unattended runs
+    store : BackupStore | None, default=None
+        Store for replaced originals, see `apply_changes`
+    async_io : bool, default=False
+        Scan and apply on the async backend, keeping up to ``workers`` filesystem operations in flight
+    timeout : float | None, default=None
+        Seconds each filesystem operation may take on the async backend
     """
 
-    correct_links = []
-    incorrect_links = []
-    missing_links = []
-    nonlink_items = []
-
-    for source, target in config.items():
-        source_path = Path(source).expanduser()
-        target_path = Path(target).expanduser()
+    from rich.prompt import Confirm
 
-        status = check_symlink_status(source_path, target_path)
+    from .render import TableRenderer
 
-        if status == 'CORRECT':
-            correct_links.append((source_path, target_path))
-        elif status == 'MISSING':
-            missing_links.append((source_path, target_path))
-        elif status == 'INCORRECT':
-            incorrect_links.append((source_path, target_path))
-        elif status == 'NONLINK':
-            nonlink_items.append((source_path, target_path))
-
-    preview_changes(
-        console=console,
-        correct=correct_links,
-        missing=missing_links,
-        incorrect=incorrect_links,
-        nonlink=nonlink_items,
-    )
+    # Rows are printed as the links are scanned, rather than once the whole table is known.
+    with TableRenderer(console) as renderer:
+        states = collect_link_states(
+            console,
+            config,
+            workers=workers,
+            full=full,
+            on_state=renderer.add,
+            async_io=async_io,
+            timeout=timeout,
+        )
 
-    if not (incorrect_links or missing_links or nonlink_items):
+    pending = states.select('MISSING', 'NONLINK', 'INCORRECT')
+    if not pending:
         console.print('[green]Everything looks good. No changes needed.[/green]')
         return
 
-    missing_targets = []
-    for _, target in incorrect_links + missing_links + nonlink_items:
-        if check_target_validity(target) == 'MISSING':
-            missing_targets.append(target)
-
-    if missing_targets:
+    if missing_targets := [state.target for state in pending if not state.target_exists]:
         console.print('[red]Warning: The following targets do not exist:[/red]')
         for target in missing_targets:
             console.print(f'[red]  - {target}[/red]')
-        if not Confirm.ask('Continue anyway?'):
+        if not assume_yes and not Confirm.ask('Continue anyway?'):
             console.print('[yellow]Exiting without making any changes[/yellow]')
             return
 
-    if not Confirm.ask('Do you want to apply all changes?'):
+    if not assume_yes and not Confirm.ask('Do you want to apply all changes?'):
         console.print('[yellow]Exiting without making any changes[/yellow]')
         return
 
-    with TemporaryDirectory() as backup_dir:
-        backup_path = Path(backup_dir)
-        items_to_backup = [(source, source) for source, _ in incorrect_links + nonlink_items]
-        backup_before_modifying(console=console, backup_path=backup_path, items_to_backup=items_to_backup)
-
-        for source, target in incorrect_links + missing_links + nonlink_items:
-            source = Path(source)
-            if source.exists() or source.is_symlink():
-                if source.is_dir() and not source.is_symlink():
-                    shutil.rmtree(source)
-                    console.print(f'[red]Removed directory {source}[/red]')
-                else:
-                    source.unlink()
-                    console.print(f'[red]Removed {source}[/red]')
-
-            source.symlink_to(target)
-            console.print(f'[green]Created symlink: {source} -> {target}[/green]')
-
-        if not Confirm.ask('Is everything correct?'):
-            console.print('[yellow]Restoring from backup...[/yellow]')
-            for backup in backup_path.iterdir():
-                if (
-                    original := next((orig for orig, src in items_to_backup if src.name == backup.name), None)
-                ) and original.exists():
-                    if original.is_dir():
-                        shutil.rmtree(original)
-                    else:
-                        original.unlink()
-
-                if backup.is_dir() and original:
-                    shutil.copytree(backup, original)
-                elif original:
-                    shutil.copy2(backup, original)
-
-                console.print(f'[yellow]Restored {original} from backup[/yellow]')
-            console.print('[green]Restore completed[/green]')
+    apply_changes(
+        console=console,
+        states=pending,
+        assume_yes=assume_yes,
+        store=store,
+        async_io=async_io,
+        workers=workers,
+        timeout=timeout,
+    )
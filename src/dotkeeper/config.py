@@ -1,14 +1,16 @@
-from importlib.metadata import version
+from __future__ import annotations
+
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 import platformdirs
-import yaml
 
-from .models import Config
+if TYPE_CHECKING:
+    from .models import Config
 
 APP_NAME = 'DotKeeper'
 APP_AUTHOR = 'Alchemyst0x'
-APP_VERSION = version('dotkeeper')
 
 _default_cfg = {
     'dotfiles': {
@@ -23,7 +25,49 @@ _default_cfg = {
     }
 }
 
-DEFAULT_CONFIG = Config.from_dict(_default_cfg)
+
+@cache
+def get_app_version() -> str:
+    """Get the installed DotKeeper version.
+
+    Returns
+    -------
+    str
+        Version string from the package metadata
+    """
+
+    from importlib.metadata import version
+
+    return version('dotkeeper')
+
+
+@cache
+def get_default_config() -> Config:
+    """Get the default configuration model.
+
+    Returns
+    -------
+    Config
+        Validated default configuration
+    """
+
+    from .models import Config
+
+    return Config.from_dict(_default_cfg)
+
+
+def __getattr__(name: str) -> Any:
+    # `APP_VERSION`, `DEFAULT_CONFIG` and `Config` stay importable from here, but are only materialized on
+    # first access so that importing this module does not pull in pydantic or package metadata.
+    if name == 'APP_VERSION':
+        return get_app_version()
+    if name == 'DEFAULT_CONFIG':
+        return get_default_config()
+    if name == 'Config':
+        from .models import Config
+
+        return Config
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_config_dir() -> Path:
@@ -35,7 +79,7 @@ def get_config_dir() -> Path:
         Path to the configuration directory
     """
 
-    return Path(platformdirs.user_config_dir(APP_NAME, APP_AUTHOR, version=APP_VERSION))
+    return Path(platformdirs.user_config_dir(APP_NAME, APP_AUTHOR, version=get_app_version()))
 
 
 def get_data_dir() -> Path:
@@ -47,7 +91,7 @@ def get_data_dir() -> Path:
         Path to the data directory
     """
 
-    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR, version=APP_VERSION))
+    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR, version=get_app_version()))
 
 
 def get_cache_dir() -> Path:
@@ -59,7 +103,7 @@ def get_cache_dir() -> Path:
         Path to the cache directory
     """
 
-    return Path(platformdirs.user_cache_dir(APP_NAME, APP_AUTHOR, version=APP_VERSION))
+    return Path(platformdirs.user_cache_dir(APP_NAME, APP_AUTHOR, version=get_app_version()))
 
 
 def get_working_dir_config() -> Path | None:
@@ -92,8 +136,10 @@ def ensure_config_exists() -> Path:
 
     config_file = config_dir / 'config.yml'
     if not config_file.exists():
+        import yaml
+
         with config_file.open('w') as f:
-            yaml.safe_dump(DEFAULT_CONFIG.model_dump(), f, sort_keys=False)
+            yaml.safe_dump(get_default_config().model_dump(), f, sort_keys=False)
 
     return config_file
 
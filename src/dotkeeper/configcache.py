@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import time
+import typing
+from typing import TYPE_CHECKING, Any
+
+import msgspec
+
+from .cache import read_cache, write_cache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pydantic import BaseModel
+
+    from .models import Config
+
+CACHE_FORMAT = 3
+
+# Same window as the link-state index: a file modified this close to the time it was cached may be modified
+# again without its mtime changing, so its content hash is checked instead.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class CompiledConfig(msgspec.Struct):
+    """Interpolated and validated configuration, together with everything it was derived from."""
+
+    path: str
+    file_id: tuple[int, int, int]
+    digest: str
+    cached_ns: int
+    env: dict[str, str | None]
+    config: dict[str, Any]
+    views: dict[str, dict[str, Any]] = msgspec.field(default_factory=dict)
+    format: int = CACHE_FORMAT
+
+
+def _cache_name(path: Path) -> str:
+    return f'config-{hashlib.blake2b(str(path).encode(), digest_size=8).hexdigest()}.json'
+
+
+def _file_id(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _model_in(annotation: Any) -> type[BaseModel] | None:
+    """The model an annotation is, or is a union member of (like ``LinkEntry`` in ``str | LinkEntry``)."""
+    from pydantic import BaseModel
+
+    if typing.get_origin(annotation) in {list, dict}:
+        return None
+    for member in (annotation, *typing.get_args(annotation)):
+        if isinstance(member, type) and issubclass(member, BaseModel):
+            return member
+    return None
+
+
+def _rebuild(annotation: Any, value: Any) -> Any:
+    """Rebuild the models in a dumped field value, including those in (nested) lists and dicts."""
+    origin = typing.get_origin(annotation)
+    if origin is list or origin is dict:
+        item = typing.get_args(annotation)[-1]
+        if (model := _model_in(item)) is not None:
+
+            def rebuild(v: Any) -> Any:
+                return _construct(model, v) if isinstance(v, dict) else v
+
+        elif typing.get_origin(item) in {list, dict}:
+
+            def rebuild(v: Any) -> Any:
+                return _rebuild(item, v)
+
+        else:
+            # Most fields hold plain values; leave them alone without visiting every item.
+            return value
+        return [rebuild(v) for v in value] if origin is list else {k: rebuild(v) for k, v in value.items()}
+
+    if (model := _model_in(annotation)) is not None and isinstance(value, dict):
+        return _construct(model, value)
+    return value
+
+
+def _construct[M: BaseModel](model: type[M], data: dict[str, Any]) -> M:
+    # The cached data was dumped from a validated model, so validating it again would only cost time.
+    for name, field in model.model_fields.items():
+        if name in data:
+            data[name] = _rebuild(field.annotation, data[name])
+    return model.model_construct(**data)
+
+
+def _env_unchanged(env: dict[str, str | None]) -> bool:
+    return all(os.environ.get(name) == value for name, value in env.items())
+
+
+def view_key(profile: str | None, host: str | None) -> str:
+    """Name of the merged view of a profile on a host, see `Config.resolve_profile`."""
+    return f'{profile or ""}@{host or ""}'
+
+
+def load_compiled_config(path: Path, view: tuple[str | None, str | None] | None = None) -> Config | None:
+    """Load a configuration from its compiled cache, if the cache is still valid.
+
+    The cache is valid when the environment variables the file references are unchanged and the file itself
+    is unchanged: either its inode, size and mtime match and it was not modified within `RACY_WINDOW_NS` of
+    being cached, or its content hash matches.
+
+    Parameters
+    ----------
+    path : Path
+        Resolved path of the YAML configuration file
+    view : tuple[str | None, str | None] | None, default=None
+        ``(profile, host)`` to load the merged view of (see `store_config_view`) instead of the full
+        configuration
+
+    Returns
+    -------
+    Config | None
+        Cached configuration, or ``None`` if it (or the requested view) has to be (re)compiled
+    """
+
+    compiled = read_cache(_cache_name(path), CompiledConfig)
+    if compiled is None or compiled.format != CACHE_FORMAT or compiled.path != str(path):
+        return None
+
+    try:
+        file_id = _file_id(os.stat(path))
+    except OSError:
+        return None
+
+    if not _env_unchanged(compiled.env):
+        return None
+
+    moved = file_id != tuple(compiled.file_id)
+    if moved or file_id[2] >= compiled.cached_ns - RACY_WINDOW_NS:
+        if hashlib.blake2b(path.read_bytes()).hexdigest() != compiled.digest:
+            return None
+        if moved:
+            # Touched or rewritten with the same content: remember the new identity to skip hashing next time.
+            with contextlib.suppress(OSError):
+                write_cache(
+                    _cache_name(path),
+                    msgspec.structs.replace(compiled, file_id=file_id, cached_ns=time.time_ns()),
+                )
+
+    from .models import Config
+
+    if view is None:
+        return _construct(Config, compiled.config)
+    if (dotfiles := compiled.views.get(view_key(*view))) is not None:
+        return _construct(Config, {**compiled.config, 'dotfiles': dotfiles})
+    dotfiles = compiled.config.get('dotfiles', {})
+    if view[0] is None and not dotfiles.get('profiles') and not dotfiles.get('hosts'):
+        # Nothing to merge: the view is the configuration itself.
+        return _construct(Config, compiled.config)
+    return None
+
+
+def store_compiled_config(
+    path: Path,
+    st: os.stat_result,
+    data: bytes,
+    config: Config,
+    env: dict[str, str | None],
+) -> None:
+    """Cache a freshly loaded configuration for `load_compiled_config`.
+
+    Parameters
+    ----------
+    path : Path
+        Resolved path of the YAML configuration file
+    st : os.stat_result
+        Status of the file taken before ``data`` was read, so a concurrent edit invalidates the cache
+    data : bytes
+        Raw file content the configuration was loaded from
+    config : Config
+        Validated configuration
+    env : dict[str, str | None]
+        Environment variables the configuration was interpolated with, see `Interpolator.used`
+    """
+
+    with contextlib.suppress(OSError):  # caching is best-effort
+        write_cache(
+            _cache_name(path),
+            CompiledConfig(
+                path=str(path),
+                file_id=_file_id(st),
+                digest=hashlib.blake2b(data).hexdigest(),
+                cached_ns=time.time_ns(),
+                env=env,
+                config=config.model_dump(mode='json'),
+            ),
+        )
+
+
+def store_config_view(path: Path, profile: str | None, host: str | None, config: Config) -> None:
+    """Add the merged view of a profile to the compiled cache of a configuration.
+
+    Views are stored alongside the configuration they were merged from and dropped with it when the file or
+    its environment changes, so selecting a profile does not merge its layers again on every run.
+
+    Parameters
+    ----------
+    path : Path
+        Resolved path of the YAML configuration file, already cached by `store_compiled_config`
+    profile : str | None
+        Profile the view was merged for
+    host : str | None
+        Host the view was merged for
+    config : Config
+        Result of `Config.resolve_profile`
+    """
+
+    compiled = read_cache(_cache_name(path), CompiledConfig)
+    if compiled is None or compiled.format != CACHE_FORMAT or compiled.path != str(path):
+        return
+    compiled.views[view_key(profile, host)] = config.dotfiles.model_dump(mode='json')
+    with contextlib.suppress(OSError):  # caching is best-effort
+        write_cache(_cache_name(path), compiled)
@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol, Self
+
+import msgspec
+
+from .cache import get_cache_file, read_cache, write_cache
+from .config import APP_NAME
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from cryptography.fernet import Fernet
+
+CACHE_FILE = 'credentials.json'
+KEY_FILE = 'credentials.key'
+# Name of the keyring entry holding the key of the credential cache.
+KEY_USERNAME = 'credential-cache-key'
+
+
+class CredentialError(LookupError):
+    """Raised when secret references cannot be resolved."""
+
+    def __init__(self, refs: Iterable[str]) -> None:
+        self.refs = tuple(sorted(set(refs)))
+        super().__init__(*self.refs)
+
+    def __str__(self) -> str:
+        return f'Could not resolve secret references: {", ".join(self.refs)}'
+
+
+class CredentialBackend(Protocol):
+    """A secret store that resolves references of one URI scheme, e.g. ``op://vault/item/field``."""
+
+    scheme: str
+
+    def group(self, ref: str) -> str:
+        """Key of the batch a reference is resolved in; references of a batch share one round trip."""
+        ...
+
+    def resolve(self, refs: list[str]) -> dict[str, str]:
+        """Resolve a batch of references, leaving out those that do not exist."""
+        ...
+
+    def close(self) -> None: ...
+
+
+def _path(ref: str) -> str:
+    return ref.partition('://')[2]
+
+
+class KeyringBackend:
+    """Resolve ``keyring://service/username`` references with the system keyring.
+
+    The keyring API has no batch lookup; batches are per service.
+    """
+
+    scheme = 'keyring'
+
+    def group(self, ref: str) -> str:
+        return _path(ref).partition('/')[0]
+
+    def resolve(self, refs: list[str]) -> dict[str, str]:
+        import keyring
+
+        values = {}
+        for ref in refs:
+            service, _, username = _path(ref).partition('/')
+            if (value := keyring.get_password(service, username)) is not None:
+                values[ref] = value
+        return values
+
+    def close(self) -> None:
+        pass
+
+
+class OnePasswordBackend:
+    """Resolve ``op://vault/item/field`` references with a 1Password service account.
+
+    The client authenticates once, on first use, and each batch (one per vault) is resolved with a single
+    ``resolve_all`` call.
+
+    Parameters
+    ----------
+    token : str | None, default=None
+        Service account token, defaults to ``OP_SERVICE_ACCOUNT_TOKEN``
+    """
+
+    scheme = 'op'
+
+    def __init__(self, token: str | None = None) -> None:
+        self.token = token
+        self._runner: asyncio.Runner | None = None
+        self._client = None
+
+    def group(self, ref: str) -> str:
+        return _path(ref).partition('/')[0]
+
+    async def _resolve(self, refs: list[str]) -> dict[str, str]:
+        from onepassword.client import Client
+        from onepassword.defaults import DEFAULT_INTEGRATION_NAME
+
+        from .config import get_app_version
+
+        if self._client is None:
+            if not (token := self.token or os.getenv('OP_SERVICE_ACCOUNT_TOKEN')):
+                raise CredentialError(refs)
+            self._client = await Client.authenticate(token, DEFAULT_INTEGRATION_NAME, get_app_version())
+        response = await self._client.secrets.resolve_all(refs)
+        return {
+            ref: result.content.secret
+            for ref, result in response.individual_responses.items()
+            if result.content is not None
+        }
+
+    def resolve(self, refs: list[str]) -> dict[str, str]:
+        # The client is bound to the event loop it authenticated on, so every batch runs on the same loop.
+        if self._runner is None:
+            self._runner = asyncio.Runner()
+        return self._runner.run(self._resolve(refs))
+
+    def close(self) -> None:
+        if self._runner is not None:
+            self._runner.close()
+            self._runner = None
+            self._client = None
+
+
+class MemoryBackend:
+    """In-memory backend that records its batches, for tests and dry runs.
+
+    Parameters
+    ----------
+    values : Mapping[str, str]
+        Secrets by reference
+    scheme : str, default='mem'
+        Scheme of the references it resolves
+    """
+
+    def __init__(self, values: Mapping[str, str], scheme: str = 'mem') -> None:
+        self.values = dict(values)
+        self.scheme = scheme
+        self.batches: list[list[str]] = []
+
+    def group(self, ref: str) -> str:
+        return _path(ref).partition('/')[0]
+
+    def resolve(self, refs: list[str]) -> dict[str, str]:
+        self.batches.append(refs)
+        return {ref: self.values[ref] for ref in refs if ref in self.values}
+
+    def close(self) -> None:
+        pass
+
+
+def default_backends() -> list[CredentialBackend]:
+    """The 1Password and keyring backends."""
+    return [OnePasswordBackend(), KeyringBackend()]
+
+
+class CachedCredentials(msgspec.Struct):
+    """On-disk layout of the credential cache: Fernet tokens keyed by a keyed hash of the reference."""
+
+    entries: dict[str, str] = msgspec.field(default_factory=dict)
+
+
+def _load_key() -> bytes:
+    import keyring
+    from cryptography.fernet import Fernet
+    from keyring.errors import KeyringError
+
+    with contextlib.suppress(KeyringError):
+        if (key := keyring.get_password(APP_NAME, KEY_USERNAME)) is None:
+            key = Fernet.generate_key().decode()
+            keyring.set_password(APP_NAME, KEY_USERNAME, key)
+        return key.encode()
+
+    # No usable keyring (e.g. a headless machine): keep the key in a file only the user can read.
+
+    path = get_cache_file(KEY_FILE)
+    try:
+        return path.read_bytes().strip()
+    except FileNotFoundError:
+        pass
+    key = Fernet.generate_key()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes().strip()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _existing_key() -> bytes | None:
+    # The key `_load_key` would return, without creating one if there is none yet.
+    import keyring
+    from keyring.errors import KeyringError
+
+    with contextlib.suppress(KeyringError):
+        key = keyring.get_password(APP_NAME, KEY_USERNAME)
+        return None if key is None else key.encode()
+    try:
+        return get_cache_file(KEY_FILE).read_bytes().strip()
+    except FileNotFoundError:
+        return None
+
+
+class CredentialCache:
+    """Short-lived, encrypted cache of resolved secrets under the cache directory.
+
+    Every value is stored as a Fernet token, which carries its creation time, so expired entries are
+    rejected on read without trusting file times. References are stored as keyed hashes, not in clear. The
+    key is kept in the system keyring, or in a ``0600`` file in the cache directory if there is none.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds a cached secret stays valid
+    key : bytes | None, default=None
+        Fernet key, loaded (or created) on first use if ``None``
+    """
+
+    def __init__(self, ttl: float, *, key: bytes | None = None) -> None:
+        self.ttl = ttl
+        self._key = key
+        self._fernet: Fernet | None = None
+        self._state: CachedCredentials | None = None
+        self._dirty = False
+
+    @property
+    def key(self) -> bytes:
+        if self._key is None:
+            self._key = _load_key()
+        return self._key
+
+    @property
+    def fernet(self) -> Fernet:
+        if self._fernet is None:
+            from cryptography.fernet import Fernet
+
+            self._fernet = Fernet(self.key)
+        return self._fernet
+
+    @property
+    def state(self) -> CachedCredentials:
+        if self._state is None:
+            self._state = read_cache(CACHE_FILE, CachedCredentials) or CachedCredentials()
+        return self._state
+
+    def _entry(self, ref: str) -> str:
+        return hashlib.blake2b(ref.encode(), key=self.key[:64], digest_size=16).hexdigest()
+
+    def get(self, ref: str) -> str | None:
+        """The cached secret for a reference, or ``None`` if it is missing or expired."""
+
+        from cryptography.fernet import InvalidToken
+
+        entry = self._entry(ref)
+        if (token := self.state.entries.get(entry)) is None:
+            return None
+        try:
+            return self.fernet.decrypt_at_time(token, int(self.ttl), int(time.time())).decode()
+        except InvalidToken:
+            del self.state.entries[entry]
+            self._dirty = True
+            return None
+
+    def set(self, ref: str, value: str) -> None:
+        self.state.entries[self._entry(ref)] = self.fernet.encrypt_at_time(
+            value.encode(), int(time.time())
+        ).decode()
+        self._dirty = True
+
+    def evict(self, refs: Iterable[str] | None = None) -> int:
+        """Remove cached secrets.
+
+        Parameters
+        ----------
+        refs : Iterable[str] | None, default=None
+            References to remove; everything if ``None``
+
+        Returns
+        -------
+        int
+            Number of entries removed
+        """
+
+        # Forgetting secrets must not create a key (in the keyring or a key file) that did not exist.
+        if not self.state.entries:
+            return 0
+        if refs is None:
+            count = len(self.state.entries)
+            self.state.entries.clear()
+        else:
+            if self._key is None and (key := _existing_key()) is not None:
+                self._key = key
+            if self._key is None:
+                return 0
+            count = sum(self.state.entries.pop(self._entry(ref), None) is not None for ref in refs)
+        self._dirty = self._dirty or count > 0
+        return count
+
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+        if self._dirty:
+            write_cache(CACHE_FILE, self.state)
+            self._dirty = False
+
+
+@dataclass(slots=True)
+class ResolverStats:
+    """Where the secrets of a run came from.
+
+    Attributes
+    ----------
+    hits : int
+        References already resolved earlier in the run
+    cache_hits : int
+        References found in the credential cache
+    misses : int
+        References fetched from a backend
+    batches : int
+        Round trips to the backends
+    """
+
+    hits: int = 0
+    cache_hits: int = 0
+    misses: int = 0
+    batches: int = 0
+
+
+class CredentialResolver:
+    """Resolve secret references with as few round trips to the secret backends as possible.
+
+    Within a run every reference is fetched once; the references still unknown after a lookup in the
+    optional `CredentialCache` are grouped by backend and batch (the vault for 1Password, the service for
+    keyring) and each group is resolved with one call.
+
+    Parameters
+    ----------
+    backends : Iterable[CredentialBackend] | None, default=None
+        Backends by scheme, defaults to `default_backends`
+    cache : CredentialCache | None, default=None
+        Cache shared between runs; secrets are only kept in memory if ``None``
+
+    Attributes
+    ----------
+    stats : ResolverStats
+        Hit and miss counts of this resolver
+    """
+
+    def __init__(
+        self, backends: Iterable[CredentialBackend] | None = None, *, cache: CredentialCache | None = None
+    ) -> None:
+        self.backends = {
+            backend.scheme: backend for backend in (default_backends() if backends is None else backends)
+        }
+        self.cache = cache
+        self.stats = ResolverStats()
+        self._resolved: dict[str, str] = {}
+
+    @staticmethod
+    def is_reference(value: str) -> bool:
+        return '://' in value
+
+    def resolve(self, ref: str) -> str:
+        """Resolve a single reference, see `resolve_many`."""
+        return self.resolve_many([ref])[ref]
+
+    def resolve_many(self, refs: Iterable[str]) -> dict[str, str]:
+        """Resolve secret references.
+
+        Parameters
+        ----------
+        refs : Iterable[str]
+            References such as ``op://vault/item/field`` or ``keyring://service/username``; duplicates are
+            looked up once
+
+        Returns
+        -------
+        dict[str, str]
+            Secret of every reference
+
+        Raises
+        ------
+        CredentialError
+            If any reference has an unknown scheme or does not exist, listing all of them
+        """
+
+        refs = list(dict.fromkeys(refs))
+        pending: defaultdict[tuple[str, str], list[str]] = defaultdict(list)
+        unresolved = []
+        for ref in refs:
+            if ref in self._resolved:
+                self.stats.hits += 1
+            elif self.cache is not None and (value := self.cache.get(ref)) is not None:
+                self.stats.cache_hits += 1
+                self._resolved[ref] = value
+            elif (backend := self.backends.get(ref.partition('://')[0])) is None:
+                unresolved.append(ref)
+            else:
+                pending[backend.scheme, backend.group(ref)].append(ref)
+
+        for (scheme, _), batch in pending.items():
+            self.stats.batches += 1
+            self.stats.misses += len(batch)
+            values = self.backends[scheme].resolve(batch)
+            unresolved.extend(ref for ref in batch if ref not in values)
+            self._resolved.update(values)
+            if self.cache is not None:
+                for ref, value in values.items():
+                    self.cache.set(ref, value)
+
+        if self.cache is not None:
+            self.cache.flush()
+        if unresolved:
+            raise CredentialError(unresolved)
+        return {ref: self._resolved[ref] for ref in refs}
+
+    def close(self) -> None:
+        for backend in self.backends.values():
+            backend.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import difflib
+import mmap
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+    from pathlib import Path
+
+    from rich.console import Console
+
+    from .links import LinkState
+
+type Change = Literal['modified', 'binary', 'only_source', 'only_target', 'type']
+
+# Files at least this large are compared through memory maps, chunk by chunk, instead of being read whole.
+MMAP_THRESHOLD = 1 << 20
+CHUNK_SIZE = 1 << 20
+# A NUL byte in the first block marks a file as binary, as git and diff(1) do.
+BINARY_PROBE = 8192
+
+
+@dataclass(slots=True)
+class FileDiff:
+    """How one file below a conflicting source differs from its counterpart below the target.
+
+    Attributes
+    ----------
+    source : Path
+        File at (or below) the source
+    target : Path
+        Corresponding file at (or below) the target
+    change : Change
+        ``modified`` for text with a unified diff, ``binary`` for other contents, ``only_source`` and
+        ``only_target`` for files present on one side, ``type`` when one side is e.g. a directory
+    lines : list[str]
+        Unified diff lines, for ``modified`` files
+    """
+
+    source: Path
+    target: Path
+    change: Change
+    lines: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Comparison:
+    """Outcome of comparing a conflicting source with its target.
+
+    Attributes
+    ----------
+    source : Path
+        Real file or directory occupying the link path
+    target : Path
+        Path the link should point to
+    diffs : list[FileDiff]
+        Differing files, empty if the source is byte-identical to the target
+    error : str | None
+        Why the two could not be compared
+    """
+
+    source: Path
+    target: Path
+    diffs: list[FileDiff] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def identical(self) -> bool:
+        return not self.diffs and self.error is None
+
+
+def same_file(
+    a: Path, b: Path, a_stat: os.stat_result | None = None, b_stat: os.stat_result | None = None
+) -> bool:
+    """Check whether two regular files have the same contents.
+
+    The same inode is the same file, and different sizes are different contents, so most pairs are decided
+    without reading anything. Otherwise the files are compared chunk by chunk, stopping at the first chunk
+    that differs; large files are memory-mapped so the comparison never copies them through Python buffers
+    in one piece.
+
+    Parameters
+    ----------
+    a, b : Path
+        Files to compare
+    a_stat, b_stat : os.stat_result | None, default=None
+        Results of ``stat`` on the files, if already known
+
+    Returns
+    -------
+    bool
+        Whether the contents are byte-identical
+    """
+
+    a_stat = a_stat or os.stat(a)
+    b_stat = b_stat or os.stat(b)
+    if (a_stat.st_dev, a_stat.st_ino) == (b_stat.st_dev, b_stat.st_ino):
+        return True
+    if a_stat.st_size != b_stat.st_size:
+        return False
+
+    size = a_stat.st_size
+    with a.open('rb') as fa, b.open('rb') as fb:
+        if size < MMAP_THRESHOLD:
+            return fa.read() == fb.read()
+        with (
+            mmap.mmap(fa.fileno(), 0, access=mmap.ACCESS_READ) as ma,
+            mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as mb,
+        ):
+            return all(
+                ma[offset : offset + CHUNK_SIZE] == mb[offset : offset + CHUNK_SIZE]
+                for offset in range(0, size, CHUNK_SIZE)
+            )
+
+
+def walk_tree(root: Path) -> dict[str, os.stat_result]:
+    """Map the relative path of everything below a directory to its ``lstat`` result."""
+    entries, stack = {}, ['']
+    while stack:
+        rel = stack.pop()
+        with os.scandir(root / rel if rel else root) as it:
+            for entry in it:
+                name = f'{rel}/{entry.name}' if rel else entry.name
+                entries[name] = entry.stat(follow_symlinks=False)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+    return entries
+
+
+def _diff_file(source: Path, target: Path, context: int | None) -> FileDiff | None:
+    if same_file(source, target):
+        return None
+    if context is None:
+        return FileDiff(source, target, 'modified')
+    a, b = source.read_bytes(), target.read_bytes()
+    if b'\0' in a[:BINARY_PROBE] or b'\0' in b[:BINARY_PROBE]:
+        return FileDiff(source, target, 'binary')
+    lines = difflib.unified_diff(
+        a.decode(errors='replace').splitlines(keepends=True),
+        b.decode(errors='replace').splitlines(keepends=True),
+        fromfile=str(source),
+        tofile=str(target),
+        n=context,
+    )
+    return FileDiff(source, target, 'modified', list(lines))
+
+
+def _diff_entry(
+    source: Path, target: Path, a: os.stat_result, b: os.stat_result, context: int | None
+) -> FileDiff | None:
+    if stat.S_IFMT(a.st_mode) != stat.S_IFMT(b.st_mode):
+        return FileDiff(source, target, 'type')
+    if stat.S_ISLNK(a.st_mode):
+        return None if os.readlink(source) == os.readlink(target) else FileDiff(source, target, 'modified')
+    if stat.S_ISREG(a.st_mode):
+        return _diff_file(source, target, context)
+    return None
+
+
+def compare(source: Path, target: Path, *, context: int = 3, first: bool = False) -> Comparison:
+    """Compare a real file or directory with the target it should link to.
+
+    Directories are compared file by file; symlinks inside them are compared by their values.
+
+    Parameters
+    ----------
+    source : Path
+        File or directory occupying the link path
+    target : Path
+        Path the link should point to; symlinks to it are followed
+    context : int, default=3
+        Lines of context in unified diffs
+    first : bool, default=False
+        Stop at the first difference, without computing its diff, for callers that only need to know
+        whether the two are identical
+
+    Returns
+    -------
+    Comparison
+        Every differing file, or just the first one
+    """
+
+    result = Comparison(source, target)
+    lines = None if first else context
+    try:
+        a, b = os.lstat(source), os.stat(target)
+        if not (stat.S_ISDIR(a.st_mode) and stat.S_ISDIR(b.st_mode)):
+            if diff := _diff_entry(source, target, a, b, lines):
+                result.diffs.append(diff)
+            return result
+
+        left, right = walk_tree(source), walk_tree(target)
+        for rel in sorted(left.keys() | right.keys()):
+            if rel not in right:
+                diff = FileDiff(source / rel, target / rel, 'only_source')
+            elif rel not in left:
+                diff = FileDiff(source / rel, target / rel, 'only_target')
+            elif (diff := _diff_entry(source / rel, target / rel, left[rel], right[rel], lines)) is None:
+                continue
+            result.diffs.append(diff)
+            if first:
+                break
+    except OSError as e:
+        result.error = str(e)
+    return result
+
+
+def compare_states(
+    states: Iterable[LinkState], *, workers: int | None = None, context: int = 3, first: bool = False
+) -> list[Comparison]:
+    """Compare every conflicting (``NONLINK``) source with its existing target, on a thread pool.
+
+    Parameters
+    ----------
+    states : Iterable[LinkState]
+        Captured link states; other statuses and missing targets are skipped
+    workers : int | None, default=None
+        Number of threads; ``None`` uses the thread pool default and ``1`` compares serially
+    context : int, default=3
+        Lines of context in unified diffs
+    first : bool, default=False
+        Stop each comparison at its first difference, see `compare`
+
+    Returns
+    -------
+    list[Comparison]
+        Comparisons in the order of ``states``
+    """
+
+    pairs = [
+        (state.source, state.target) for state in states if state.status == 'NONLINK' and state.target_exists
+    ]
+
+    def _compare(pair: tuple[Path, Path]) -> Comparison:
+        return compare(*pair, context=context, first=first)
+
+    if workers == 1 or len(pairs) < 2:
+        return list(map(_compare, pairs))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dk-diff') as executor:
+        return list(executor.map(_compare, pairs))
+
+
+def identical_sources(states: Iterable[LinkState], *, workers: int | None = None) -> set[Path]:
+    """Find the conflicting sources that are byte-identical to their targets.
+
+    Such sources hold nothing the dotfiles repository does not, so they can be replaced by their link
+    without keeping a backup.
+    """
+
+    return {
+        comparison.source
+        for comparison in compare_states(states, workers=workers, first=True)
+        if comparison.identical
+    }
+
+
+def print_comparisons(console: Console, comparisons: Sequence[Comparison]) -> None:
+    """Print a unified diff, or a one-line summary, for every differing file."""
+    from rich.text import Text
+
+    styles = {'+': 'green', '-': 'red', '@': 'cyan'}
+    for comparison in comparisons:
+        if comparison.error is not None:
+            console.print(f'[red]Cannot compare {comparison.source}: {comparison.error}[/red]')
+        elif comparison.identical:
+            console.print(f'[dim]{comparison.source} is identical to {comparison.target}[/dim]')
+
+        for diff in comparison.diffs:
+            if diff.change == 'modified' and diff.lines:
+                for line in diff.lines:
+                    console.print(Text(line.rstrip('\n'), style=styles.get(line[:1], '')), highlight=False)
+            elif diff.change == 'modified':
+                console.print(f'[yellow]Symlinks {diff.source} and {diff.target} differ[/yellow]')
+            elif diff.change == 'binary':
+                console.print(f'[yellow]Binary files {diff.source} and {diff.target} differ[/yellow]')
+            elif diff.change == 'only_source':
+                console.print(f'[yellow]Only in {diff.source.parent}: {diff.source.name}[/yellow]')
+            elif diff.change == 'only_target':
+                console.print(f'[yellow]Only in {diff.target.parent}: {diff.target.name}[/yellow]')
+            else:
+                console.print(f'[yellow]{diff.source} and {diff.target} are of different types[/yellow]')
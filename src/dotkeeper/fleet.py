@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from . import tracing
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from .links import LinkState
+    from .models import Config
+    from .sync import SyncAction
+
+
+@dataclass(slots=True)
+class RootResult:
+    """Outcome of applying the configuration to one home root.
+
+    Attributes
+    ----------
+    root : Path
+        Directory standing in for ``$HOME`` and ``~``
+    links : int
+        Number of configured links
+    correct : int
+        Links that were already correct
+    pending : list[LinkState]
+        Links that are missing, incorrect or blocked by a regular file
+    missing_targets : int
+        Pending links whose target does not exist
+    copies : list[list[SyncAction]]
+        Planned actions of each copy-mode entry, see `dotkeeper.sync.plan_copies`
+    copy_changes : int
+        Planned actions that change a copy
+    applied : int
+        Links created or repaired
+    copied : int
+        Files copied into copy-mode entries
+    backups : list[str]
+        Ids of the backup snapshots of the replaced originals and overwritten copies
+    stored_bytes : int
+        New data added to the backup store
+    error : str | None
+        Why the root could not be scanned or applied
+    """
+
+    root: Path
+    links: int = 0
+    correct: int = 0
+    pending: list[LinkState] = field(default_factory=list)
+    missing_targets: int = 0
+    copies: list[list[SyncAction]] = field(default_factory=list)
+    copy_changes: int = 0
+    applied: int = 0
+    copied: int = 0
+    backups: list[str] = field(default_factory=list)
+    stored_bytes: int = 0
+    error: str | None = None
+
+
+def read_roots(roots: str | None = None, roots_file: Path | None = None) -> list[Path]:
+    """Collect the home roots given on the command line and in a roots file.
+
+    Parameters
+    ----------
+    roots : str | None, default=None
+        Comma-separated directories
+    roots_file : Path | None, default=None
+        File with one directory per line; blank lines and lines starting with ``#`` are ignored
+
+    Returns
+    -------
+    list[Path]
+        Absolute roots in the order given, without duplicates
+    """
+
+    names = roots.split(',') if roots else []
+    if roots_file is not None:
+        names.extend(
+            line for line in roots_file.read_text().splitlines() if not line.lstrip().startswith('#')
+        )
+    paths = (Path(name.strip()).expanduser().absolute() for name in names if name.strip())
+    return list(dict.fromkeys(paths))
+
+
+def load_raw_config(path: Path) -> Any:
+    """Parse a YAML configuration without interpolating it."""
+    import yaml
+
+    return yaml.load(path.read_bytes(), Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))  # noqa: S506
+
+
+def root_config(raw: Any, root: Path, *, profile: str | None = None, host: str | None = None) -> Config:
+    """Interpolate and validate a parsed configuration for one home root.
+
+    ``$HOME`` is substituted with ``root``, every other variable comes from the environment; the process
+    environment itself is left alone.
+
+    Parameters
+    ----------
+    raw : Any
+        Configuration from `load_raw_config`
+    root : Path
+        Home root
+    profile : str | None, default=None
+        Profile to flatten the configuration for
+    host : str | None, default=None
+        Host whose overlay is merged last
+
+    Returns
+    -------
+    Config
+        Flattened configuration
+    """
+
+    from .interp import Interpolator
+    from .models import Config
+
+    interpolator = Interpolator({**os.environ, 'HOME': str(root)})
+    return Config.from_dict(interpolator.expand(raw)).resolve_profile(profile, host)
+
+
+def scan_root(
+    raw: Any, root: Path, *, profile: str | None, host: str | None, workers: int | None = None
+) -> RootResult:
+    """Scan the links and plan the copy-mode entries of one home root; runs in a worker process."""
+    from .cli import iter_symlinks
+    from .sync import SyncReport, plan_copies
+    from .trees import expanduser
+
+    result = RootResult(root)
+    try:
+        config = root_config(raw, root, profile=profile, host=host)
+        states = list(iter_symlinks(config.all_links(home=str(root)), workers=workers))
+        copies = {
+            expanduser(source, str(root)): expanduser(target, str(root))
+            for source, target in config.copies().items()
+        }
+    except (OSError, ValueError, LookupError) as e:
+        result.error = str(e)
+        return result
+
+    report = SyncReport()
+    result.copies = plan_copies(copies, report, workers=workers)
+    result.copy_changes = sum(action.action != 'metadata' for actions in result.copies for action in actions)
+    if report.errors:
+        result.error = '; '.join(report.errors)
+
+    result.links = len(states)
+    result.correct = sum(state.status == 'CORRECT' for state in states)
+    result.pending = [state for state in states if state.status != 'CORRECT']
+    result.missing_targets = sum(not state.target_exists for state in result.pending)
+    return result
+
+
+def apply_root(result: RootResult, *, store_root: Path | None = None) -> RootResult:
+    """Apply the pending links and sync the copies of one home root; runs in a worker process."""
+    from .backupstore import BackupStore
+    from .diff import identical_sources
+    from .journal import Transaction
+    from .sync import SyncReport, apply_copies
+
+    store = BackupStore(store_root)
+    if result.pending:
+        # Conflicting files identical to their targets are replaced without a backup, as by `dk apply`.
+        txn = Transaction.begin(result.pending, identical=identical_sources(result.pending))
+        try:
+            txn.apply()
+        except Exception as e:
+            txn.rollback()
+            result.error = f'{e} (rolled back)'
+            return result
+
+        result.applied = len(result.pending)
+        try:
+            snapshot = txn.commit(store)
+        except OSError as e:
+            result.error = f'Could not store the backup: {e}'
+            return result
+        if snapshot is not None:
+            result.backups.append(snapshot.id)
+            result.stored_bytes += txn.stored_bytes
+
+    if not result.copy_changes:
+        return result
+    replaced = [action.destination for actions in result.copies for action in actions if action.replaces]
+    try:
+        stored = store.snapshot((path, path) for path in replaced) if replaced else None
+    except OSError as e:
+        result.error = f'Could not store the backup: {e}'
+        return result
+    if stored is not None:
+        result.backups.append(stored[0].id)
+        result.stored_bytes += stored[1]
+
+    report = SyncReport()
+    apply_copies(result.copies, report)
+    result.copied = report.copied
+    if report.errors:
+        result.error = '; '.join(report.errors)
+    return result
+
+
+def _executor(processes: int | None) -> ProcessPoolExecutor:
+    # Forking a process that may already run threads is unsafe; a fork server starts clean workers cheaply.
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+
+
+def print_fleet_report(console: Console, results: list[RootResult]) -> None:
+    """Print one table summarizing every root."""
+    from rich.table import Table
+
+    from .backup import format_size
+
+    table = Table(title='Fleet')
+    numbers = {'Links', 'Correct', 'Changes', 'Applied', 'Copied'}
+    for column in ('Root', 'Links', 'Correct', 'Changes', 'Applied', 'Copied', 'Backup', 'Status'):
+        table.add_column(column, justify='right' if column in numbers else 'left')
+    for result in results:
+        backup = f'{", ".join(result.backups)} ({format_size(result.stored_bytes)})' if result.backups else ''
+        if result.error:
+            status = f'[red]{result.error}[/red]'
+        elif result.missing_targets:
+            status = f'[yellow]{result.missing_targets} missing targets[/yellow]'
+        else:
+            status = '[green]ok[/green]'
+        table.add_row(
+            str(result.root),
+            str(result.links),
+            str(result.correct),
+            str(len(result.pending) + result.copy_changes),
+            str(result.applied),
+            str(result.copied),
+            backup,
+            status,
+        )
+    console.print(table)
+
+    failed = sum(result.error is not None for result in results)
+    console.print(
+        f'[dim]{len(results)} roots, {sum(result.links for result in results)} links, '
+        f'{sum(result.applied for result in results)} applied, '
+        f'{sum(result.copied for result in results)} files copied, {failed} failed[/dim]'
+    )
+
+
+def apply_fleet(
+    console: Console,
+    config_path: Path,
+    roots: list[Path],
+    *,
+    profile: str | None = None,
+    host: str | None = None,
+    workers: int | None = None,
+    processes: int | None = None,
+    assume_yes: bool = False,
+    store_root: Path | None = None,
+) -> bool:
+    """Apply one configuration to many home roots, one worker process per root at a time.
+
+    The configuration is parsed once and interpolated per root (see `root_config`). All roots are scanned
+    first; after a single confirmation, each root with pending links is applied in its own journaled
+    transaction and its copy-mode entries are synced (see `dotkeeper.sync.sync_copies`), and the replaced
+    originals and overwritten copies go to the shared backup store. The persistent link index is not
+    used, since it tracks the links of the current home only.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    config_path : Path
+        Configuration file
+    roots : list[Path]
+        Directories to apply the configuration to, each standing in for ``$HOME`` and ``~``
+    profile : str | None, default=None
+        Profile to flatten the configuration for
+    host : str | None, default=None
+        Host whose overlay is merged last
+    workers : int | None, default=None
+        Scanner threads per worker process
+    processes : int | None, default=None
+        Number of worker processes, defaults to the number of CPUs
+    assume_yes : bool, default=False
+        Apply without asking for confirmation
+    store_root : Path | None, default=None
+        Backup store directory, see `dotkeeper.backupstore.BackupStore`
+
+    Returns
+    -------
+    bool
+        Whether every root was scanned and applied without errors
+    """
+
+    from rich.prompt import Confirm
+
+    raw = load_raw_config(config_path)
+    with _executor(processes) as executor:
+        with tracing.span('fleet.scan', roots=len(roots)):
+            scan = partial(scan_root, raw, profile=profile, host=host, workers=workers)
+            results = list(executor.map(scan, roots))
+
+        pending = [
+            i
+            for i, result in enumerate(results)
+            if (result.pending or result.copy_changes) and result.error is None
+        ]
+        changes = sum(len(results[i].pending) + results[i].copy_changes for i in pending)
+        if pending:
+            console.print(f'[bold cyan]{changes} changes across {len(pending)} roots[/bold cyan]')
+            if not assume_yes and not Confirm.ask('Do you want to apply all changes?'):
+                print_fleet_report(console, results)
+                console.print('[yellow]Exiting without making any changes[/yellow]')
+                return True
+
+            with tracing.span('fleet.apply', roots=len(pending), links=changes):
+                apply = partial(apply_root, store_root=store_root)
+                for i, result in zip(
+                    pending, executor.map(apply, [results[i] for i in pending]), strict=True
+                ):
+                    results[i] = result
+
+    print_fleet_report(console, results)
+    return all(result.error is None for result in results)
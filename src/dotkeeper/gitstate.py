@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+from pathlib import Path
+
+import msgspec
+
+# Fixed part of an index entry: ctime, mtime (seconds and nanoseconds), dev, ino, mode, uid, gid and size.
+_ENTRY = struct.Struct('>10I')
+_FLAG_EXTENDED = 0x4000
+_FLAG_STAGE = 0x3000
+_NAME_MASK = 0x0FFF
+
+
+class IndexEntry(msgspec.Struct, array_like=True, frozen=True):
+    """The parts of a git index entry needed to tell whether the work tree file still matches it."""
+
+    oid: str
+    mtime_ns: int
+    ino: int
+    size: int
+    conflicted: bool = False
+
+
+class TrackedFile(msgspec.Struct, array_like=True, frozen=True):
+    """Object id of a tracked file's content in the work tree, and the inode holding it."""
+
+    oid: str
+    ino: int
+
+
+class RepoState(msgspec.Struct):
+    """Checked out commit and tracked files of a work tree, by path relative to its root."""
+
+    head: str | None
+    files: dict[str, TrackedFile]
+
+
+def find_git_dir(path: Path) -> tuple[Path, Path] | None:
+    """Find the repository a path belongs to.
+
+    Parameters
+    ----------
+    path : Path
+        Directory inside a work tree
+
+    Returns
+    -------
+    tuple[Path, Path] | None
+        Work tree root and git directory (following ``gitdir:`` files of worktrees and submodules), or
+        ``None`` if the path is not inside a repository
+    """
+
+    for root in (path, *path.parents):
+        dot_git = root / '.git'
+        if dot_git.is_dir():
+            return root, dot_git
+        if dot_git.is_file():
+            line = dot_git.read_text().strip()
+            if line.startswith('gitdir:'):
+                return root, (root / line.removeprefix('gitdir:').strip()).resolve()
+    return None
+
+
+def _common_dir(git_dir: Path) -> Path:
+    # Linked worktrees keep refs and config in the main repository's git directory.
+    try:
+        return (git_dir / (git_dir / 'commondir').read_text().strip()).resolve()
+    except OSError:
+        return git_dir
+
+
+def _resolve_ref(git_dir: Path, ref: str) -> str | None:
+    common = _common_dir(git_dir)
+    for _ in range(10):  # symbolic refs may point to symbolic refs, but not forever
+        if not ref.startswith('ref:'):
+            return ref or None
+        name = ref.removeprefix('ref:').strip()
+        for directory in (git_dir, common):
+            try:
+                ref = (directory / name).read_text().strip()
+                break
+            except OSError:
+                continue
+        else:
+            return _packed_ref(common, name)
+    return None
+
+
+def _packed_ref(common: Path, name: str) -> str | None:
+    try:
+        lines = (common / 'packed-refs').read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        if line and line[0] not in '#^':
+            oid, _, ref = line.partition(' ')
+            if ref == name:
+                return oid
+    return None
+
+
+def read_head(git_dir: Path) -> str | None:
+    """Object id of the commit checked out in a repository, ``None`` on an unborn branch."""
+    try:
+        head = (git_dir / 'HEAD').read_text().strip()
+    except OSError:
+        return None
+    return _resolve_ref(git_dir, head)
+
+
+def _hash_size(git_dir: Path) -> int:
+    try:
+        config = (_common_dir(git_dir) / 'config').read_text()
+    except OSError:
+        return 20
+    return 32 if 'objectformat = sha256' in config.replace('\t', ' ').lower() else 20
+
+
+def _varint(data: bytes, offset: int) -> tuple[int, int]:
+    # The offset encoding of index v4 path prefixes (see `git help format-index`).
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+
+def read_index(git_dir: Path) -> dict[str, IndexEntry]:
+    """Parse the entries of a repository's index file, without running git.
+
+    Versions 2 to 4 are supported, with SHA-1 or SHA-256 object ids. Extensions are ignored.
+
+    Parameters
+    ----------
+    git_dir : Path
+        Git directory of the repository
+
+    Returns
+    -------
+    dict[str, IndexEntry]
+        Entry by path relative to the work tree, with ``/`` separators; empty if there is no index
+
+    Raises
+    ------
+    ValueError
+        If the index is malformed or of an unsupported version
+    """
+
+    try:
+        data = (git_dir / 'index').read_bytes()
+    except FileNotFoundError:
+        return {}
+
+    signature, version, count = struct.unpack_from('>4sII', data)
+    if signature != b'DIRC' or version not in {2, 3, 4}:
+        raise ValueError(f'Unsupported git index in {git_dir}')
+
+    hash_size = _hash_size(git_dir)
+    entries: dict[str, IndexEntry] = {}
+    offset, name = 12, b''
+    try:
+        for _ in range(count):
+            start = offset
+            _, _, mtime_s, mtime_ns, _, ino, _, _, _, size = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            oid = data[offset : offset + hash_size].hex()
+            offset += hash_size
+            (flags,) = struct.unpack_from('>H', data, offset)
+            offset += 2
+            if flags & _FLAG_EXTENDED:
+                offset += 2
+
+            if version == 4:
+                strip, offset = _varint(data, offset)
+                end = data.index(b'\0', offset)
+                name = name[: len(name) - strip] + data[offset:end]
+                offset = end + 1
+            else:
+                length = flags & _NAME_MASK
+                end = data.index(b'\0', offset) if length == _NAME_MASK else offset + length
+                name = data[offset:end]
+                # Entries are NUL-padded to a multiple of eight bytes.
+                offset = start + ((end - start + 8) & ~7)
+
+            path = os.fsdecode(name)
+            conflicted = bool(flags & _FLAG_STAGE)
+            entries[path] = IndexEntry(oid, mtime_s * 1_000_000_000 + mtime_ns, ino, size, conflicted)
+    except (struct.error, ValueError, IndexError) as e:
+        raise ValueError(f'Malformed git index in {git_dir}') from e
+    return entries
+
+
+def blob_id(path: Path, hash_size: int = 20) -> str | None:
+    """Git object id of a file's content, as ``git hash-object`` computes it; ``None`` if it is missing."""
+    try:
+        data = os.readlink(path).encode() if path.is_symlink() else path.read_bytes()
+    except OSError:
+        return None
+    digest = hashlib.sha1 if hash_size == 20 else hashlib.sha256
+    return digest(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class GitChanges:
+    """Detect the files of a dotfiles repository that changed since an earlier run.
+
+    The content of every tracked file is taken from the index, and only files whose ``lstat`` disagrees with
+    their index entry (edited but not staged, or written too close to the index to tell) are read and
+    hashed, the way ``git status`` does. Comparing that with a state recorded by an earlier run yields the
+    changed paths, whether they changed by a commit, a checkout, a pull, staging or an unstaged edit.
+
+    Parameters
+    ----------
+    root : Path
+        Work tree root
+    git_dir : Path
+        Git directory, see `find_git_dir`
+    """
+
+    def __init__(self, root: Path, git_dir: Path) -> None:
+        self.root = root
+        self.git_dir = git_dir
+        self.state = self._current()
+
+    @classmethod
+    def open(cls, path: Path | str) -> GitChanges | None:
+        """Open the repository containing a path, or return ``None`` if there is none or it is unreadable."""
+        path = Path(path).absolute()
+        if (found := find_git_dir(path)) is None:
+            return None
+        try:
+            return cls(*found)
+        except (OSError, ValueError):
+            return None
+
+    def _current(self) -> RepoState:
+        hash_size = _hash_size(self.git_dir)
+        entries = read_index(self.git_dir)
+        try:
+            index_mtime = os.stat(self.git_dir / 'index').st_mtime_ns
+        except OSError:
+            index_mtime = 0
+
+        files = {}
+        for name, entry in entries.items():
+            path = self.root / name
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue  # deleted in the work tree
+            if (
+                not entry.conflicted
+                and st.st_mtime_ns == entry.mtime_ns
+                and st.st_size == entry.size
+                and st.st_ino & 0xFFFFFFFF == entry.ino
+                # A file modified in the same instant the index was written may differ from its entry.
+                and entry.mtime_ns < index_mtime
+            ):
+                files[name] = TrackedFile(entry.oid, st.st_ino)
+            elif (oid := blob_id(path, hash_size)) is not None:
+                files[name] = TrackedFile(oid, st.st_ino)
+        return RepoState(read_head(self.git_dir), files)
+
+    def changed(self, since: RepoState | None) -> set[Path] | None:
+        """Absolute paths of the tracked files added, modified, replaced or removed since an earlier state.
+
+        Parameters
+        ----------
+        since : RepoState | None
+            `state` as recorded by an earlier run
+
+        Returns
+        -------
+        set[Path] | None
+            Changed paths, or ``None`` if there is no earlier state so everything has to be considered changed
+        """
+
+        if since is None:
+            return None
+        current = self.state.files
+        names = {name for name, file in current.items() if since.files.get(name) != file}
+        names.update(name for name in since.files if name not in current)
+        return {self.root / name for name in names}
+
+    def is_tracked(self, path: Path | str) -> bool:
+        """Whether a path is a file tracked in the work tree (and present in it)."""
+        try:
+            name = Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return False
+        return name in self.state.files
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+# One pass over a string finds every placeholder: ``$$``, ``$NAME``, ``${NAME}`` or ``${NAME:-default}``.
+_PLACEHOLDER = re.compile(
+    r"""
+    \$(?:
+        (?P<escaped>\$)
+      | (?P<named>[_a-zA-Z][_a-zA-Z0-9]*)
+      | \{(?P<braced>[_a-zA-Z][_a-zA-Z0-9]*)(?::-(?P<default>[^}]*))?\}
+    )
+    """,
+    re.VERBOSE,
+)
+
+
+class MissingVariablesError(KeyError):
+    """Raised when a configuration references environment variables that are not set."""
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.names = tuple(sorted(set(names)))
+        super().__init__(*self.names)
+
+    def __str__(self) -> str:
+        return f'Undefined environment variables: {", ".join(self.names)}'
+
+
+class Interpolator:
+    """Expand environment variables in configuration strings.
+
+    Supported forms are ``$NAME``, ``${NAME}``, ``${NAME:-default}`` (``default`` is used if ``NAME`` is
+    unset or empty, and is taken literally) and ``$$`` for a literal ``$``; a ``$`` followed by anything else
+    is kept as is.
+
+    Each distinct string is scanned once by a single precompiled pattern and its result memoized, so strings
+    repeated throughout a config, such as ``$HOME/dotfiles``, are only expanded once, and every variable is
+    looked up once. Substituted values are inserted verbatim and never expanded again. Missing variables do
+    not stop the expansion; they are collected so that all of them can be reported at once.
+
+    Parameters
+    ----------
+    environ : Mapping[str, str] | None, default=None
+        Variables to substitute, defaults to ``os.environ``
+
+    Attributes
+    ----------
+    used : dict[str, str | None]
+        Every variable that was looked up and its value, ``None`` if it is unset
+    missing : set[str]
+        Variables that were referenced without a default but are unset
+    """
+
+    __slots__ = ('_environ', '_memo', 'missing', 'used')
+
+    def __init__(self, environ: Mapping[str, str] | None = None) -> None:
+        self._environ = os.environ if environ is None else environ
+        self._memo: dict[str, str] = {}
+        self.used: dict[str, str | None] = {}
+        self.missing: set[str] = set()
+
+    def _lookup(self, name: str) -> str | None:
+        try:
+            return self.used[name]
+        except KeyError:
+            value = self.used[name] = self._environ.get(name)
+            return value
+
+    def interpolate(self, text: str) -> str:
+        """Expand the variables in a single string.
+
+        Unset variables without a default expand to an empty string and are added to `missing`.
+
+        Parameters
+        ----------
+        text : str
+            String to expand
+
+        Returns
+        -------
+        str
+            Expanded string
+        """
+
+        if '$' not in text:
+            return text
+        if (result := self._memo.get(text)) is not None:
+            return result
+
+        result = self._memo[text] = _PLACEHOLDER.sub(self._replace, text)
+        return result
+
+    def _replace(self, match: re.Match[str]) -> str:
+        escaped, named, braced, default = match.groups()
+        if escaped:
+            return '$'
+        name = named or braced
+        value = self._lookup(name)
+        if default is not None and not value:
+            return default
+        if value is None:
+            self.missing.add(name)
+            return ''
+        return value
+
+    def expand(self, config: Any) -> Any:
+        """Expand the variables in every key and string value of a nested config.
+
+        Parameters
+        ----------
+        config : Any
+            Parsed YAML: dicts, lists, strings and other scalars
+
+        Returns
+        -------
+        Any
+            Config with the same structure and expanded strings
+
+        Raises
+        ------
+        MissingVariablesError
+            If any referenced variable is unset, listing all of them
+        """
+
+        result = self._expand(config)
+        if self.missing:
+            raise MissingVariablesError(self.missing)
+        return result
+
+    def _expand(self, config: Any) -> Any:
+        if isinstance(config, str):
+            return self.interpolate(config)
+        if isinstance(config, dict):
+            interpolate, expand = self.interpolate, self._expand
+            return {interpolate(k) if isinstance(k, str) else k: expand(v) for k, v in config.items()}
+        if isinstance(config, list):
+            return [self._expand(item) for item in config]
+        return config
@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+import msgspec
+
+from .backup import BackupReport, backup_item
+from .config import get_data_dir
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Sequence
+
+    from rich.console import Console
+
+    from .backupstore import BackupStore, Snapshot
+    from .links import LinkState
+
+JOURNAL_FILE = 'journal.jsonl'
+
+
+class JournalEntry(msgspec.Struct, frozen=True):
+    """One link swap: replace ``source`` with a symlink to ``target``, keeping the original at ``backup``.
+
+    An ``identical`` original had the same contents as the target, so it is not backed up; rolling back
+    restores a copy of the target instead.
+    """
+
+    source: str
+    target: str
+    backup: str | None
+    identical: bool = False
+
+
+class JournalHeader(msgspec.Struct, frozen=True, tag='begin'):
+    id: str
+    host: str
+    created_ns: int
+    entries: list[JournalEntry]
+
+
+class JournalStep(msgspec.Struct, frozen=True, tag='step'):
+    index: int
+    step: Literal['backed_up', 'linked']
+
+
+def get_transactions_dir() -> Path:
+    """Get the directory holding the journals and backups of unfinished transactions.
+
+    Returns
+    -------
+    Path
+        Path to the transactions directory
+    """
+
+    return get_data_dir() / 'transactions'
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _points_to(path: Path, target: str) -> bool:
+    try:
+        return os.readlink(path) == target
+    except OSError:
+        return False
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _copy_tree(source: Path, destination: Path) -> None:
+    if source.is_dir():
+        shutil.copytree(source, destination, symlinks=True)
+    else:
+        shutil.copy2(source, destination)
+
+
+class Transaction:
+    """A journaled batch of link swaps that can be rolled back or forward after a crash.
+
+    The journal is an append-only JSON-lines file under `get_transactions_dir`. Its first record lists every
+    planned swap and is flushed to disk before anything is touched; later records only mark progress. Every
+    swap creates the new symlink under a temporary name next to the source and moves it into place with
+    ``os.replace``, so the source path always holds either the original (or its backup) or the new link.
+    Recovery re-derives what is left to do from the filesystem, which keeps it correct even if the last
+    progress records were lost.
+    """
+
+    def __init__(self, path: Path, header: JournalHeader, completed: dict[int, str] | None = None) -> None:
+        self.path = path
+        self.header = header
+        self.completed = completed or {}
+        self.report = BackupReport()
+        self.stored_bytes = 0
+        self._journal = None
+        self._lock = threading.Lock()
+
+    @property
+    def id(self) -> str:
+        return self.header.id
+
+    @classmethod
+    def begin(
+        cls, states: Sequence[LinkState], *, root: Path | None = None, identical: Collection[Path] = ()
+    ) -> Transaction:
+        """Start a transaction and durably record its plan.
+
+        Parameters
+        ----------
+        states : Sequence[LinkState]
+            Links to (re)create; incorrect links and non-links are backed up first
+        root : Path | None, default=None
+            Directory to keep the transaction in, defaults to `get_transactions_dir`
+        identical : Collection[Path], default=()
+            Sources known to be byte-identical to their targets (see `dotkeeper.diff.identical_sources`),
+            which are replaced without a backup
+
+        Returns
+        -------
+        Transaction
+            Open transaction
+        """
+
+        txid = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        path = (root or get_transactions_dir()) / txid
+        (path / 'backups').mkdir(parents=True)
+
+        entries = [
+            JournalEntry(
+                str(state.source),
+                str(state.target),
+                # Prefix with the position so sources sharing a basename never collide.
+                str(path / 'backups' / f'{i}-{state.source.name}')
+                if state.source_present
+                and state.status in {'INCORRECT', 'NONLINK'}
+                and state.source not in identical
+                else None,
+                identical=state.source in identical,
+            )
+            for i, state in enumerate(states)
+        ]
+        header = JournalHeader(txid, socket.gethostname(), time.time_ns(), entries)
+
+        txn = cls(path, header)
+        txn._journal = (path / JOURNAL_FILE).open('ab')
+        txn._append(header, sync=True)
+        _fsync_dir(path)
+        return txn
+
+    @classmethod
+    def load(cls, path: Path) -> Transaction:
+        """Load an unfinished transaction from its directory.
+
+        Parameters
+        ----------
+        path : Path
+            Transaction directory
+
+        Returns
+        -------
+        Transaction
+            Transaction with the progress recorded in its journal
+
+        Raises
+        ------
+        ValueError
+            If the journal is missing or its header is unreadable
+        """
+
+        decoder = msgspec.json.Decoder(JournalHeader | JournalStep)
+        header, completed = None, {}
+        try:
+            lines = (path / JOURNAL_FILE).read_bytes().splitlines()
+        except OSError as e:
+            raise ValueError(f'No journal in {path}') from e
+
+        for line in lines:
+            try:
+                record = decoder.decode(line)
+            except msgspec.DecodeError:
+                break  # torn final write
+            if isinstance(record, JournalHeader):
+                header = record
+            else:
+                completed[record.index] = record.step
+
+        if header is None:
+            raise ValueError(f'Unreadable journal in {path}')
+        return cls(path, header, completed)
+
+    @classmethod
+    def pending(cls, root: Path | None = None) -> list[Path]:
+        """List the directories of transactions that were never committed or rolled back.
+
+        Parameters
+        ----------
+        root : Path | None, default=None
+            Directory holding transactions, defaults to `get_transactions_dir`
+
+        Returns
+        -------
+        list[Path]
+            Transaction directories, oldest first
+        """
+
+        root = root or get_transactions_dir()
+        if not root.is_dir():
+            return []
+        return sorted(p for p in root.iterdir() if p.is_dir())
+
+    def _append(self, record: JournalHeader | JournalStep, *, sync: bool = False) -> None:
+        if self._journal is None:
+            self._journal = (self.path / JOURNAL_FILE).open('ab')
+        self._journal.write(msgspec.json.encode(record) + b'\n')
+        self._journal.flush()
+        if sync:
+            os.fsync(self._journal.fileno())
+
+    def _mark(self, index: int, step: Literal['backed_up', 'linked']) -> None:
+        with self._lock:
+            self.completed[index] = step
+            self._append(JournalStep(index, step))
+
+    def _back_up(self, source: Path, backup: Path) -> None:
+        # A backup only ever appears under its final name by a rename, once it is complete; a copy that was
+        # interrupted is left under the partial name and started over.
+        partial = backup.with_name(f'{backup.name}.partial')
+        _remove(partial)
+        if (
+            source.is_dir()
+            and not source.is_symlink()
+            and os.lstat(source).st_dev == backup.parent.stat().st_dev
+        ):
+            # Directories cannot be replaced atomically anyway; renaming moves the whole tree at once.
+            report = backup_item(source, backup, move=True)
+        else:
+            # Files and symlinks stay in place, hard-linked or copied into the backup, until the new link
+            # replaces them, so a crash never leaves the source path empty.
+            report = backup_item(source, partial, move=True, rename=False)
+            os.rename(partial, backup)
+        with self._lock:
+            self.report.merge(report)
+
+    def _swap(self, index: int, entry: JournalEntry, console: Console | None) -> None:
+        source = Path(entry.source)
+
+        if (
+            entry.backup is not None
+            and self.completed.get(index) not in {'backed_up', 'linked'}
+            and not _points_to(source, entry.target)
+        ):
+            if not os.path.lexists(entry.backup) and os.path.lexists(source):
+                self._back_up(source, Path(entry.backup))
+                if console is not None:
+                    console.print(f'[blue]Backed up {source} to {entry.backup}[/blue]')
+            self._mark(index, 'backed_up')
+
+        if _points_to(source, entry.target):
+            self._mark(index, 'linked')
+            return
+
+        # Directories cannot be replaced atomically; one that survived a cross-filesystem backup has been
+        # copied by now, so it is safe to remove before the swap.
+        if source.is_dir() and not source.is_symlink():
+            shutil.rmtree(source)
+
+        # Links into a fresh home (or a tree not linked before) may need their parent directories created.
+        source.parent.mkdir(parents=True, exist_ok=True)
+        tmp = source.with_name(f'.{source.name}.dk-{self.id}')
+        tmp.unlink(missing_ok=True)
+        os.symlink(entry.target, tmp)
+        os.replace(tmp, source)
+        self._mark(index, 'linked')
+        if console is not None:
+            console.print(f'[green]Created symlink: {source} -> {entry.target}[/green]')
+
+    def apply(self, console: Console | None = None) -> None:
+        """Perform (or finish) every swap in the transaction.
+
+        Each step is idempotent, so this also rolls an interrupted transaction forward.
+
+        Parameters
+        ----------
+        console : Console | None, default=None
+            Rich console for progress output
+        """
+
+        for index, entry in enumerate(self.header.entries):
+            if self.completed.get(index) != 'linked':
+                self._swap(index, entry, console)
+
+    async def apply_async(
+        self,
+        console: Console | None = None,
+        *,
+        limit: int | None = None,
+        timeout: float | None = None,  # noqa: ASYNC109 - applies to each swap, not to the whole transaction
+    ) -> None:
+        """Perform (or finish) every swap, with up to ``limit`` of them in flight at once.
+
+        Swaps are independent, so their order does not matter, unless one source lies inside another; such
+        transactions are applied one swap at a time. A swap that takes longer than ``timeout`` is still
+        allowed to finish, so the journal stays accurate, and then reported.
+
+        Parameters
+        ----------
+        console : Console | None, default=None
+            Rich console for progress output
+        limit : int | None, default=None
+            Swaps performed concurrently, defaults to `dotkeeper.aio.DEFAULT_LIMIT`
+        timeout : float | None, default=None
+            Seconds each swap may take
+
+        Raises
+        ------
+        dotkeeper.aio.OperationTimeoutError
+            If any swap took longer than ``timeout``, after every swap has finished
+        """
+
+        import anyio
+
+        from .aio import DEFAULT_LIMIT, OperationTimeoutError, run_blocking
+
+        sources = {entry.source for entry in self.header.entries}
+        nested = any(str(parent) in sources for source in sources for parent in Path(source).parents)
+        limiter = anyio.CapacityLimiter(1 if nested else limit or DEFAULT_LIMIT)
+        timed_out: list[str] = []
+
+        async def _swap(index: int, entry: JournalEntry) -> None:
+            try:
+                await run_blocking(
+                    lambda: self._swap(index, entry, console), limiter=limiter, timeout=timeout, abandon=False
+                )
+            except TimeoutError:
+                timed_out.append(entry.source)
+
+        async with anyio.create_task_group() as tg:
+            for index, entry in enumerate(self.header.entries):
+                if self.completed.get(index) != 'linked':
+                    tg.start_soon(_swap, index, entry)
+
+        if timed_out:
+            raise OperationTimeoutError(timed_out, timeout or 0)
+
+    def rollback(self, console: Console | None = None) -> None:
+        """Undo the transaction, restoring every backed-up original, and discard it.
+
+        Parameters
+        ----------
+        console : Console | None, default=None
+            Rich console for progress output
+        """
+
+        for entry in reversed(self.header.entries):
+            source = Path(entry.source)
+            source.with_name(f'.{source.name}.dk-{self.id}').unlink(missing_ok=True)
+
+            if _points_to(source, entry.target):
+                source.unlink()
+                if entry.identical:
+                    _copy_tree(Path(entry.target), source)
+                    if console is not None:
+                        console.print(f'[yellow]Restored {source} from {entry.target}[/yellow]')
+                    continue
+            if entry.backup is not None and os.path.lexists(entry.backup):
+                if os.path.lexists(source):
+                    # The original never left (the backup is a copy), keep it as it is.
+                    continue
+                shutil.move(entry.backup, source)
+                if console is not None:
+                    console.print(f'[yellow]Restored {source} from backup[/yellow]')
+        self._discard()
+
+    def commit(self, store: BackupStore | None = None) -> Snapshot | None:
+        """Finish the transaction and delete its journal and backups.
+
+        Parameters
+        ----------
+        store : BackupStore | None, default=None
+            Store to keep the backups in; the transaction stays pending until they are stored, so a failure
+            leaves it for ``dk recover``
+
+        Returns
+        -------
+        Snapshot | None
+            Snapshot of the backups, if there were any and a store was given
+        """
+
+        if self._journal is not None:
+            os.fsync(self._journal.fileno())
+        snapshot = None
+        if store is not None:
+            backups = [
+                (Path(entry.source), Path(entry.backup))
+                for entry in self.header.entries
+                if entry.backup is not None
+            ]
+            if stored := store.snapshot(backups, snapshot_id=self.id):
+                snapshot, self.stored_bytes = stored
+        self._discard()
+        return snapshot
+
+    def _discard(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        # Remove the journal first: a directory without a journal is a finished transaction.
+        (self.path / JOURNAL_FILE).unlink(missing_ok=True)
+        shutil.rmtree(self.path, ignore_errors=True)
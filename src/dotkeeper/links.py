@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import os
+import stat
+import sys
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from enum import IntEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, Protocol, cast, overload
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+type Status = Literal['MISSING', 'NONLINK', 'CORRECT', 'INCORRECT']
+
+
+class FileOps(Protocol):
+    """The filesystem calls needed to classify a link; the `os` module is the real implementation."""
+
+    def stat(self, path: Path | str) -> os.stat_result: ...
+
+    def lstat(self, path: Path | str) -> os.stat_result: ...
+
+    def readlink(self, path: Path | str) -> str: ...
+
+
+class StatusCode(IntEnum):
+    """Compact encoding of a link `Status`, as stored by `LinkTable`."""
+
+    MISSING = 0
+    NONLINK = 1
+    CORRECT = 2
+    INCORRECT = 3
+
+
+class SyscallCounter:
+    """Thread-safe tally of the filesystem calls issued while classifying links."""
+
+    __slots__ = ('_counts', '_lock')
+
+    def __init__(self) -> None:
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, op: str, count: int = 1) -> None:
+        """Record ``count`` calls of ``op`` (e.g. ``'lstat'``)."""
+        with self._lock:
+            self._counts[op] += count
+
+    @property
+    def total(self) -> int:
+        """Total number of recorded calls."""
+        with self._lock:
+            return self._counts.total()
+
+    def snapshot(self) -> dict[str, int]:
+        """Return a copy of the per-call counts."""
+        with self._lock:
+            return dict(self._counts)
+
+
+@dataclass(frozen=True, slots=True)
+class LinkState:
+    """Filesystem state of one configured link, captured once per run.
+
+    Attributes
+    ----------
+    source : Path
+        Path of the symlink
+    target : Path
+        Path the symlink should point to
+    status : Status
+        Classification of the source, see `dotkeeper.cli.check_symlink_status`
+    source_mode : int | None
+        ``st_mode`` from ``lstat`` on the source, or ``None`` if nothing exists at that path
+    link_dest : str | None
+        Raw ``readlink`` value when the source is a symlink
+    target_id : tuple[int, int] | None
+        ``(st_dev, st_ino)`` of the target, or ``None`` if the target does not exist
+    """
+
+    source: Path
+    target: Path
+    status: Status
+    source_mode: int | None
+    link_dest: str | None
+    target_id: tuple[int, int] | None
+
+    @property
+    def target_exists(self) -> bool:
+        return self.target_id is not None
+
+    @property
+    def source_present(self) -> bool:
+        """Whether anything, including a dangling symlink, occupies the source path."""
+        return self.source_mode is not None
+
+    @property
+    def source_is_symlink(self) -> bool:
+        return self.source_mode is not None and stat.S_ISLNK(self.source_mode)
+
+    @property
+    def source_is_dir(self) -> bool:
+        """Whether the source is a real directory (not a symlink to one)."""
+        return self.source_mode is not None and stat.S_ISDIR(self.source_mode)
+
+    @classmethod
+    def scan(
+        cls, source: Path, target: Path, *, counter: SyscallCounter | None = None, fs: FileOps | None = None
+    ) -> LinkState:
+        """Classify a link with as few filesystem calls as possible.
+
+        The target is stat'ed once and the source is ``lstat``'ed once; symlinks additionally cost one
+        ``readlink``. Only when an absolute link value does not lexically match the target (relative links,
+        symlinked parent directories) is the source followed with a second ``stat`` to compare inodes.
+
+        Parameters
+        ----------
+        source : Path
+            Expanded path of the symlink
+        target : Path
+            Expanded path the symlink should point to
+        counter : SyscallCounter | None, default=None
+            Counter to record the issued calls in
+        fs : FileOps | None, default=None
+            Filesystem to query, defaults to `os`
+
+        Returns
+        -------
+        LinkState
+            Captured state of the link
+        """
+
+        fs = fs or os
+
+        def _count(op: str) -> None:
+            if counter is not None:
+                counter.add(op)
+
+        _count('stat')
+        try:
+            target_stat = fs.stat(target)
+        except OSError:
+            target_id = None
+        else:
+            target_id = (target_stat.st_dev, target_stat.st_ino)
+
+        _count('lstat')
+        try:
+            source_mode = fs.lstat(source).st_mode
+        except OSError:
+            return cls(source, target, 'MISSING', None, None, target_id)
+
+        if not stat.S_ISLNK(source_mode):
+            return cls(source, target, 'NONLINK', source_mode, None, target_id)
+
+        _count('readlink')
+        try:
+            link_dest = fs.readlink(source)
+        except FileNotFoundError:
+            # Removed since it was lstat'ed.
+            return cls(source, target, 'MISSING', None, None, target_id)
+
+        if os.path.isabs(link_dest) and os.path.normpath(link_dest) == os.path.abspath(target):
+            # A dangling link counts as missing, just like `Path.exists()` reports it.
+            status = 'CORRECT' if target_id is not None else 'MISSING'
+            return cls(source, target, status, source_mode, link_dest, target_id)
+
+        _count('stat')
+        try:
+            resolved = fs.stat(source)
+        except OSError:
+            return cls(source, target, 'MISSING', source_mode, link_dest, target_id)
+
+        status = 'CORRECT' if (resolved.st_dev, resolved.st_ino) == target_id else 'INCORRECT'
+        return cls(source, target, status, source_mode, link_dest, target_id)
+
+
+# Stands in for ``None`` in the unsigned columns of `LinkTable`.
+_NONE = 2**64 - 1
+
+
+class LinkTable(Sequence[LinkState]):
+    """Column-oriented, append-only collection of link states.
+
+    Paths and link values are kept as interned strings, statuses as one-byte `StatusCode`s and modes and
+    target identities in typed arrays, which takes a fraction of the memory of a list of `LinkState` objects
+    (each holding two `Path` objects and a tuple). Indexing or iterating materializes `LinkState` views on
+    demand, so the table can be passed wherever a ``Sequence[LinkState]`` is expected.
+
+    Parameters
+    ----------
+    states : Iterable[LinkState], default=()
+        Initial states
+    """
+
+    __slots__ = ('_devs', '_inos', '_link_dests', '_modes', '_sources', '_statuses', '_targets')
+
+    def __init__(self, states: Iterable[LinkState] = ()) -> None:
+        self._sources: list[str] = []
+        self._targets: list[str] = []
+        self._statuses = array('B')
+        self._modes = array('Q')
+        self._link_dests: list[str | None] = []
+        self._devs = array('Q')
+        self._inos = array('Q')
+        self.extend(states)
+
+    def append(self, state: LinkState) -> None:
+        self._sources.append(sys.intern(str(state.source)))
+        self._targets.append(sys.intern(str(state.target)))
+        self._statuses.append(StatusCode[state.status])
+        self._modes.append(_NONE if state.source_mode is None else state.source_mode)
+        dest = state.link_dest
+        self._link_dests.append(None if dest is None else sys.intern(dest))
+        dev, ino = state.target_id or (_NONE, _NONE)
+        self._devs.append(dev)
+        self._inos.append(ino)
+
+    def extend(self, states: Iterable[LinkState]) -> None:
+        for state in states:
+            self.append(state)
+
+    def __len__(self) -> int:
+        return len(self._statuses)
+
+    def _row(self, i: int) -> LinkState:
+        mode, dev, ino = self._modes[i], self._devs[i], self._inos[i]
+        return LinkState(
+            Path(self._sources[i]),
+            Path(self._targets[i]),
+            cast('Status', StatusCode(self._statuses[i]).name),
+            None if mode == _NONE else mode,
+            self._link_dests[i],
+            None if dev == _NONE and ino == _NONE else (dev, ino),
+        )
+
+    @overload
+    def __getitem__(self, index: int) -> LinkState: ...
+    @overload
+    def __getitem__(self, index: slice) -> LinkTable: ...
+    def __getitem__(self, index: int | slice) -> LinkState | LinkTable:
+        if isinstance(index, slice):
+            return self.take(range(len(self))[index])
+        return self._row(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[LinkState]:
+        return map(self._row, range(len(self)))
+
+    def source(self, index: int) -> str:
+        """Source path of one link, without materializing its `LinkState`."""
+        return self._sources[index]
+
+    def status(self, index: int) -> Status:
+        """Status of one link, without materializing its `LinkState`."""
+        return cast('Status', StatusCode(self._statuses[index]).name)
+
+    def counts(self) -> Counter[Status]:
+        """Number of links per status."""
+        return Counter(
+            {cast('Status', StatusCode(code).name): n for code, n in Counter(self._statuses).items()}
+        )
+
+    def indices(self, *statuses: Status) -> list[int]:
+        """Positions of the links with any of the given statuses, in table order."""
+        codes = {StatusCode[status] for status in statuses}
+        return [i for i, code in enumerate(self._statuses) if code in codes]
+
+    def take(self, indices: Iterable[int]) -> LinkTable:
+        """Build a new table from the links at the given positions."""
+        table = LinkTable()
+        for i in indices:
+            table._sources.append(self._sources[i])
+            table._targets.append(self._targets[i])
+            table._statuses.append(self._statuses[i])
+            table._modes.append(self._modes[i])
+            table._link_dests.append(self._link_dests[i])
+            table._devs.append(self._devs[i])
+            table._inos.append(self._inos[i])
+        return table
+
+    def select(self, *statuses: Status) -> LinkTable:
+        """Build a new table with only the links that have one of the given statuses."""
+        return self.take(self.indices(*statuses))
@@ -1,19 +1,167 @@
-from typing import Any
+import os
+from typing import Any, Literal, cast
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ByteSize, Field
+
+
+class SecretsConfig(BaseModel):
+    """Configuration for encrypted secret files."""
+
+    identity: str | None = Field(
+        default=None,
+        description='Path to the age identity file (defaults to identity.txt in the config directory)',
+    )
+
+    recipients: list[str] = Field(
+        default_factory=list,
+        description='Additional age public keys to encrypt secrets to',
+    )
+
+    passphrase: str | None = Field(
+        default=None,
+        description=(
+            'Reference to the identity passphrase, e.g. `op://vault/item/password` or `keyring://service/user`'
+        ),
+    )
+
+    cache_ttl: int = Field(
+        default=0,
+        ge=0,
+        description=(
+            'Seconds to keep secrets fetched from 1Password or keyring in the encrypted local cache '
+            '(0 disables it)'
+        ),
+    )
+
+
+class BackupsConfig(BaseModel):
+    """Configuration for the store of replaced files."""
+
+    path: str | None = Field(
+        default=None,
+        description='Backup store directory, may be shared between hosts (defaults to the data directory)',
+    )
+
+    max_size: ByteSize = Field(
+        default=ByteSize(256 * 1024**2),
+        description='Size above which the oldest backups are deleted, e.g. `1GiB`; the newest is always kept',
+    )
+
+
+class TreeRule(BaseModel):
+    """Link every file below a directory of the dotfiles into another directory, like GNU Stow."""
+
+    source: str = Field(
+        description='Directory the links are created in, e.g. `~/.config`',
+    )
+
+    target: str = Field(
+        description='Directory whose files the links point to, e.g. `$DOTFILES/config`',
+    )
+
+    include: list[str] = Field(
+        default_factory=list,
+        description='Shell-style patterns of the files to link (all files if empty)',
+    )
+
+    exclude: list[str] = Field(
+        default_factory=lambda: ['.git'],
+        description='Shell-style patterns of files and directories to skip (by path if they contain `/`)',
+    )
+
+
+class LinkEntry(BaseModel):
+    """A link given with options, instead of as just its target path."""
+
+    target: str = Field(
+        description='Path the link points to, or the copy is synced from',
+    )
+
+    mode: Literal['link', 'copy'] = Field(
+        default='link',
+        description=(
+            '`link` for a symlink, or `copy` to keep a copy of the target in place instead, for programs '
+            'that replace symlinks when they save'
+        ),
+    )
+
+
+class ProfileConfig(BaseModel):
+    """A layer of links and templates on top of the base configuration, for a host role or a single host."""
+
+    extends: list[str] = Field(
+        default_factory=list,
+        description='Profiles applied before this one, in order',
+    )
+
+    links: dict[str, str | LinkEntry] = Field(
+        default_factory=dict,
+        description='Links added or overridden by this profile',
+    )
+
+    trees: list[TreeRule] = Field(
+        default_factory=list,
+        description='Tree rules added by this profile',
+    )
+
+    templates: dict[str, str] = Field(
+        default_factory=dict,
+        description='Templates added or overridden by this profile',
+    )
+
+    exclude: list[str] = Field(
+        default_factory=list,
+        description='Links and template outputs inherited from earlier layers that this profile removes',
+    )
 
 
 class DotfilesConfig(BaseModel):
     """Configuration for dotfiles management."""
 
-    links: dict[str, str] = Field(
+    links: dict[str, str | LinkEntry] = Field(
         default_factory=dict,
-        description='Mapping of source paths to target paths for symlinks',
+        description='Mapping of source paths to target paths, or to a `target` and `mode`, for symlinks',
     )
 
     obfuscate: dict[str, list[str]] = Field(
         default_factory=lambda: {'file_names': []},
-        description='Configuration for file obfuscation',
+        description='Configuration for file obfuscation; `file_names` lists secret files encrypted with age',
+    )
+
+    secrets: SecretsConfig = Field(
+        default_factory=SecretsConfig,
+        description='Age identity and recipients used for the files in `obfuscate.file_names`',
+    )
+
+    backups: BackupsConfig = Field(
+        default_factory=BackupsConfig,
+        description='Where files replaced by symlinks are backed up, and how much is kept',
+    )
+
+    trees: list[TreeRule] = Field(
+        default_factory=list,
+        description='Rules linking every matching file below a directory; `links` take precedence',
+    )
+
+    templates: dict[str, str] = Field(
+        default_factory=dict,
+        description='Mapping of output paths to the Jinja2 templates they are rendered from',
+    )
+
+    profiles: dict[str, ProfileConfig] = Field(
+        default_factory=dict,
+        description='Named profiles (e.g. host roles) selected with `--profile`',
+    )
+
+    hosts: dict[str, ProfileConfig] = Field(
+        default_factory=dict,
+        description='Overlays applied last on the host with the matching name',
+    )
+
+    workers: int | None = Field(
+        default=None,
+        ge=1,
+        description='Number of threads used to scan link status (defaults to the thread pool default)',
     )
 
 
@@ -40,3 +188,119 @@ class Config(BaseModel):
             Validated configuration object
         """
         return cls.model_validate(data)
+
+    def _layers(self, name: str, seen: dict[str, bool], *, host: bool = False) -> list[ProfileConfig]:
+        # Depth-first, parents before children; a profile reached twice (a diamond) is applied once.
+        key, layers = (
+            f'host:{name}' if host else name,
+            self.dotfiles.hosts if host else self.dotfiles.profiles,
+        )
+        if key in seen:
+            if not seen[key]:
+                raise ValueError(f'Profile {name!r} extends itself')
+            return []
+        if name not in layers:
+            raise ValueError(f'Unknown profile {name!r}')
+        seen[key] = False
+        parents = [layer for parent in layers[name].extends for layer in self._layers(parent, seen)]
+        seen[key] = True
+        return [*parents, layers[name]]
+
+    def resolve_profile(self, profile: str | None = None, host: str | None = None) -> 'Config':
+        """Flatten the base configuration, a profile and the overlay of a host into one link map.
+
+        Layers are applied in order, each adding, overriding or excluding links and templates, and adding tree
+        rules: the base ``dotfiles.links`` and ``dotfiles.templates``, the profile's ``extends`` chain, the
+        profile itself, then ``dotfiles.hosts[host]`` with its own ``extends`` chain.
+
+        Parameters
+        ----------
+        profile : str | None, default=None
+            Name in ``dotfiles.profiles``
+        host : str | None, default=None
+            Name in ``dotfiles.hosts``; hosts without an overlay only get the profile
+
+        Returns
+        -------
+        Config
+            Configuration without profiles or hosts, whose links, templates and tree rules are the merged ones
+
+        Raises
+        ------
+        ValueError
+            If a profile is unknown or extends itself
+        """
+
+        dotfiles = self.dotfiles
+        seen: dict[str, bool] = {}
+        layers = self._layers(profile, seen) if profile is not None else []
+        if host is not None and host in dotfiles.hosts:
+            layers += self._layers(host, seen, host=True)
+
+        links, templates, trees = dict(dotfiles.links), dict(dotfiles.templates), list(dotfiles.trees)
+        for layer in layers:
+            for name in layer.exclude:
+                links.pop(name, None)
+                templates.pop(name, None)
+            links.update(layer.links)
+            templates.update(layer.templates)
+            trees.extend(layer.trees)
+
+        flat = dotfiles.model_copy(
+            update={'links': links, 'templates': templates, 'trees': trees, 'profiles': {}, 'hosts': {}}
+        )
+        return self.model_copy(update={'dotfiles': flat})
+
+    def _targets(self, mode: Literal['link', 'copy']) -> dict[str, str]:
+        links = self.dotfiles.links
+        if mode == 'link' and all(isinstance(entry, str) for entry in links.values()):
+            return cast('dict[str, str]', links)
+        return {
+            source: entry if isinstance(entry, str) else entry.target
+            for source, entry in links.items()
+            if (entry.mode if isinstance(entry, LinkEntry) else 'link') == mode
+        }
+
+    def copies(self) -> dict[str, str]:
+        """The ``dotfiles.links`` in ``copy`` mode, see `dotkeeper.sync.sync_copies`.
+
+        Returns
+        -------
+        dict[str, str]
+            Mapping of source paths to the target paths they are copies of
+        """
+
+        return self._targets('copy')
+
+    def all_links(self, home: str | None = None) -> dict[str, str]:
+        """The explicit ``dotfiles.links`` together with the links expanded from ``dotfiles.trees``.
+
+        Parameters
+        ----------
+        home : str | None, default=None
+            Directory to expand ``~`` against in every path, for another user's home; if ``None``, paths
+            are returned as written and expanded against the current home when they are used
+
+        Returns
+        -------
+        dict[str, str]
+            Mapping of source paths to target paths, absolute if there are trees; explicit links override
+            expanded ones, and links in ``copy`` mode are left out
+        """
+
+        links = self._targets('link')
+        if not self.dotfiles.trees and home is None:
+            return links
+
+        from .trees import expand_tree_rules, expanduser
+
+        if home is not None:
+            links = {expanduser(source, home): expanduser(target, home) for source, target in links.items()}
+        if not self.dotfiles.trees:
+            return links
+        # Expanded links are keyed by absolute paths; key the explicit ones alike, so they override them, and
+        # leave out the paths that are copies instead.
+        explicit = {os.path.abspath(expanduser(source, home)): target for source, target in links.items()}
+        copies = {os.path.abspath(expanduser(source, home)) for source in self.copies()}
+        expanded = expand_tree_rules(self.dotfiles.trees, home=home)
+        return {source: target for source, target in expanded.items() if source not in copies} | explicit
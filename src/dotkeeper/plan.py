@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import os
+import socket
+import stat
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+import msgspec
+
+from .links import LinkState
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from rich.console import Console
+
+    from .backupstore import BackupStore
+
+PLAN_VERSION = 1
+
+
+class PlannedLink(msgspec.Struct, frozen=True):
+    """A link that the plan will (re)create, together with the state it was planned against."""
+
+    source: str
+    target: str
+    status: Literal['MISSING', 'NONLINK', 'INCORRECT']
+    source_mode: int | None
+    link_dest: str | None
+    target_id: tuple[int, int] | None
+
+    @classmethod
+    def from_state(cls, state: LinkState) -> PlannedLink:
+        if state.status == 'CORRECT':
+            raise ValueError(f'{state.source} is already linked correctly')
+        return cls(
+            str(state.source),
+            str(state.target),
+            state.status,
+            state.source_mode,
+            state.link_dest,
+            state.target_id,
+        )
+
+    def to_state(self) -> LinkState:
+        return LinkState(
+            Path(self.source),
+            Path(self.target),
+            self.status,
+            self.source_mode,
+            self.link_dest,
+            self.target_id,
+        )
+
+
+class Plan(msgspec.Struct):
+    """Serializable set of changes produced by ``dk plan`` and consumed by ``dk apply --plan``."""
+
+    host: str
+    links: list[PlannedLink]
+    version: int = PLAN_VERSION
+
+    @property
+    def missing_targets(self) -> list[str]:
+        return [link.target for link in self.links if link.target_id is None]
+
+
+class PlanDrift(Exception):
+    """Raised when a source no longer matches the state it was planned against."""
+
+
+def build_plan(states: Sequence[LinkState]) -> Plan:
+    """Build a change plan from scanned link states.
+
+    Parameters
+    ----------
+    states : Sequence[LinkState]
+        States as returned by `dotkeeper.cli.scan_symlinks`; correct links are left out of the plan
+
+    Returns
+    -------
+    Plan
+        Plan covering every link that needs to change
+    """
+
+    return Plan(
+        host=socket.gethostname(),
+        links=[PlannedLink.from_state(state) for state in states if state.status != 'CORRECT'],
+    )
+
+
+def dump_plan(plan: Plan) -> bytes:
+    """Serialize a plan to indented JSON.
+
+    Parameters
+    ----------
+    plan : Plan
+        Plan to serialize
+
+    Returns
+    -------
+    bytes
+        JSON document
+    """
+
+    return msgspec.json.format(msgspec.json.encode(plan), indent=2) + b'\n'
+
+
+def load_plan(path: Path | str) -> Plan:
+    """Read a plan written by ``dk plan``.
+
+    Parameters
+    ----------
+    path : Path | str
+        Path to the plan file
+
+    Returns
+    -------
+    Plan
+        Decoded plan
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid plan or was written by an incompatible version
+    """
+
+    try:
+        plan = msgspec.json.decode(Path(path).read_bytes(), type=Plan)
+    except msgspec.DecodeError as e:
+        raise ValueError(f'Invalid plan file {path}: {e}') from e
+    if plan.version != PLAN_VERSION:
+        raise ValueError(f'Unsupported plan version {plan.version} in {path} (expected {PLAN_VERSION})')
+    return plan
+
+
+def verify_planned_link(link: PlannedLink) -> LinkState | None:
+    """Check that a planned source has not changed since the plan was made.
+
+    Only the source is inspected: one ``lstat``, plus one ``readlink`` if it is a symlink. The file type and
+    link value must match what was planned; permission or content changes are not considered drift.
+
+    Parameters
+    ----------
+    link : PlannedLink
+        Planned link to verify
+
+    Returns
+    -------
+    LinkState | None
+        The planned state, safe to hand to `dotkeeper.cli.apply_changes`, or ``None`` if the source already
+        links to the planned target (e.g. the plan was applied before)
+
+    Raises
+    ------
+    PlanDrift
+        If the source was created, removed, replaced or re-pointed since planning, or cannot be inspected
+    """
+
+    try:
+        mode = os.lstat(link.source).st_mode
+        link_dest = os.readlink(link.source) if stat.S_ISLNK(mode) else None
+    except FileNotFoundError:
+        mode = link_dest = None
+    except OSError as e:
+        raise PlanDrift(f'{link.source} can no longer be inspected: {e.strerror}') from e
+
+    if link_dest == link.target:
+        return None
+
+    if mode is None or link.source_mode is None:
+        if mode != link.source_mode:
+            raise PlanDrift(f'{link.source} was {"removed" if mode is None else "created"} since planning')
+    elif stat.S_IFMT(mode) != stat.S_IFMT(link.source_mode):
+        raise PlanDrift(f'{link.source} changed type since planning')
+    elif link_dest != link.link_dest:
+        raise PlanDrift(f'{link.source} points somewhere else since planning')
+
+    return link.to_state()
+
+
+def apply_plan(
+    console: Console, plan: Plan, *, assume_yes: bool = False, store: BackupStore | None = None
+) -> int:
+    """Apply a plan produced by ``dk plan``.
+
+    Links are not re-scanned; each planned source is verified with `verify_planned_link` and skipped if it
+    drifted or is already linked, so the filesystem work is proportional to the size of the plan rather than
+    the configuration.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    plan : Plan
+        Plan to apply
+    assume_yes : bool, default=False
+        Apply without asking for confirmation
+    store : BackupStore | None, default=None
+        Store for the replaced originals, defaults to the store in the data directory
+
+    Returns
+    -------
+    int
+        Number of planned links that were skipped because they drifted
+    """
+
+    from rich.prompt import Confirm
+
+    from .cli import apply_changes
+
+    if plan.host != (host := socket.gethostname()):
+        console.print(f'[yellow]Plan was created on {plan.host}, applying on {host}[/yellow]')
+
+    states, drifted = [], 0
+    for link in plan.links:
+        try:
+            state = verify_planned_link(link)
+        except PlanDrift as e:
+            drifted += 1
+            console.print(f'[yellow]Skipping: {e}[/yellow]')
+            continue
+        if state is not None:
+            states.append(state)
+
+    if not states:
+        console.print('[green]Nothing to apply.[/green]')
+        return drifted
+
+    # Targets may have been removed since planning, so check them again rather than trusting the plan.
+    if missing_targets := [state.target for state in states if not os.path.exists(state.target)]:
+        console.print('[red]Warning: The following targets do not exist:[/red]')
+        for target in missing_targets:
+            console.print(f'[red]  - {target}[/red]')
+        if not assume_yes and not Confirm.ask('Continue anyway?'):
+            console.print('[yellow]Exiting without making any changes[/yellow]')
+            return drifted
+
+    if not assume_yes and not Confirm.ask(f'Apply {len(states)} planned changes?'):
+        console.print('[yellow]Exiting without making any changes[/yellow]')
+        return drifted
+
+    apply_changes(console=console, states=states, assume_yes=assume_yes, store=store)
+    return drifted
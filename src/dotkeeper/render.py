@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import abc
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, BinaryIO, Literal, Self
+
+import msgspec
+from rich.markup import escape
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from rich.console import Console
+
+    from .links import LinkState, Status
+
+type OutputFormat = Literal['table', 'summary', 'jsonl']
+
+STATUS_STYLES: dict[Status, str] = {
+    'CORRECT': 'green1',
+    'MISSING': 'yellow1',
+    'INCORRECT': 'red1',
+    'NONLINK': 'red1',
+}
+
+# Rows are written in batches: large enough to amortize the cost of a write, small and frequent enough that
+# output keeps up with the scanner.
+_BATCH_ROWS = 256
+_BATCH_SECONDS = 0.1
+
+
+class LinkRecord(msgspec.Struct, frozen=True):
+    """One line of ``--format jsonl`` output."""
+
+    source: str
+    target: str
+    status: str
+    target_exists: bool
+
+
+class StatusRenderer:
+    """Base class for renderers that receive link states one at a time, as they are scanned.
+
+    Renderers are context managers: `close` (called on exit) flushes buffered output and prints totals.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Counter[str] = Counter()
+
+    def add(self, state: LinkState) -> None:
+        self.counts[state.status] += 1
+
+    def extend(self, states: Iterable[LinkState]) -> None:
+        for state in states:
+            self.add(state)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class _BatchingRenderer(StatusRenderer, abc.ABC):
+    def __init__(self) -> None:
+        super().__init__()
+        self._batch: list = []
+        self._flushed = time.monotonic()
+
+    def _queue(self, row: object) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= _BATCH_ROWS or time.monotonic() - self._flushed >= _BATCH_SECONDS:
+            self.flush()
+
+    @abc.abstractmethod
+    def _write(self, rows: list) -> None: ...
+
+    def flush(self) -> None:
+        if self._batch:
+            self._write(self._batch)
+            self._batch = []
+        self._flushed = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class TableRenderer(_BatchingRenderer):
+    """Print link states as table rows while they arrive, without holding the table in memory.
+
+    Column widths are fixed up front from the console width; long paths are shortened from the left so the
+    file name stays visible.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console to print to
+    page_size : int | None, default=None
+        Repeat the header every ``page_size`` rows; printed once if ``None``
+    title : str, default='Symlink Status'
+        Title printed above the first header
+    """
+
+    _STATUS_WIDTH = 11
+    _TARGET_STATUS_WIDTH = 13
+
+    def __init__(
+        self, console: Console, *, page_size: int | None = None, title: str = 'Symlink Status'
+    ) -> None:
+        super().__init__()
+        self.console = console
+        self.page_size = page_size
+        self._rows = 0
+        path_width = max(console.width - self._STATUS_WIDTH - self._TARGET_STATUS_WIDTH - 3, 20)
+        self._source_width = path_width // 2
+        self._target_width = path_width - self._source_width
+        console.print(f'[italic]{title}[/italic]', justify='center', width=console.width)
+
+    @staticmethod
+    def _fit(text: str, width: int) -> str:
+        return text.ljust(width) if len(text) <= width else '…' + text[len(text) - width + 1 :]
+
+    def _header(self) -> str:
+        return (
+            f'[bold]{self._fit("Source", self._source_width)} {self._fit("Target", self._target_width)} '
+            f'{"Link Status".ljust(self._STATUS_WIDTH)} Target Status[/bold]'
+        )
+
+    def add(self, state: LinkState) -> None:
+        super().add(state)
+        if self._rows == 0 or (self.page_size and self._rows % self.page_size == 0):
+            self._queue(self._header())
+        self._rows += 1
+
+        style = STATUS_STYLES[state.status]
+        target_status = '[green1]EXISTS[/green1]' if state.target_exists else '[red1]MISSING[/red1]'
+        self._queue(
+            f'[cyan]{escape(self._fit(str(state.source), self._source_width))} '
+            f'{escape(self._fit(str(state.target), self._target_width))}[/cyan] '
+            f'[{style}]{state.status.ljust(self._STATUS_WIDTH)}[/{style}] {target_status}'
+        )
+
+    def _write(self, rows: list) -> None:
+        self.console.print('\n'.join(rows), highlight=False, soft_wrap=True)
+
+
+class SummaryRenderer(StatusRenderer):
+    """Only count link states and print the totals per status when closed.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console to print to
+    """
+
+    def __init__(self, console: Console) -> None:
+        super().__init__()
+        self.console = console
+        self.missing_targets = 0
+
+    def add(self, state: LinkState) -> None:
+        super().add(state)
+        self.missing_targets += not state.target_exists
+
+    def close(self) -> None:
+        total = sum(self.counts.values())
+        parts = [
+            f'[{style}]{status}: {self.counts[status]}[/{style}]'
+            for status, style in STATUS_STYLES.items()
+            if self.counts[status]
+        ]
+        self.console.print(f'[bold]{total} links[/bold]' + (f' ({", ".join(parts)})' if parts else ''))
+        if self.missing_targets:
+            self.console.print(f'[red1]{self.missing_targets} targets do not exist[/red1]')
+
+
+class JsonlRenderer(_BatchingRenderer):
+    """Write one JSON object per link state, for piping into other tools.
+
+    Parameters
+    ----------
+    stream : BinaryIO
+        Binary stream to write to, e.g. ``sys.stdout.buffer``
+    """
+
+    def __init__(self, stream: BinaryIO) -> None:
+        super().__init__()
+        self.stream = stream
+        self._encoder = msgspec.json.Encoder()
+
+    def add(self, state: LinkState) -> None:
+        super().add(state)
+        self._queue(
+            self._encoder.encode(
+                LinkRecord(str(state.source), str(state.target), state.status, state.target_exists)
+            )
+        )
+
+    def _write(self, rows: list) -> None:
+        self.stream.write(b'\n'.join(rows) + b'\n')
+        self.stream.flush()
+
+
+def get_renderer(
+    output_format: OutputFormat,
+    console: Console,
+    stream: BinaryIO | None = None,
+    *,
+    page_size: int | None = None,
+) -> StatusRenderer:
+    """Create the renderer for an output format.
+
+    Parameters
+    ----------
+    output_format : OutputFormat
+        ``table``, ``summary`` or ``jsonl``
+    console : Console
+        Rich console for the ``table`` and ``summary`` formats
+    stream : BinaryIO | None, default=None
+        Stream for the ``jsonl`` format, defaults to standard output
+    page_size : int | None, default=None
+        Rows per page for the ``table`` format
+
+    Returns
+    -------
+    StatusRenderer
+        Renderer for the format
+    """
+
+    if output_format == 'summary':
+        return SummaryRenderer(console)
+    if output_format == 'jsonl':
+        return JsonlRenderer(stream or sys.stdout.buffer)
+    return TableRenderer(console, page_size=page_size)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Literal
+
+import msgspec
+
+from .cache import read_cache, write_cache
+from .gitstate import RepoState  # noqa: TC001 - msgspec resolves annotations at runtime
+from .links import LinkState
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+    from .gitstate import GitChanges
+    from .links import FileOps, SyscallCounter
+
+INDEX_FILE = 'link-state.json'
+
+# Directory timestamps written within this window of the previous scan may hide a later change with the same
+# timestamp (coarse filesystem clocks), so such directories are never trusted.
+RACY_WINDOW_NS = 2_000_000_000
+
+type DirId = tuple[int, int, int]
+
+
+class IndexedLink(msgspec.Struct, array_like=True, frozen=True):
+    """Recorded state of one link, plus the directory identities it was derived from."""
+
+    target: str
+    status: Literal['MISSING', 'NONLINK', 'CORRECT', 'INCORRECT']
+    source_mode: int | None
+    link_dest: str | None
+    target_id: tuple[int, int] | None
+    source_parent: DirId | None
+    target_parent: DirId | None
+
+
+class IndexFile(msgspec.Struct):
+    """On-disk layout of the link-state index."""
+
+    scanned_ns: int
+    links: dict[str, IndexedLink]
+    repo: RepoState | None = None
+
+
+def _is_self_contained(state: LinkState) -> bool:
+    # Non-links and absolute links that name the target verbatim are fully described by the entries of their
+    # source and target parent directories; anything else depends on resolving other paths.
+    if (dest := state.link_dest) is None:
+        return True
+    return os.path.isabs(dest) and os.path.normpath(dest) == os.path.abspath(state.target)
+
+
+class LinkIndex:
+    """Persistent index of link states used to make repeated applies incremental.
+
+    Every link records the ``(st_dev, st_ino, st_mtime_ns)`` of its source and target parent directories. A
+    directory's mtime changes whenever an entry in it is created, removed or renamed, so as long as both
+    parents are unchanged the recorded state is still accurate and the link is not re-checked. Parent
+    directories are stat'ed at most once per run, so large, mostly stable configurations re-apply cheaply.
+
+    Given the dotfiles repository, the index also records the state of its tracked files. A target that is
+    tracked and has not changed since is known to be in place without looking at its parent directory, so
+    after a commit, checkout or pull only the links whose targets changed are re-checked, and a directory
+    that merely gained or lost other files does not invalidate its links.
+
+    Parameters
+    ----------
+    previous : IndexFile | None, default=None
+        Index saved by the previous run
+    repo : GitChanges | None, default=None
+        Repository the targets are usually in, e.g. ``PROJECT_ROOT``
+    """
+
+    def __init__(self, previous: IndexFile | None = None, repo: GitChanges | None = None) -> None:
+        self._previous = previous.links if previous is not None else {}
+        self._repo = repo
+        self._changed = repo.changed(previous.repo) if repo is not None and previous is not None else None
+        self._stable_before = previous.scanned_ns - RACY_WINDOW_NS if previous is not None else 0
+        self._scanned_ns = time.time_ns()
+        self._current: dict[str, IndexedLink] = {}
+        self._parents: dict[str, DirId | None] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+
+    @classmethod
+    def load(cls, *, full: bool = False, repo: GitChanges | None = None) -> LinkIndex:
+        """Load the index from the cache directory.
+
+        Parameters
+        ----------
+        full : bool, default=False
+            Ignore recorded states so every link is re-checked; the index is still rebuilt and can be saved
+        repo : GitChanges | None, default=None
+            Repository the targets are usually in
+
+        Returns
+        -------
+        LinkIndex
+            Index seeded with the previous run's states, or an empty one
+        """
+
+        return cls(None if full else read_cache(INDEX_FILE, IndexFile), repo)
+
+    def _parent_id(self, path: Path, counter: SyscallCounter | None) -> DirId | None:
+        parent = os.path.dirname(path)
+        if parent in self._parents:
+            return self._parents[parent]
+
+        if counter is not None:
+            counter.add('stat')
+        try:
+            st = os.stat(parent)
+        except OSError:
+            dir_id = None
+        else:
+            dir_id = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        self._parents[parent] = dir_id
+        return dir_id
+
+    def _is_stable(self, dir_id: DirId | None) -> bool:
+        return dir_id is None or dir_id[2] < self._stable_before
+
+    def _is_unchanged_in_repo(self, target: Path) -> bool:
+        return (
+            self._changed is not None
+            and self._repo is not None
+            and target not in self._changed
+            and self._repo.is_tracked(target)
+        )
+
+    def scan(
+        self, source: Path, target: Path, *, counter: SyscallCounter | None = None, fs: FileOps | None = None
+    ) -> LinkState:
+        """Get the state of a link, re-checking it only if it may have changed.
+
+        Parameters
+        ----------
+        source : Path
+            Expanded path of the symlink
+        target : Path
+            Expanded path the symlink should point to
+        counter : SyscallCounter | None, default=None
+            Counter to record the issued filesystem calls in
+        fs : FileOps | None, default=None
+            Filesystem to re-check links on, see `LinkState.scan`
+
+        Returns
+        -------
+        LinkState
+            Recorded or freshly captured state of the link
+        """
+
+        key = str(source)
+        entry = self._previous.get(key)
+        source_parent = self._parent_id(source, counter)
+        if entry is not None and entry.target == str(target) and self._is_unchanged_in_repo(target):
+            target_parent, target_unchanged = entry.target_parent, True
+        else:
+            target_parent = self._parent_id(target, counter)
+            target_unchanged = (
+                entry is not None and entry.target_parent == target_parent and self._is_stable(target_parent)
+            )
+
+        if (
+            entry is not None
+            and entry.target == str(target)
+            and entry.source_parent == source_parent
+            and self._is_stable(source_parent)
+            and target_unchanged
+        ):
+            with self._lock:
+                self.reused += 1
+            self._current[key] = entry
+            return LinkState(
+                source, target, entry.status, entry.source_mode, entry.link_dest, entry.target_id
+            )
+
+        state = LinkState.scan(source, target, counter=counter, fs=fs)
+        if _is_self_contained(state):
+            self._current[key] = IndexedLink(
+                str(target),
+                state.status,
+                state.source_mode,
+                state.link_dest,
+                state.target_id,
+                source_parent,
+                target_parent,
+            )
+        return state
+
+    def discard(self, sources: Iterable[Path | str]) -> None:
+        """Drop links that were modified after scanning, so the next run re-checks them."""
+        for source in sources:
+            self._current.pop(str(source), None)
+
+    def save(self) -> Path:
+        """Write the states recorded during this run to the cache directory.
+
+        Returns
+        -------
+        Path
+            Path to the index file
+        """
+
+        repo = self._repo.state if self._repo is not None else None
+        return write_cache(INDEX_FILE, IndexFile(self._scanned_ns, self._current, repo))
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import stat
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from . import tracing
+from .diff import same_file, walk_tree
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from rich.console import Console
+
+    from .backupstore import BackupStore
+
+type Action = Literal['mkdir', 'copy', 'symlink', 'metadata']
+type Strategy = Literal['copy_file_range', 'sendfile', 'read']
+
+# Errors meaning a zero-copy call is not supported for this pair of files, rather than that copying failed.
+_UNSUPPORTED = frozenset(
+    {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ENOTSOCK}
+)
+_CHUNK = 1 << 30
+
+
+@dataclass(frozen=True, slots=True)
+class SyncAction:
+    """One step of syncing a copy-mode entry.
+
+    Attributes
+    ----------
+    origin : Path
+        File, directory or symlink in the dotfiles
+    destination : Path
+        Where its copy belongs
+    action : Action
+        ``mkdir``, ``copy`` (file contents and metadata), ``symlink``, or ``metadata`` for a file whose
+        contents are already current
+    replaces : bool
+        Whether something different is overwritten, and so backed up first
+    """
+
+    origin: Path
+    destination: Path
+    action: Action
+    replaces: bool = False
+
+
+@dataclass(slots=True)
+class SyncReport:
+    """What syncing the copy-mode entries did."""
+
+    files: int = 0
+    copied: int = 0
+    bytes_copied: int = 0
+    strategies: Counter[str] = field(default_factory=Counter)
+    errors: list[str] = field(default_factory=list)
+
+
+def _transfer(src: int, dst: int, size: int) -> Strategy:
+    """Copy ``size`` bytes between file descriptors, in the kernel if it can."""
+    copied = 0
+    for strategy in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, strategy):
+            continue
+        try:
+            while copied < size:
+                if strategy == 'copy_file_range':
+                    n = os.copy_file_range(src, dst, min(size - copied, _CHUNK))
+                else:
+                    n = os.sendfile(dst, src, copied, min(size - copied, _CHUNK))
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            # Only fall back before any data was written; a later failure is a real error.
+            if copied or e.errno not in _UNSUPPORTED:
+                raise
+            continue
+        if copied >= size:
+            return strategy
+
+    os.lseek(src, copied, os.SEEK_SET)
+    os.lseek(dst, copied, os.SEEK_SET)
+    while chunk := os.read(src, 1 << 20):
+        os.write(dst, chunk)
+    return 'read'
+
+
+def copy_file(origin: Path, destination: Path) -> tuple[Strategy, int]:
+    """Replace ``destination`` with a copy of ``origin``, atomically and with its metadata.
+
+    The contents are transferred with ``copy_file_range`` (which lets filesystems share or offload the
+    data) or ``sendfile``, and only with reads and writes if neither is supported. The copy is written
+    next to the destination and moved into place, so programs never see a partial file.
+
+    Parameters
+    ----------
+    origin : Path
+        Regular file to copy
+    destination : Path
+        Path to create or replace
+
+    Returns
+    -------
+    tuple[Strategy, int]
+        How the contents were transferred, and their size
+    """
+
+    tmp = destination.with_name(f'.{destination.name}.dk-copy')
+    with origin.open('rb') as src, tmp.open('wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        try:
+            strategy = _transfer(src.fileno(), dst.fileno(), size)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    shutil.copystat(origin, tmp)
+    os.replace(tmp, destination)
+    tracing.add_bytes(size)
+    return strategy, size
+
+
+def _plan_entry(
+    origin: Path, destination: Path, a: os.stat_result, b: os.stat_result | None, actions: list[SyncAction]
+) -> None:
+    if stat.S_ISDIR(a.st_mode):
+        if b is None or not stat.S_ISDIR(b.st_mode):
+            actions.append(SyncAction(origin, destination, 'mkdir', replaces=b is not None))
+    elif stat.S_ISLNK(a.st_mode):
+        if b is None or not stat.S_ISLNK(b.st_mode) or os.readlink(origin) != os.readlink(destination):
+            actions.append(SyncAction(origin, destination, 'symlink', replaces=b is not None))
+    elif stat.S_ISREG(a.st_mode):
+        if b is None or not stat.S_ISREG(b.st_mode):
+            actions.append(SyncAction(origin, destination, 'copy', replaces=b is not None))
+        elif a.st_size != b.st_size or (
+            a.st_mtime_ns != b.st_mtime_ns and not same_file(origin, destination, a, b)
+        ):
+            actions.append(SyncAction(origin, destination, 'copy', replaces=True))
+        elif a.st_mtime_ns != b.st_mtime_ns or stat.S_IMODE(a.st_mode) != stat.S_IMODE(b.st_mode):
+            actions.append(SyncAction(origin, destination, 'metadata'))
+
+
+def plan_copy(source: Path, target: Path) -> tuple[list[SyncAction], int]:
+    """Work out what it takes to make ``source`` a copy of ``target``.
+
+    A file whose size and modification time match its origin is current without being read; one with the
+    same size but a different time is compared (see `dotkeeper.diff.same_file`), and if it turns out equal
+    only its metadata is updated. Files below ``source`` that are not in ``target`` are left alone, since
+    the programs using the copy may keep their own files next to it.
+
+    Parameters
+    ----------
+    source : Path
+        Path the copy belongs at
+    target : Path
+        File or directory in the dotfiles; a symlink to one is followed
+
+    Returns
+    -------
+    tuple[list[SyncAction], int]
+        Actions in order (parents before children), and the number of files in ``target``
+    """
+
+    a = os.stat(target)
+    try:
+        b = os.lstat(source)
+    except FileNotFoundError:
+        b = None
+
+    actions: list[SyncAction] = []
+    _plan_entry(target, source, a, b, actions)
+    if not stat.S_ISDIR(a.st_mode):
+        return actions, 1
+
+    left = walk_tree(target)
+    right = walk_tree(source) if b is not None and stat.S_ISDIR(b.st_mode) else {}
+    for rel in sorted(left):
+        _plan_entry(target / rel, source / rel, left[rel], right.get(rel), actions)
+    return actions, sum(stat.S_ISREG(st.st_mode) for st in left.values())
+
+
+def _clear(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+
+
+def apply_copy(actions: list[SyncAction], report: SyncReport) -> None:
+    """Perform the actions from `plan_copy`, in order."""
+    for action in actions:
+        origin, destination = action.origin, action.destination
+        if action.action == 'mkdir':
+            if os.path.lexists(destination):
+                destination.unlink()
+            destination.mkdir(parents=True)
+        elif action.action == 'symlink':
+            _clear(destination)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            tmp = destination.with_name(f'.{destination.name}.dk-copy')
+            tmp.unlink(missing_ok=True)
+            os.symlink(os.readlink(origin), tmp)
+            os.replace(tmp, destination)
+        elif action.action == 'copy':
+            _clear(destination)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            strategy, size = copy_file(origin, destination)
+            report.copied += 1
+            report.bytes_copied += size
+            report.strategies[strategy] += 1
+        else:
+            shutil.copystat(origin, destination)
+
+    # Directory times change as their contents are written, so they are set last.
+    for action in reversed(actions):
+        if action.action == 'mkdir':
+            shutil.copystat(action.origin, action.destination)
+
+
+def plan_copies(
+    copies: Mapping[str, str], report: SyncReport, *, workers: int | None = None
+) -> list[list[SyncAction]]:
+    """Plan every copy-mode entry with `plan_copy`, on a thread pool as planning is mostly ``lstat`` calls.
+
+    Parameters
+    ----------
+    copies : Mapping[str, str]
+        Mapping of source paths to the target paths they are copies of
+    report : SyncReport
+        Report to count the files to sync in, and to add the entries that cannot be planned to
+    workers : int | None, default=None
+        Number of planning threads
+
+    Returns
+    -------
+    list[list[SyncAction]]
+        Actions of each entry that could be planned
+    """
+
+    pairs = [(Path(source).expanduser(), Path(target).expanduser()) for source, target in copies.items()]
+
+    def _plan(pair: tuple[Path, Path]) -> tuple[list[SyncAction], int] | str:
+        try:
+            return plan_copy(*pair)
+        except OSError as e:
+            return f'{pair[0]}: {e}'
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dk-sync') as executor:
+        planned = list(executor.map(_plan, pairs))
+
+    plans: list[list[SyncAction]] = []
+    for result in planned:
+        if isinstance(result, str):
+            report.errors.append(result)
+        else:
+            plans.append(result[0])
+            report.files += result[1]
+    return plans
+
+
+def apply_copies(plans: list[list[SyncAction]], report: SyncReport) -> None:
+    """Perform the plans from `plan_copies`; an entry that fails is added to ``report.errors``."""
+    for actions in filter(None, plans):
+        try:
+            apply_copy(actions, report)
+        except OSError as e:
+            report.errors.append(f'{actions[0].destination}: {e}')
+
+
+def sync_copies(
+    console: Console,
+    copies: dict[str, str],
+    *,
+    workers: int | None = None,
+    assume_yes: bool = False,
+    store: BackupStore | None = None,
+) -> bool:
+    """Sync the copy-mode entries of ``dotfiles.links``, copying only what changed.
+
+    Every entry is planned first (on a thread pool, as planning is mostly ``lstat`` calls); after one
+    confirmation, whatever is about to be overwritten is added to the backup store as one snapshot, then
+    the changes are made.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    copies : dict[str, str]
+        Mapping of source paths to the target paths they are copies of, see `dotkeeper.models.Config.copies`
+    workers : int | None, default=None
+        Number of planning threads
+    assume_yes : bool, default=False
+        Sync without asking for confirmation
+    store : BackupStore | None, default=None
+        Store for the overwritten files, defaults to the store in the data directory
+
+    Returns
+    -------
+    bool
+        Whether every entry was synced
+    """
+
+    from rich.prompt import Confirm
+
+    from .backup import format_size
+    from .backupstore import BackupStore
+
+    report = SyncReport()
+    plans = plan_copies(copies, report, workers=workers)
+
+    changes = [action for actions in plans for action in actions if action.action != 'metadata']
+    if changes:
+        console.print(f'[bold cyan]{len(changes)} changes to {len(copies)} copies[/bold cyan]')
+        for action in changes:
+            console.print(f'[blue]  {action.action} {action.destination}[/blue]')
+        if not assume_yes and not Confirm.ask('Do you want to sync the copies?'):
+            console.print('[yellow]Exiting without syncing copies[/yellow]')
+            return True
+
+        replaced = [action.destination for action in changes if action.replaces]
+        if replaced and (stored := (store or BackupStore()).snapshot((path, path) for path in replaced)):
+            snapshot, added = stored
+            console.print(
+                f'[dim]Stored backup {snapshot.id} ({len(snapshot.roots)} items, '
+                f'{format_size(added)} new data)[/dim]'
+            )
+
+    apply_copies(plans, report)
+
+    strategies = ', '.join(f'{name}: {count}' for name, count in sorted(report.strategies.items()))
+    console.print(
+        f'[dim]Copied {report.copied} of {report.files} files ({format_size(report.bytes_copied)}'
+        f'{f"; {strategies}" if strategies else ""})[/dim]'
+    )
+    for error in report.errors:
+        console.print(f'[red]Cannot sync {error}[/red]')
+    return not report.errors
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import contextlib
+import getpass
+import hashlib
+import os
+import platform
+import socket
+import stat
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal
+
+import msgspec
+
+from .cache import get_cache_file, read_cache, write_cache
+from .gitstate import RepoState  # noqa: TC001 - msgspec resolves annotations at runtime
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    import jinja2
+
+    from .credentials import CredentialResolver
+    from .gitstate import GitChanges
+
+STATE_FILE = 'templates-state.json'
+BYTECODE_DIR = 'templates'
+
+type FileId = tuple[int, int, int]
+type Outcome = Literal['rendered', 'unchanged', 'failed']
+
+
+class RenderedRecord(msgspec.Struct, array_like=True, frozen=True):
+    """Digest of the last output written for a template, and the identity of the file it was written to.
+
+    ``sources`` are the template files the output was rendered from, and ``context`` a digest of the
+    ``variables`` it used; ``sources`` is ``None`` if they cannot be known in advance (templates included by
+    a computed name, or secrets).
+    """
+
+    digest: str
+    file_id: FileId
+    sources: tuple[str, ...] | None = None
+    variables: tuple[str, ...] = ()
+    context: str = ''
+
+
+class TemplatesState(msgspec.Struct):
+    """On-disk layout of the template state, keyed by output path."""
+
+    files: dict[str, RenderedRecord] = msgspec.field(default_factory=dict)
+    repo: RepoState | None = None
+
+
+@dataclass(slots=True)
+class TemplateReport:
+    """Outcome of rendering a batch of templates, keyed by what happened to each output path."""
+
+    results: dict[str, list[Path]] = field(default_factory=dict)
+    errors: dict[Path, str] = field(default_factory=dict)
+
+    def add(self, outcome: Outcome, path: Path) -> None:
+        self.results.setdefault(outcome, []).append(path)
+
+    def count(self, outcome: Outcome) -> int:
+        return len(self.results.get(outcome, ()))
+
+
+def _file_id(path: Path | str) -> FileId | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _digest(path: Path) -> str:
+    with path.open('rb') as f:
+        return hashlib.file_digest(f, 'blake2b').hexdigest()
+
+
+def host_context() -> dict[str, Any]:
+    """Variables available to every template.
+
+    Returns
+    -------
+    dict[str, Any]
+        ``hostname``, ``system`` (e.g. ``linux`` or ``darwin``), ``machine``, ``user`` and ``env``
+    """
+
+    return {
+        'hostname': socket.gethostname(),
+        'system': platform.system().lower(),
+        'machine': platform.machine(),
+        'user': getpass.getuser(),
+        'env': dict(os.environ),
+    }
+
+
+class TemplateEngine:
+    """Render dotfiles from Jinja2 templates.
+
+    Templates are loaded relative to a common root directory, so they can ``include`` and ``extend`` each
+    other, and their compiled bytecode is cached under the cache directory, so a template
+    is only compiled again when it changes. Templates are rendered in parallel; each output is hashed and
+    only written (atomically) if it differs from what was written last time, so an unchanged render leaves
+    the file, its modification time and anything watching it alone.
+
+    Templates can call ``secret('op://vault/item/field')`` to insert a secret. References given as literals
+    are collected from all templates before rendering and resolved in one batch.
+
+    Given the repository the templates live in, an output is not rendered at all if none of the templates
+    it was rendered from changed since, the variables it uses have the same values and the file was left
+    alone. Outputs using secrets are always rendered.
+
+    Parameters
+    ----------
+    templates : Mapping[Path, Path]
+        Template source by output path
+    context : Mapping[str, Any] | None, default=None
+        Template variables, defaults to `host_context`
+    resolver : CredentialResolver | None, default=None
+        Resolves the references passed to ``secret``; templates using it fail if ``None``
+    root : Path | None, default=None
+        Directory template names are relative to, e.g. the dotfiles repository; defaults to the deepest
+        directory that contains all templates, which is also used if some are outside ``root``
+    workers : int | None, default=None
+        Number of threads; ``None`` uses the thread pool default
+    repo : GitChanges | None, default=None
+        Repository containing the templates, whose changes decide which outputs are rendered again
+    """
+
+    def __init__(
+        self,
+        templates: Mapping[Path, Path],
+        *,
+        context: Mapping[str, Any] | None = None,
+        resolver: CredentialResolver | None = None,
+        root: Path | None = None,
+        workers: int | None = None,
+        repo: GitChanges | None = None,
+    ) -> None:
+        self.templates = dict(templates)
+        self.context = dict(host_context() if context is None else context)
+        self.resolver = resolver
+        self.workers = workers
+        self._resolve_lock = threading.Lock()
+        # Whether the render running on each thread called ``secret``.
+        self._local = threading.local()
+        self._root = os.path.commonpath([source.parent for source in self.templates.values()] or ['/'])
+        if root is not None and all(source.is_relative_to(root) for source in self.templates.values()):
+            self._root = str(root)
+        self._env: jinja2.Environment | None = None
+        self._state = read_cache(STATE_FILE, TemplatesState) or TemplatesState()
+        self._repo = repo
+        self._changed = repo.changed(self._state.repo) if repo is not None else None
+
+    @property
+    def env(self) -> jinja2.Environment:
+        if self._env is None:
+            import jinja2
+
+            bytecode_dir = get_cache_file(BYTECODE_DIR)
+            bytecode_dir.mkdir(parents=True, exist_ok=True)
+            self._env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(self._root),
+                bytecode_cache=jinja2.FileSystemBytecodeCache(str(bytecode_dir)),
+                undefined=jinja2.StrictUndefined,
+                keep_trailing_newline=True,
+                autoescape=False,
+            )
+            self._env.globals['secret'] = self._secret
+        return self._env
+
+    def _name(self, source: Path) -> str:
+        return Path(os.path.relpath(source, self._root)).as_posix()
+
+    def _secret(self, ref: str) -> str:
+        self._local.used_secret = True
+        if self.resolver is None:
+            raise ValueError(f'No secret backend to resolve {ref}')
+        with self._resolve_lock:
+            return self.resolver.resolve(ref)
+
+    def _secret_refs(self, source: Path) -> set[str]:
+        from jinja2 import nodes
+
+        text = source.read_text()
+        if 'secret' not in text:
+            return set()
+        return {
+            call.args[0].value
+            for call in self.env.parse(text).find_all(nodes.Call)
+            if isinstance(call.node, nodes.Name)
+            and call.node.name == 'secret'
+            and call.args
+            and isinstance(call.args[0], nodes.Const)
+            and isinstance(call.args[0].value, str)
+        }
+
+    def _prefetch_secrets(self, sources: Iterable[Path]) -> None:
+        import jinja2
+
+        if self.resolver is None:
+            return
+        refs: set[str] = set()
+        for source in sources:
+            # Unreadable or invalid templates are reported when they are rendered.
+            with contextlib.suppress(OSError, ValueError, jinja2.TemplateError):
+                refs |= self._secret_refs(source)
+        if refs:
+            self.resolver.resolve_many(sorted(refs))
+
+    def _context_digest(self, variables: tuple[str, ...]) -> str:
+        values = [(name, self.context.get(name)) for name in variables]
+        return hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+
+    def _dependencies(self, source: Path) -> tuple[tuple[str, ...] | None, tuple[str, ...]]:
+        # Templates it includes, extends or imports, recursively, and the variables they use.
+        from jinja2 import meta
+
+        sources: set[str] = set()
+        variables: set[str] = set()
+        pending = [source]
+        while pending:
+            path = pending.pop()
+            if str(path) in sources:
+                continue
+            sources.add(str(path))
+            ast = self.env.parse(path.read_text())
+            variables |= meta.find_undeclared_variables(ast)
+            for name in meta.find_referenced_templates(ast):
+                if name is None:
+                    return None, ()
+                pending.append(Path(self._root, name))
+        if 'secret' in variables:
+            return None, ()
+        return tuple(sorted(sources)), tuple(sorted(variables))
+
+    def _is_current(self, output: Path) -> bool:
+        # Whether the output was rendered from templates that are all tracked and unchanged since.
+        record = self._state.files.get(str(output))
+        if self._changed is None or self._repo is None or record is None or record.sources is None:
+            return False
+        return (
+            _file_id(output) == tuple(record.file_id)
+            and all(
+                Path(source) not in self._changed and self._repo.is_tracked(source)
+                for source in record.sources
+            )
+            and self._context_digest(record.variables) == record.context
+        )
+
+    def _record(self, output: Path, source: Path, digest: str, file_id: FileId) -> None:
+        sources, variables = self._dependencies(source) if self._repo is not None else (None, ())
+        context = self._context_digest(variables)
+        self._state.files[str(output)] = RenderedRecord(digest, file_id, sources, variables, context)
+
+    def _render_one(self, output: Path, source: Path) -> Outcome:
+        self._local.used_secret = False
+        data = self.env.get_template(self._name(source)).render(self.context).encode()
+        digest = hashlib.blake2b(data).hexdigest()
+
+        record = self._state.files.get(str(output))
+        if (file_id := _file_id(output)) is not None:
+            if record is not None and file_id == tuple(record.file_id):
+                if record.digest == digest:
+                    self._record(output, source, digest, file_id)
+                    return 'unchanged'
+            elif _digest(output) == digest:
+                # Written by someone else, or before the state was recorded, but with the same content.
+                self._record(output, source, digest, file_id)
+                return 'unchanged'
+
+        # Outputs that contain secrets, from the template itself or anything it includes, extends or imports,
+        # are only readable by the user; others keep the template's mode.
+        mode = 0o600 if self._local.used_secret else stat.S_IMODE(source.stat().st_mode)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=output.parent, prefix=f'.{output.name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp, mode)
+            os.replace(tmp, output)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        if (file_id := _file_id(output)) is not None:
+            self._record(output, source, digest, file_id)
+        return 'rendered'
+
+    def render(self) -> TemplateReport:
+        """Render every template, writing only the outputs whose content changed.
+
+        Returns
+        -------
+        TemplateReport
+            ``rendered``, ``unchanged`` or ``failed`` per output path, with the error of each failure
+        """
+
+        import jinja2
+
+        from .credentials import CredentialError
+
+        report = TemplateReport()
+        self.env  # noqa: B018 - created before the threads share it
+        items = []
+        for output, source in self.templates.items():
+            if self._is_current(output):
+                report.add('unchanged', output)
+            else:
+                items.append((output, source))
+        # Missing secrets are reported by the templates that need them.
+        with contextlib.suppress(CredentialError):
+            self._prefetch_secrets(source for _, source in items)
+
+        def task(item: tuple[Path, Path]) -> Outcome:
+            output, source = item
+            try:
+                return self._render_one(output, source)
+            except (OSError, ValueError, LookupError, jinja2.TemplateError) as e:
+                report.errors[output] = f'{source}: {e}'
+                # Render it again next time even if its templates do not change.
+                self._state.files.pop(str(output), None)
+                return 'failed'
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dk-templates') as executor:
+            for (output, _), outcome in zip(items, executor.map(task, items), strict=True):
+                report.add(outcome, output)
+        if self._repo is not None:
+            self._state.repo = self._repo.state
+        write_cache(STATE_FILE, self._state)
+        return report
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Mapping
+    from pathlib import Path
+
+# Audit events raised by the filesystem functions of the standard library (see the audit events table in
+# the Python documentation). Calls without an audit event, like ``stat``, are counted where they are issued.
+FS_EVENTS = frozenset(
+    {
+        'open',
+        'os.chmod',
+        'os.chown',
+        'os.link',
+        'os.listdir',
+        'os.mkdir',
+        'os.remove',
+        'os.rename',
+        'os.rmdir',
+        'os.scandir',
+        'os.symlink',
+        'os.truncate',
+        'os.utime',
+        'shutil.copyfile',
+        'shutil.copytree',
+        'shutil.move',
+        'shutil.rmtree',
+    }
+)
+
+
+@dataclass(slots=True)
+class Span:
+    """One timed phase of a run, with the filesystem calls issued and the bytes copied while it was open.
+
+    Counts include those of nested spans, and calls made by worker threads while the span was open.
+    """
+
+    name: str
+    start_ns: int
+    thread_id: int
+    attrs: dict[str, Any]
+    end_ns: int = 0
+    fs_ops: Counter[str] = field(default_factory=Counter)
+    bytes_copied: int = 0
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+    def fields(self) -> dict[str, Any]:
+        """Attributes and counts as flat, JSON-serializable fields."""
+        return {
+            **self.attrs,
+            'fs_ops': self.fs_ops.total(),
+            'fs': dict(sorted(self.fs_ops.items())),
+            'bytes_copied': self.bytes_copied,
+        }
+
+
+class Tracer:
+    """Record spans and write them as a Chrome trace or as JSON log lines.
+
+    A path ending in ``.jsonl`` receives one structlog JSON event per span as soon as the span ends; any
+    other path receives a Chrome trace-event file when the tracer is closed, which can be opened in
+    ``chrome://tracing`` or https://ui.perfetto.dev. Both carry the host name, so traces collected from
+    several machines can be told apart.
+
+    Parameters
+    ----------
+    path : Path
+        Output file
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.host = socket.gethostname()
+        self.spans: list[Span] = []
+        self._open: list[Span] = []
+        self._lock = threading.Lock()
+        self._log_file = None
+        self._log = None
+        if path.suffix == '.jsonl':
+            import structlog
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._log_file = path.open('a', encoding='utf-8')
+            self._log = structlog.wrap_logger(
+                structlog.WriteLogger(self._log_file),
+                processors=[
+                    structlog.processors.TimeStamper(fmt='iso', utc=True),
+                    structlog.processors.JSONRenderer(),
+                ],
+            )
+
+    def start(self, name: str, attrs: dict[str, Any]) -> Span:
+        span = Span(name, time.perf_counter_ns(), threading.get_ident(), attrs)
+        with self._lock:
+            self._open.append(span)
+        return span
+
+    def end(self, span: Span) -> None:
+        span.end_ns = time.perf_counter_ns()
+        with self._lock:
+            self._open.remove(span)
+            self.spans.append(span)
+        if self._log is not None:
+            self._log.info(
+                'span', span=span.name, host=self.host, duration_ms=span.duration_ns / 1e6, **span.fields()
+            )
+
+    def count(self, op: str, n: int = 1) -> None:
+        with self._lock:
+            for span in self._open:
+                span.fs_ops[op] += n
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            for span in self._open:
+                span.bytes_copied += n
+
+    def close(self) -> None:
+        """Write the Chrome trace, or close the log file."""
+        if self._log_file is not None:
+            self._log_file.close()
+            return
+
+        import msgspec
+
+        pid = os.getpid()
+        events: list[dict[str, Any]] = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f'dk@{self.host}'}}
+        ]
+        origin = min((span.start_ns for span in self.spans), default=0)
+        events.extend(
+            {
+                'name': span.name,
+                'cat': 'dotkeeper',
+                'ph': 'X',
+                'ts': (span.start_ns - origin) / 1000,
+                'dur': span.duration_ns / 1000,
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': span.fields(),
+            }
+            for span in self.spans
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(
+            msgspec.json.encode(
+                {
+                    'traceEvents': events,
+                    'displayTimeUnit': 'ms',
+                    'otherData': {'host': self.host},
+                }
+            )
+        )
+
+
+_tracer: Tracer | None = None
+_hook_installed = False
+
+
+def _audit(event: str, _args: tuple[Any, ...]) -> None:
+    if (tracer := _tracer) is not None and event in FS_EVENTS:
+        tracer.count(event)
+
+
+@contextmanager
+def trace(path: Path | None) -> Iterator[Tracer | None]:
+    """Record the spans of a run into a file.
+
+    Parameters
+    ----------
+    path : Path | None
+        Output file, see `Tracer`; ``None`` disables tracing, leaving `span` all but free
+
+    Yields
+    ------
+    Tracer | None
+        Active tracer
+    """
+
+    global _tracer, _hook_installed
+
+    if path is None:
+        yield None
+        return
+
+    if not _hook_installed:
+        # Audit hooks cannot be removed, so one hook is installed for the life of the process; it does nothing
+        # while no tracer is active.
+        sys.addaudithook(_audit)
+        _hook_installed = True
+
+    tracer = _tracer = Tracer(path)
+    try:
+        yield tracer
+    finally:
+        _tracer = None
+        tracer.close()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span | None]:
+    """Time a phase of the run, if a trace is being recorded.
+
+    Parameters
+    ----------
+    name : str
+        Phase, e.g. ``config.load`` or ``scan``
+    **attrs : Any
+        JSON-serializable attributes to attach to the span
+
+    Yields
+    ------
+    Span | None
+        Open span, to attach further attributes to, or ``None`` if no trace is being recorded
+    """
+
+    if (tracer := _tracer) is None:
+        yield None
+        return
+
+    current = tracer.start(name, attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        tracer.end(current)
+
+
+def count(ops: Mapping[str, int]) -> None:
+    """Attribute filesystem calls counted elsewhere (e.g. by a `SyscallCounter`) to the open spans."""
+    if (tracer := _tracer) is not None:
+        for op, n in ops.items():
+            tracer.count(op, n)
+
+
+def add_bytes(n: int) -> None:
+    """Attribute bytes copied to the open spans."""
+    if (tracer := _tracer) is not None:
+        tracer.add_bytes(n)
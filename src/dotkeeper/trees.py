@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from .models import TreeRule
+
+
+class PatternSet:
+    """Shell-style patterns compiled into one regular expression per kind.
+
+    Patterns without a ``/`` match the name of an entry at any depth (``*.swp``, ``.git``); patterns with one
+    match its path relative to the root of the tree (``nvim/lazy-lock.json``, ``*/cache/*``). As in
+    `fnmatch`, ``*`` also matches ``/``.
+
+    Parameters
+    ----------
+    patterns : Iterable[str]
+        Shell-style patterns
+    """
+
+    __slots__ = ('names', 'paths')
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        names, paths = [], []
+        for pattern in patterns:
+            (paths if '/' in pattern else names).append(fnmatch.translate(pattern.strip('/')))
+        # Bound `match` methods, or ``None`` if there are no patterns of that kind.
+        self.names = re.compile('|'.join(names)).match if names else None
+        self.paths = re.compile('|'.join(paths)).match if paths else None
+
+    def __bool__(self) -> bool:
+        return self.names is not None or self.paths is not None
+
+    def match(self, name: str, path: str) -> bool:
+        """Whether an entry matches any pattern, by its ``name`` or its relative ``path``."""
+        return bool((self.names and self.names(name)) or (self.paths and self.paths(path)))
+
+
+def expanduser(path: str, home: str | None = None) -> str:
+    """Expand a leading ``~`` like `os.path.expanduser`, against ``home`` instead of ``$HOME`` if given."""
+    if home is None:
+        return os.path.expanduser(path)
+    if path == '~' or path.startswith(('~/', '~' + os.sep)):
+        return home + path[1:]
+    return path
+
+
+def walk_tree(root: str, include: PatternSet, exclude: PatternSet) -> Iterator[str]:
+    """Yield the relative paths of the files below a directory that are included and not excluded.
+
+    Directories are read with one ``os.scandir`` call each, whose entries carry their type, so no entry is
+    stat'ed, and an excluded directory is pruned without being read. Symlinks are treated as files and
+    never followed.
+
+    Parameters
+    ----------
+    root : str
+        Directory to walk
+    include : PatternSet
+        Files to yield; every file if empty
+    exclude : PatternSet
+        Files and directories to skip
+
+    Yields
+    ------
+    str
+        Path of each file relative to ``root``, with ``/`` separators, in no particular order
+    """
+
+    # The loop runs once per entry of the tree, so the matchers are hoisted into locals.
+    exclude_name, exclude_path = exclude.names, exclude.paths
+    include_match = include.match if include else None
+    root = os.path.join(root, '')
+    stack = ['']
+    while stack:
+        prefix = stack.pop()
+        try:
+            entries = os.scandir(root + prefix)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                path = prefix + name
+                if (exclude_name and exclude_name(name)) or (exclude_path and exclude_path(path)):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(path + '/')
+                elif include_match is None or include_match(name, path):
+                    yield path
+
+
+def expand_tree_rules(rules: Iterable[TreeRule], *, home: str | None = None) -> dict[str, str]:
+    """Expand tree rules into individual links, like ``stow`` without folding.
+
+    Parameters
+    ----------
+    rules : Iterable[TreeRule]
+        Rules from ``dotfiles.trees``
+    home : str | None, default=None
+        Directory ``~`` stands for in the rules, defaults to the current user's home
+
+    Returns
+    -------
+    dict[str, str]
+        Target path by link path for every matching file, sorted by link path; a later rule wins if two
+        rules produce the same link
+    """
+
+    links: dict[str, str] = {}
+    for rule in rules:
+        target = expanduser(rule.target, home)
+        # Plain concatenation: `os.path.join` per file would cost more than walking the tree.
+        source_prefix = os.path.join(os.path.abspath(expanduser(rule.source, home)), '')
+        target_prefix = os.path.join(target, '')
+        include, exclude = PatternSet(rule.include), PatternSet(rule.exclude)
+        for path in walk_tree(target, include, exclude):
+            if os.sep != '/':
+                path = path.replace('/', os.sep)
+            links[source_prefix + path] = target_prefix + path
+    return dict(sorted(links.items()))
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+import msgspec
+
+from .cache import read_cache, write_cache
+from .config import APP_AUTHOR, APP_NAME
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    import pyrage
+
+STATE_FILE = 'secrets-state.json'
+SUFFIX = '.age'
+
+_AGE_HEADERS = (b'age-encryption.org/', b'-----BEGIN AGE ENCRYPTED FILE-----')
+
+type FileId = tuple[int, int, int]
+type Outcome = Literal['encrypted', 'decrypted', 'unchanged', 'modified', 'missing']
+
+
+class SecretRecord(msgspec.Struct, array_like=True, frozen=True):
+    """Ciphertext and plaintext as they were after the last encrypt or decrypt."""
+
+    cipher_digest: str
+    cipher_id: FileId
+    plain_id: FileId
+
+
+class SecretsState(msgspec.Struct):
+    """On-disk layout of the secrets state, keyed by plaintext path."""
+
+    files: dict[str, SecretRecord] = msgspec.field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class SecretsReport:
+    """Outcome of a batch of secret files, keyed by what happened to each plaintext path."""
+
+    results: dict[str, list[Path]] = field(default_factory=dict)
+
+    def add(self, outcome: Outcome, path: Path) -> None:
+        self.results.setdefault(outcome, []).append(path)
+
+    def count(self, outcome: Outcome) -> int:
+        return len(self.results.get(outcome, ()))
+
+
+def get_identity_path() -> Path:
+    """Get the default location of the age identity used for secrets.
+
+    The identity must outlive upgrades, so unlike `get_config_dir` the directory is not versioned.
+
+    Returns
+    -------
+    Path
+        Path to ``identity.txt`` in the unversioned DotKeeper config directory
+    """
+
+    import platformdirs
+
+    return Path(platformdirs.user_config_dir(APP_NAME, APP_AUTHOR)) / 'identity.txt'
+
+
+def cipher_path(plain: Path) -> Path:
+    """Path of the encrypted copy of a secret file, stored next to it with an ``.age`` suffix."""
+    return plain.with_name(plain.name + SUFFIX)
+
+
+def _file_id(path: Path | str) -> FileId | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _digest(path: Path) -> str:
+    with path.open('rb') as f:
+        return hashlib.file_digest(f, 'blake2b').hexdigest()
+
+
+def generate_identity(path: Path) -> pyrage.x25519.Recipient:
+    """Create a new age identity file, readable only by the current user.
+
+    Parameters
+    ----------
+    path : Path
+        Where to write the identity; must not exist
+
+    Returns
+    -------
+    Recipient
+        Public key to encrypt secrets to
+    """
+
+    import pyrage
+
+    identity = pyrage.x25519.Identity.generate()
+    recipient = identity.to_public()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(f'# public key: {recipient}\n{identity}\n')
+    return recipient
+
+
+def load_identity(path: Path, passphrase: Callable[[], str] | None = None) -> pyrage.x25519.Identity:
+    """Read an age identity file, unlocking it if it is passphrase-protected.
+
+    Parameters
+    ----------
+    path : Path
+        Identity file as written by `generate_identity` or ``age-keygen``, optionally encrypted with
+        ``age --passphrase``
+    passphrase : Callable[[], str] | None, default=None
+        Called once to obtain the passphrase of a protected identity
+
+    Returns
+    -------
+    Identity
+        The first identity in the file
+
+    Raises
+    ------
+    ValueError
+        If the file is protected and no passphrase is available, or contains no identity
+    """
+
+    import pyrage
+
+    data = path.read_bytes()
+    if data.startswith(_AGE_HEADERS):
+        if passphrase is None:
+            raise ValueError(f'{path} is passphrase-protected')
+        try:
+            data = pyrage.passphrase.decrypt(data, passphrase())
+        except pyrage.DecryptError as e:
+            raise ValueError(f'Could not unlock {path}: {e}') from e
+
+    for line in data.decode().splitlines():
+        if (line := line.strip()) and not line.startswith('#'):
+            return pyrage.x25519.Identity.from_str(line)
+    raise ValueError(f'No identity found in {path}')
+
+
+def _replace_atomically(path: Path, write: Callable[[str], None], mode: int | None = None) -> None:
+    # Write next to the destination so a failed or interrupted run never leaves a truncated file behind.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class SecretStore:
+    """Batch encryption and decryption of secret dotfiles with age.
+
+    Each secret is a plaintext file (usually git-ignored) with an encrypted copy next to it (see
+    `cipher_path`) that is committed instead. The identity is unlocked at most once per store, files are
+    processed in parallel and streamed by pyrage from path to path, so they are never loaded into memory.
+    The hashes and file identities recorded after each run let the next run skip secrets that did not
+    change, and keep decryption from overwriting plaintext that was edited since.
+
+    Parameters
+    ----------
+    identity_path : Path | None, default=None
+        Age identity file, defaults to `get_identity_path`
+    recipients : Iterable[str], default=()
+        Additional public keys to encrypt to, besides the identity's own
+    passphrase : Callable[[], str] | None, default=None
+        Provides the passphrase of a protected identity, see `load_identity`
+    workers : int | None, default=None
+        Number of threads; ``None`` uses the thread pool default
+    """
+
+    def __init__(
+        self,
+        identity_path: Path | None = None,
+        recipients: Iterable[str] = (),
+        *,
+        passphrase: Callable[[], str] | None = None,
+        workers: int | None = None,
+    ) -> None:
+        self.identity_path = identity_path or get_identity_path()
+        self.extra_recipients = list(recipients)
+        self.passphrase = passphrase
+        self.workers = workers
+        self._identity: pyrage.x25519.Identity | None = None
+        self._unlock = threading.Lock()
+        self._state = read_cache(STATE_FILE, SecretsState) or SecretsState()
+
+    @property
+    def identity(self) -> pyrage.x25519.Identity:
+        """The age identity, loaded (and unlocked) on first use only."""
+        with self._unlock:
+            if self._identity is None:
+                self._identity = load_identity(self.identity_path, self.passphrase)
+            return self._identity
+
+    def recipients(self) -> list[pyrage.x25519.Recipient]:
+        import pyrage
+
+        return [self.identity.to_public(), *map(pyrage.x25519.Recipient.from_str, self.extra_recipients)]
+
+    def _record(self, plain: Path, cipher: Path, digest: str | None = None) -> None:
+        cipher_id, plain_id = _file_id(cipher), _file_id(plain)
+        if cipher_id is not None and plain_id is not None:
+            self._state.files[str(plain)] = SecretRecord(digest or _digest(cipher), cipher_id, plain_id)
+
+    def _decrypt_one(self, plain: Path) -> Outcome:
+        import pyrage
+
+        cipher = cipher_path(plain)
+        if (cipher_id := _file_id(cipher)) is None:
+            return 'missing'
+
+        record = self._state.files.get(str(plain))
+        plain_id = _file_id(plain)
+        digest = None
+        if record is not None and plain_id is not None:
+            if plain_id != tuple(record.plain_id):
+                return 'modified'
+            if cipher_id == tuple(record.cipher_id):
+                return 'unchanged'
+            if (digest := _digest(cipher)) == record.cipher_digest:
+                self._record(plain, cipher, digest)
+                return 'unchanged'
+        elif plain_id is not None:
+            # Never overwrite a plaintext this store did not write.
+            return 'modified'
+
+        _replace_atomically(plain, lambda tmp: pyrage.decrypt_file(str(cipher), tmp, [self.identity]), 0o600)
+        self._record(plain, cipher, digest)
+        return 'decrypted'
+
+    def _encrypt_one(self, plain: Path, recipients: list[pyrage.x25519.Recipient]) -> Outcome:
+        import pyrage
+
+        if (plain_id := _file_id(plain)) is None:
+            return 'missing'
+        record = self._state.files.get(str(plain))
+        if (
+            record is not None
+            and plain_id == tuple(record.plain_id)
+            and _file_id(cipher_path(plain)) == tuple(record.cipher_id)
+        ):
+            # age output is randomized; re-encrypting unchanged plaintext would only churn the repository.
+            return 'unchanged'
+
+        cipher = cipher_path(plain)
+        _replace_atomically(cipher, lambda tmp: pyrage.encrypt_file(str(plain), tmp, recipients))
+        self._record(plain, cipher)
+        return 'encrypted'
+
+    def _run(self, paths: Iterable[Path], task: Callable[[Path], Outcome]) -> SecretsReport:
+        paths = list(paths)
+        report = SecretsReport()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dk-secrets') as executor:
+            for path, outcome in zip(paths, executor.map(task, paths), strict=True):
+                report.add(outcome, path)
+        write_cache(STATE_FILE, self._state)
+        return report
+
+    def decrypt(self, paths: Iterable[Path]) -> SecretsReport:
+        """Decrypt the encrypted copies of the given plaintext paths.
+
+        Secrets whose ciphertext is unchanged since the last run, and plaintexts edited since then, are
+        skipped. The identity is only unlocked if something needs decrypting.
+
+        Parameters
+        ----------
+        paths : Iterable[Path]
+            Plaintext paths
+
+        Returns
+        -------
+        SecretsReport
+            ``decrypted``, ``unchanged``, ``modified`` (left alone) or ``missing`` (no ciphertext) per path
+        """
+
+        return self._run(paths, self._decrypt_one)
+
+    def encrypt(self, paths: Iterable[Path]) -> SecretsReport:
+        """Encrypt the given plaintext paths, skipping those unchanged since the last run.
+
+        Parameters
+        ----------
+        paths : Iterable[Path]
+            Plaintext paths
+
+        Returns
+        -------
+        SecretsReport
+            ``encrypted``, ``unchanged`` or ``missing`` (no plaintext) per path
+        """
+
+        paths = list(paths)
+        recipients = self.recipients()
+        return self._run(paths, lambda path: self._encrypt_one(path, recipients))
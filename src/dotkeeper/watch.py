@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Self
+
+from .links import LinkState
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+    from rich.console import Console
+
+    from .backupstore import BackupStore
+
+# Event masks from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Any change to the entries of a parent directory that can change the status of a link inside it.
+WATCH_MASK = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+) | IN_ONLYDIR
+
+_EVENT = struct.Struct('iIII')
+# Room for plenty of events, each at most sizeof(struct inotify_event) + NAME_MAX + 1 bytes.
+_BUFFER_SIZE = 64 * (_EVENT.size + 256)
+
+
+class Inotify:
+    """Minimal ctypes binding to the Linux inotify API.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available on this platform
+    """
+
+    def __init__(self) -> None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError('inotify is not available on this platform') from e
+
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        if (fd := init(IN_NONBLOCK | IN_CLOEXEC)) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, path: Path | str, mask: int = WATCH_MASK) -> int:
+        """Watch a directory and return its watch descriptor."""
+        if (wd := self._add_watch(self.fd, os.fsencode(path), mask)) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read(self, timeout: float | None = None) -> list[tuple[int, int, str]]:
+        """Wait for events and return them as ``(wd, mask, name)`` tuples.
+
+        Parameters
+        ----------
+        timeout : float | None, default=None
+            Seconds to wait for the first event; blocks indefinitely (without using CPU) if ``None``
+
+        Returns
+        -------
+        list[tuple[int, int, str]]
+            Pending events, empty if the timeout expired
+        """
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, _BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class LinkWatcher:
+    """Track link states from inotify events on the parent directories of sources and targets.
+
+    Only the directories are watched, one watch per distinct directory, and an event only re-checks the links
+    whose source or target has the event's name in that directory, so memory stays proportional to the
+    configuration and an idle watcher sleeps in ``select``. Directories that do not exist when watching
+    starts cannot be watched; links inside them are reported by the initial scan only.
+
+    Parameters
+    ----------
+    links : Iterable[tuple[Path, Path]]
+        Expanded ``(source, target)`` pairs
+    states : Iterable[LinkState] | None, default=None
+        Already known states, e.g. from `dotkeeper.cli.scan_symlinks`; links are scanned if omitted
+    """
+
+    def __init__(self, links: Iterable[tuple[Path, Path]], states: Iterable[LinkState] | None = None) -> None:
+        self.states: dict[Path, LinkState] = {state.source: state for state in states or ()}
+        self._links: dict[Path, Path] = {}
+        # Directory -> entry name -> sources whose status depends on that entry.
+        self._names: defaultdict[str, defaultdict[str, set[Path]]] = defaultdict(lambda: defaultdict(set))
+        for source, target in links:
+            self._links[source] = target
+            if source not in self.states:
+                self.states[source] = LinkState.scan(source, target)
+            for path in (source, target):
+                self._names[os.path.dirname(path)][os.path.basename(path)].add(source)
+
+        self._inotify = Inotify()
+        self._dirs: dict[int, str] = {}
+        self.unwatched: list[str] = []
+        for directory in self._names:
+            try:
+                self._dirs[self._inotify.add_watch(directory)] = directory
+            except OSError:
+                self.unwatched.append(directory)
+
+    @property
+    def watched(self) -> int:
+        """Number of directories being watched."""
+        return len(self._dirs)
+
+    def _affected(self, events: list[tuple[int, int, str]]) -> set[Path]:
+        affected: set[Path] = set()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                return set(self._links)
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                for sources in self._names[directory].values():
+                    affected |= sources
+                if mask & IN_IGNORED:
+                    del self._dirs[wd]
+                    self.unwatched.append(directory)
+            else:
+                affected |= self._names[directory].get(name, set())
+        return affected
+
+    def poll(
+        self, timeout: float | None = None, *, settle: float = 0.05
+    ) -> list[tuple[LinkState, LinkState]]:
+        """Wait for filesystem events and re-check the links they affect.
+
+        Parameters
+        ----------
+        timeout : float | None, default=None
+            Seconds to wait for the first event; blocks indefinitely if ``None``
+        settle : float, default=0.05
+            Seconds to keep collecting events after the first one, so a burst (e.g. an editor's
+            write-then-rename) is processed once
+
+        Returns
+        -------
+        list[tuple[LinkState, LinkState]]
+            ``(previous, current)`` states of the links whose status changed
+        """
+
+        events = self._inotify.read(timeout)
+        if not events:
+            return []
+        deadline = time.monotonic() + settle
+        while (remaining := deadline - time.monotonic()) > 0 and (more := self._inotify.read(remaining)):
+            events.extend(more)
+
+        changes = []
+        for source in sorted(self._affected(events)):
+            previous = self.states[source]
+            current = self.states[source] = LinkState.scan(source, self._links[source])
+            if current.status != previous.status:
+                changes.append((previous, current))
+        return changes
+
+    def close(self) -> None:
+        self._inotify.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def watch_links(
+    console: Console,
+    links: Iterable[tuple[Path, Path]],
+    states: Iterable[LinkState] | None = None,
+    *,
+    repair: bool = False,
+    store: BackupStore | None = None,
+) -> None:
+    """Report (and optionally repair) link drift until interrupted.
+
+    Parameters
+    ----------
+    console : Console
+        Rich console for output
+    links : Iterable[tuple[Path, Path]]
+        Expanded ``(source, target)`` pairs
+    states : Iterable[LinkState] | None, default=None
+        Already known states of the links
+    repair : bool, default=False
+        Re-link sources that drift away from their target; replaced originals are backed up as in ``dk apply``
+    store : BackupStore | None, default=None
+        Store for the originals replaced by repairs, defaults to the store in the data directory
+    """
+
+    from .cli import apply_changes
+
+    with LinkWatcher(links, states) as watcher:
+        console.print(
+            f'[bold cyan]Watching {len(watcher.states)} links in {watcher.watched} directories '
+            '(Ctrl+C to stop)[/bold cyan]'
+        )
+        for directory in watcher.unwatched:
+            console.print(f'[yellow]Cannot watch {directory}, changes there go unnoticed[/yellow]')
+
+        try:
+            while True:
+                changes = watcher.poll()
+                for previous, current in changes:
+                    console.print(
+                        f'[dim]{time.strftime("%H:%M:%S")}[/dim] {current.source}: '
+                        f'{previous.status} -> [bold]{current.status}[/bold]'
+                    )
+
+                drifted = [current for _, current in changes if current.status != 'CORRECT']
+                if repair and (repairable := [state for state in drifted if state.target_exists]):
+                    apply_changes(console=console, states=repairable, assume_yes=True, store=store)
+        except KeyboardInterrupt:
+            console.print('[yellow]Stopped watching[/yellow]')
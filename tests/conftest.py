@@ -1,9 +1,16 @@
 import os
 
 import pytest
+import rich.prompt  # noqa: F401 - dotkeeper imports it lazily; load it before pyfakefs so tests patch one module
+import yaml  # noqa: F401 - likewise; a reloaded `yaml` no longer matches its cached C extension
 from pyfakefs.fake_filesystem import FakeFilesystem
 from rich.console import Console
 
+from dotkeeper.config import get_app_version
+
+# Package metadata is read lazily (and cached); resolve it before pyfakefs hides the real site-packages.
+get_app_version()
+
 
 @pytest.fixture
 def console() -> Console:
@@ -0,0 +1,66 @@
+import time
+from pathlib import Path
+
+import anyio
+import pytest
+from rich.console import Console
+
+from dotkeeper.aio import LatencyFS, OperationTimeoutError, scan_links
+from dotkeeper.cli import scan_symlinks
+from dotkeeper.journal import Transaction
+from dotkeeper.links import LinkState
+
+
+@pytest.fixture
+def pairs(tmp_path: Path) -> list[tuple[Path, Path]]:
+    home, dotfiles = tmp_path / 'home', tmp_path / 'dotfiles'
+    home.mkdir()
+    dotfiles.mkdir()
+    pairs = []
+    for i in range(40):
+        target = dotfiles / f'rc{i}'
+        target.write_text(str(i))
+        source = home / f'.rc{i}'
+        if i % 4 == 1:
+            source.symlink_to(target)
+        elif i % 4 == 2:
+            source.write_text('local')
+        elif i % 4 == 3:
+            source.symlink_to(dotfiles / 'elsewhere')
+        pairs.append((source, target))
+    return pairs
+
+
+def test_async_scan_matches_sync_scan_on_slow_filesystem(pairs: list[tuple[Path, Path]]) -> None:
+    expected = [LinkState.scan(source, target) for source, target in pairs]
+
+    fs = LatencyFS(0.01)
+    start = time.perf_counter()
+    states = scan_links(pairs, limit=16, fs=fs)
+    elapsed = time.perf_counter() - start
+
+    assert states == expected
+    assert fs.max_in_flight > 1
+    # Every link needs at least two calls; issued one at a time they would take 0.8s.
+    assert elapsed < fs.calls * fs.latency / 2
+
+    with pytest.raises(OperationTimeoutError) as excinfo:
+        scan_links(pairs[:3], timeout=0.005, fs=LatencyFS(0.05))
+    assert excinfo.value.paths == sorted(str(source) for source, _ in pairs[:3])
+
+
+def test_apply_async_creates_the_same_links(
+    pairs: list[tuple[Path, Path]], tmp_path: Path, monkeypatch: pytest.MonkeyPatch, console: Console
+) -> None:
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    config = {str(source): str(target) for source, target in pairs}
+    pending = [state for state in scan_symlinks(config) if state.status != 'CORRECT']
+
+    txn = Transaction.begin(pending)
+    anyio.run(lambda: txn.apply_async(console, limit=8))
+
+    assert all(state.status == 'CORRECT' for state in scan_symlinks(config))
+    assert len(txn.completed) == len(pending)
+    txn.rollback(console)
+    assert (tmp_path / 'home' / '.rc2').read_text() == 'local'
+    assert not (tmp_path / 'home' / '.rc0').exists()
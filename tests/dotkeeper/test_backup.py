@@ -0,0 +1,65 @@
+import errno
+from pathlib import Path
+
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+
+from dotkeeper.backup import backup_item, format_report, format_size
+
+
+@pytest.fixture
+def tree(fs: FakeFilesystem) -> Path:
+    root = Path('/home/user/.config/nvim')
+    fs.create_file(root / 'init.lua', contents='-- init')
+    fs.create_file(root / 'lua' / 'plugins.lua', contents='return {}')
+    fs.create_symlink(root / 'current', root / 'init.lua')
+    fs.create_dir('/home/user/backup')
+    return root
+
+
+def test_backup_item_moves_on_same_filesystem(tree: Path) -> None:
+    destination = Path('/home/user/backup/nvim')
+
+    report = backup_item(tree, destination, move=True)
+
+    assert not tree.exists()
+    assert report.moved == [tree]
+    assert report.strategies == {'move': 1}
+    assert report.bytes_total == len('-- init') + len('return {}')
+    assert report.bytes_copied == 0
+    assert (destination / 'lua' / 'plugins.lua').read_text() == 'return {}'
+
+
+def test_backup_item_hardlinks_when_rename_fails(tree: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def _cross_device(*_: object) -> None:
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr('dotkeeper.backup.os.rename', _cross_device)
+    destination = Path('/home/user/backup/nvim')
+
+    report = backup_item(tree, destination, move=True)
+
+    assert tree.exists()
+    assert not report.moved
+    assert report.strategies == {'hardlink': 2, 'copy': 1}  # the symlink is recreated, not linked
+    assert report.bytes_copied == 0
+    assert report.bytes_saved == report.bytes_total
+    assert (destination / 'init.lua').stat().st_ino == (tree / 'init.lua').stat().st_ino
+    assert (destination / 'current').is_symlink()
+
+
+def test_backup_item_copies_originals_that_stay(fs: FakeFilesystem) -> None:
+    fs.create_file('/home/user/.bashrc', contents='x' * 4096)
+
+    report = backup_item(Path('/home/user/.bashrc'), Path('/home/user/.bashrc.bak'))
+
+    assert report.strategies == {'copy': 1}  # no reflink support on the fake filesystem
+    assert report.bytes_copied == 4096
+    assert Path('/home/user/.bashrc.bak').stat().st_ino != Path('/home/user/.bashrc').stat().st_ino
+    assert '4.0 KiB' in format_report(report)
+
+
+def test_format_size() -> None:
+    assert format_size(512) == '512 B'
+    assert format_size(1536) == '1.5 KiB'
+    assert format_size(5 * 1024**3) == '5.0 GiB'
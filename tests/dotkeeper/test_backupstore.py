@@ -0,0 +1,100 @@
+import os
+from pathlib import Path
+
+from dotkeeper.backupstore import CHUNK_SIZE, BackupStore
+
+
+def test_snapshots_deduplicate_and_restore(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / 'store')
+    home = tmp_path / 'home'
+    (home / '.config' / 'nvim').mkdir(parents=True)
+    (home / '.bashrc').write_text('export EDITOR=vim\n')
+    (home / '.config' / 'nvim' / 'init.lua').write_text('vim.o.number = true\n')
+    os.symlink('init.lua', home / '.config' / 'nvim' / 'alias.lua')
+    big = home / 'big.bin'
+    big.write_bytes(os.urandom(CHUNK_SIZE) + b'tail')
+
+    items = [(home / '.bashrc', home / '.bashrc'), (home / '.config' / 'nvim', home / '.config' / 'nvim')]
+    first = store.snapshot([*items, (big, big)])
+    assert first is not None
+    assert first[1] == CHUNK_SIZE + 4 + len('export EDITOR=vim\n') + len('vim.o.number = true\n')
+
+    # Unchanged content, and a big file changed only in its last chunk, add almost nothing.
+    big.write_bytes(big.read_bytes()[:CHUNK_SIZE] + b'TAIL')
+    second = store.snapshot([*items, (big, big)])
+    assert second is not None
+    assert second[1] == 4
+    assert [snapshot.id for snapshot in store.snapshots()] == [first[0].id, second[0].id]
+
+    restored, skipped = store.restore(
+        store.find(first[0].id[:20]), [home / '.config'], destination=tmp_path / 'out'
+    )
+    out = tmp_path / 'out' / home.relative_to('/')
+    assert skipped == []
+    assert sorted(restored) == [
+        out / '.config' / 'nvim',
+        out / '.config' / 'nvim' / 'alias.lua',
+        out / '.config' / 'nvim' / 'init.lua',
+    ]
+    assert os.readlink(out / '.config' / 'nvim' / 'alias.lua') == 'init.lua'
+    assert (out / '.config' / 'nvim' / 'init.lua').read_text() == 'vim.o.number = true\n'
+
+    (home / '.bashrc').unlink()
+    # Existing directories are merged into, existing files are left alone.
+    assert store.restore(first[0])[1] == [
+        home / '.config' / 'nvim' / 'alias.lua',
+        home / '.config' / 'nvim' / 'init.lua',
+        big,
+    ]
+    assert (home / '.bashrc').read_text() == 'export EDITOR=vim\n'
+    store.restore(first[0], [big], overwrite=True)
+    assert big.read_bytes().endswith(b'tail')
+
+
+def test_gc_keeps_newest_within_size(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / 'store')
+    dotfile = tmp_path / '.zshrc'
+    ids = []
+    for i in range(3):
+        dotfile.write_text(f'{i}' * 1000)
+        snapshot = store.snapshot([(dotfile, dotfile)])
+        assert snapshot is not None
+        ids.append(snapshot[0].id)
+
+    assert store.gc().blobs == 0
+    report = store.gc(2500)
+    assert report.snapshots == [ids[0]]
+    assert (report.blobs, report.bytes_freed) == (1, 1000)
+    assert store.size() == 2000
+
+    report = store.gc(0)
+    assert report.snapshots == [ids[1]]
+    assert [snapshot.id for snapshot in store.snapshots()] == [ids[2]]
+    assert store.size() == 1000
+
+
+def test_restore_never_writes_through_links(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / 'store')
+    nvim, repo = tmp_path / 'home' / '.config' / 'nvim', tmp_path / 'repo' / 'nvim'
+    nvim.mkdir(parents=True)
+    (nvim / 'init.lua').write_text('old\n')
+    repo.mkdir(parents=True)
+    (repo / 'init.lua').write_text('repo\n')
+    snapshot = store.snapshot([(nvim, nvim)])
+    assert snapshot is not None
+
+    # What `dk apply` leaves behind: the original replaced by a link into the repository.
+    (nvim / 'init.lua').unlink()
+    nvim.rmdir()
+    nvim.symlink_to(repo)
+
+    restored, skipped = store.restore(snapshot[0])
+    assert restored == []
+    assert skipped == [nvim, nvim / 'init.lua']
+    assert nvim.is_symlink()
+
+    restored, skipped = store.restore(snapshot[0], overwrite=True)
+    assert restored == [nvim, nvim / 'init.lua']
+    assert not nvim.is_symlink()
+    assert (nvim / 'init.lua').read_text() == 'old\n'
+    assert (repo / 'init.lua').read_text() == 'repo\n'
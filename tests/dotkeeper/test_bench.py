@@ -0,0 +1,88 @@
+import dataclasses
+import subprocess
+import sys
+from pathlib import Path
+
+import msgspec
+import pytest
+
+from dotkeeper.bench import (
+    PipelineBaseline,
+    compare_baselines,
+    measure_retained,
+    parse_importtime,
+    run_pipeline,
+    synthetic_states,
+)
+from dotkeeper.links import LinkTable
+
+
+def test_parse_importtime() -> None:
+    output = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _stat
+import time:       300 |        420 |   stat
+import time:      1000 |       1420 | dotkeeper
+"""
+
+    timings = parse_importtime(output)
+
+    assert [t.module for t in timings] == ['_stat', 'stat', 'dotkeeper']
+    assert timings[0].depth == 2
+    assert timings[-1].cumulative_us == 1420
+    assert timings[-1].self_us == 1000
+
+
+def test_import_is_lazy() -> None:
+    code = (
+        'import sys, dotkeeper, dotkeeper.cli, dotkeeper.config; '
+        "print(','.join(m for m in ('pydantic', 'yaml', 'rich', 'dotenv', 'cyclopts') if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ''
+
+
+def test_bench_commands_import_lazily() -> None:
+    code = (
+        'import sys, dotkeeper.app; '
+        "print(','.join(m for m in ('msgspec', 'statistics', 'tracemalloc', 'dotkeeper.links') "
+        'if m in sys.modules))'
+    )
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ''
+
+
+def test_link_table_retains_less_memory() -> None:
+    as_list = measure_retained(lambda: list(synthetic_states(2000)))
+    as_table = measure_retained(lambda: LinkTable(synthetic_states(2000)))
+    assert 0 < as_table < as_list / 2
+
+    def broken() -> LinkTable:
+        raise ValueError('no states')
+
+    with pytest.raises(ValueError, match='no states'):
+        measure_retained(broken)
+
+
+def test_pipeline_baselines_compare(tmp_path: Path) -> None:
+    current = run_pipeline([20], root=tmp_path, runs=1)
+    assert [timing.phase for timing in current.timings] == [
+        'load_yaml_config',
+        'recurse_yaml_config',
+        'scan',
+        'preview',
+        'backup',
+    ]
+    assert all(timing.links == 20 and timing.best > 0 for timing in current.timings)
+    assert list(tmp_path.iterdir()) == []
+
+    previous = msgspec.json.decode(msgspec.json.encode(current), type=PipelineBaseline)
+    previous.timings[2] = dataclasses.replace(previous.timings[2], best=current.timings[2].best / 2)
+    previous.timings.pop()
+    rows = compare_baselines(current, previous, threshold=0.5)
+    assert [(timing.phase, regressed) for timing, _, regressed in rows] == [
+        ('load_yaml_config', False),
+        ('recurse_yaml_config', False),
+        ('scan', True),
+        ('preview', False),
+    ]
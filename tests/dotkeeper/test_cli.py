@@ -6,6 +6,7 @@ from pyfakefs.fake_filesystem import FakeFilesystem
 from rich.console import Console
 
 from dotkeeper.cli import (
+    LinkStatus,
     backup_before_modifying,
     check_symlink_status,
     check_target_validity,
@@ -14,6 +15,7 @@ from dotkeeper.cli import (
     load_yaml_config,
     manage_symlinks,
     recurse_yaml_config,
+    scan_symlinks,
 )
 from dotkeeper.config import Config
 
@@ -26,6 +28,22 @@ def test_check_target_validity(fs: FakeFilesystem) -> None:
     assert check_target_validity(target) == 'EXISTS'
 
 
+def test_link_status_from_state(fs: FakeFilesystem) -> None:
+    fs.create_file('/home/user/dotfiles/.bashrc')
+    fs.create_symlink('/home/user/.bashrc', '/home/user/dotfiles/.bashrc')
+    [correct, missing] = scan_symlinks(
+        {
+            '/home/user/.bashrc': '/home/user/dotfiles/.bashrc',
+            '/home/user/.vimrc': '/home/user/dotfiles/.vimrc',
+        }
+    )
+
+    assert LinkStatus.from_state(correct) == LinkStatus(
+        Path('/home/user/.bashrc'), Path('/home/user/dotfiles/.bashrc'), 'CORRECT', 'green1'
+    )
+    assert LinkStatus.from_state(missing).style == 'yellow1'
+
+
 def test_backup_and_restore(fs: FakeFilesystem, console: Console) -> None:
     source = Path('/home/user/.bashrc')
     backup_dir = Path('/home/user/backup')
@@ -212,3 +230,27 @@ def test_empty_config() -> None:
     assert isinstance(config.dotfiles.links, dict)
     assert len(config.dotfiles.links) == 0
     assert config.dotfiles.obfuscate['file_names'] == []
+
+
+def test_scan_symlinks(fs: FakeFilesystem) -> None:
+    dotfiles = Path('/home/user/dotfiles')
+    config = {}
+    for i in range(20):
+        fs.create_file(dotfiles / f'file{i}', contents=str(i))
+        config[f'/home/user/file{i}'] = str(dotfiles / f'file{i}')
+    fs.create_symlink('/home/user/file3', dotfiles / 'file3')
+    fs.create_symlink('/home/user/file4', dotfiles / 'file5')
+    fs.create_file('/home/user/file5', contents='local')
+
+    serial = scan_symlinks(config, workers=1)
+    threaded = scan_symlinks(config, workers=8)
+
+    assert serial == threaded
+    assert [str(state.source) for state in threaded] == list(config)
+    assert threaded[3].status == 'CORRECT'
+    assert threaded[4].status == 'INCORRECT'
+    assert threaded[5].status == 'NONLINK'
+    assert threaded[0].status == 'MISSING'
+
+    with pytest.raises(ValueError, match='workers'):
+        scan_symlinks(config, workers=0)
@@ -0,0 +1,98 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from dotkeeper import cli
+from dotkeeper.cli import load_yaml_config
+from dotkeeper.models import TreeRule
+
+
+@pytest.fixture
+def config_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    monkeypatch.setenv('DOTFILES', '/home/user/dotfiles')
+    path = tmp_path / 'config.yml'
+    path.write_text('dotfiles:\n  links:\n    ~/.bashrc: $DOTFILES/.bashrc\n')
+    # Old enough to be trusted by its mtime alone.
+    os.utime(path, ns=(0, 0))
+    return path
+
+
+def test_compiled_config_cache(config_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    first = load_yaml_config(config_path)
+    assert first.dotfiles.links == {'~/.bashrc': '/home/user/dotfiles/.bashrc'}
+
+    def fail(_: object) -> object:
+        raise AssertionError('config was re-parsed')
+
+    with monkeypatch.context() as m:
+        m.setattr(cli, 'recurse_yaml_config', fail)
+        assert load_yaml_config(config_path) == first
+        # Touching the file without changing it falls back to the content hash.
+        os.utime(config_path, ns=(1, 1))
+        assert load_yaml_config(config_path) == first
+
+    monkeypatch.setenv('DOTFILES', '/srv/dotfiles')
+    assert load_yaml_config(config_path).dotfiles.links == {'~/.bashrc': '/srv/dotfiles/.bashrc'}
+
+    config_path.write_text('dotfiles:\n  links:\n    ~/.vimrc: $DOTFILES/.vimrc\n')
+    os.utime(config_path, ns=(2, 2))
+    assert load_yaml_config(config_path).dotfiles.links == {'~/.vimrc': '/srv/dotfiles/.vimrc'}
+
+    # Links given with options come back from the cache as models.
+    config_path.write_text(
+        'dotfiles:\n  links:\n    ~/.app:\n      target: $DOTFILES/app\n      mode: copy\n'
+    )
+    os.utime(config_path, ns=(3, 3))
+    assert load_yaml_config(config_path).copies() == {'~/.app': '/srv/dotfiles/app'}
+    assert load_yaml_config(config_path).copies() == {'~/.app': '/srv/dotfiles/app'}
+
+
+def test_profile_views(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    path = tmp_path / 'config.yml'
+    path.write_text(
+        'dotfiles:\n'
+        '  links: {~/.bashrc: base, ~/.vimrc: base}\n'
+        '  profiles:\n'
+        '    dev: {links: {~/.gitconfig: dev}, trees: [{source: ~/.config, target: dev-config}]}\n'
+        '    ops: {links: {~/.ssh/config: ops}}\n'
+        '    web: {extends: [dev, ops], links: {~/.vimrc: web}, exclude: [~/.bashrc]}\n'
+        '    loop: {extends: [loop]}\n'
+        '  hosts:\n'
+        '    web-01: {extends: [ops], links: {~/.ssh/config: web-01}}\n'
+    )
+    os.utime(path, ns=(0, 0))
+
+    config = load_yaml_config(path, profile='web', host='web-01')
+    assert config.dotfiles.links == {'~/.vimrc': 'web', '~/.gitconfig': 'dev', '~/.ssh/config': 'web-01'}
+    assert not config.dotfiles.profiles
+    assert [rule.target for rule in config.dotfiles.trees] == ['dev-config']
+    assert load_yaml_config(path).dotfiles.trees == []
+    assert load_yaml_config(path, host='laptop').dotfiles.links == {'~/.bashrc': 'base', '~/.vimrc': 'base'}
+    with pytest.raises(ValueError, match='extends itself'):
+        load_yaml_config(path, profile='loop')
+    with pytest.raises(ValueError, match='Unknown profile'):
+        load_yaml_config(path, profile='db')
+
+    def fail(*_: object) -> object:
+        raise AssertionError('profile was merged again')
+
+    monkeypatch.setattr('dotkeeper.models.Config.resolve_profile', fail)
+    assert load_yaml_config(path, profile='web', host='web-01') == config
+
+
+def test_cached_config_keeps_tree_rules(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    (tmp_path / 'dotfiles' / 'nvim').mkdir(parents=True)
+    (tmp_path / 'dotfiles' / 'nvim' / 'init.lua').write_text('')
+    path = tmp_path / 'config.yml'
+    path.write_text(f'dotfiles:\n  trees:\n    - source: ~/.config\n      target: {tmp_path}/dotfiles\n')
+    os.utime(path, ns=(0, 0))
+
+    first = load_yaml_config(path)
+    cached = load_yaml_config(path)
+    assert isinstance(cached.dotfiles.trees[0], TreeRule)
+    assert cached.all_links() == first.all_links()
+    assert list(cached.all_links().values()) == [f'{tmp_path}/dotfiles/nvim/init.lua']
@@ -0,0 +1,94 @@
+import time
+from pathlib import Path
+
+import pytest
+from cryptography.fernet import Fernet
+
+from dotkeeper.credentials import (
+    CACHE_FILE,
+    KEY_FILE,
+    CredentialCache,
+    CredentialError,
+    CredentialResolver,
+    MemoryBackend,
+)
+
+SECRETS = {
+    'mem://work/db/password': 'hunter2',
+    'mem://work/db/user': 'admin',
+    'mem://home/wifi/password': 'correct horse',
+}
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path)
+    return tmp_path
+
+
+def test_resolver_dedupes_and_batches_per_vault() -> None:
+    backend = MemoryBackend(SECRETS)
+    resolver = CredentialResolver([backend])
+
+    refs = [*SECRETS, 'mem://work/db/password']
+    assert resolver.resolve_many(refs) == SECRETS
+    assert sorted(map(sorted, backend.batches)) == [
+        ['mem://home/wifi/password'],
+        ['mem://work/db/password', 'mem://work/db/user'],
+    ]
+    assert resolver.resolve('mem://work/db/user') == 'admin'
+    assert len(backend.batches) == 2
+    assert (resolver.stats.hits, resolver.stats.misses, resolver.stats.batches) == (1, 3, 2)
+
+    with pytest.raises(CredentialError) as excinfo:
+        resolver.resolve_many(['mem://work/db/user', 'mem://work/nope', 'vault://unknown'])
+    assert excinfo.value.refs == ('mem://work/nope', 'vault://unknown')
+
+
+def test_encrypted_cache(cache_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    key = Fernet.generate_key()
+    resolver = CredentialResolver([MemoryBackend(SECRETS)], cache=CredentialCache(60, key=key))
+    resolver.resolve_many(SECRETS)
+    contents = (cache_dir / CACHE_FILE).read_text()
+    assert 'hunter2' not in contents
+    assert 'work' not in contents
+
+    backend = MemoryBackend(SECRETS)
+    resolver = CredentialResolver([backend], cache=CredentialCache(60, key=key))
+    assert resolver.resolve_many(SECRETS) == SECRETS
+    assert (resolver.stats.cache_hits, resolver.stats.misses, backend.batches) == (3, 0, [])
+
+    cache = CredentialCache(60, key=key)
+    assert cache.evict(['mem://home/wifi/password']) == 1
+    cache.flush()
+    now = time.time()
+    with monkeypatch.context() as m:
+        m.setattr(time, 'time', lambda: now + 30)
+        resolver = CredentialResolver([backend], cache=CredentialCache(60, key=key))
+        resolver.resolve_many(SECRETS)
+        assert (resolver.stats.cache_hits, resolver.stats.misses) == (2, 1)
+
+        m.setattr(time, 'time', lambda: now + 120)
+        resolver = CredentialResolver([backend], cache=CredentialCache(60, key=key))
+        resolver.resolve_many(SECRETS)
+        assert (resolver.stats.cache_hits, resolver.stats.misses) == (0, 3)
+
+
+def test_evict_never_creates_a_key(cache_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    key = Fernet.generate_key()
+    stored: list[str] = []
+    monkeypatch.setattr('keyring.get_password', lambda *args: key.decode() if stored else None)
+    monkeypatch.setattr('keyring.set_password', lambda *args: stored.append(args[-1]))
+
+    assert CredentialCache(60).evict(['mem://work/db/password']) == 0
+    assert CredentialCache(60).evict() == 0
+    assert stored == []
+    assert not (cache_dir / KEY_FILE).exists()
+
+    cache = CredentialCache(60, key=key)
+    cache.set('mem://work/db/password', 'hunter2')
+    cache.flush()
+    # An existing key is used to find the entries.
+    stored.append(key.decode())
+    assert CredentialCache(60).evict(['mem://work/db/password']) == 1
+    assert stored == [key.decode()]
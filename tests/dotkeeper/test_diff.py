@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from dotkeeper import diff
+from dotkeeper.cli import scan_symlinks
+from dotkeeper.diff import compare, identical_sources, same_file
+from dotkeeper.journal import Transaction
+
+
+def test_compare_files_and_trees(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Compare through memory maps in small chunks, so the chunked path is exercised.
+    monkeypatch.setattr(diff, 'MMAP_THRESHOLD', 16)
+    monkeypatch.setattr(diff, 'CHUNK_SIZE', 8)
+
+    (tmp_path / 'a').write_bytes(b'x' * 40)
+    (tmp_path / 'b').write_bytes(b'x' * 40)
+    (tmp_path / 'c').write_bytes(b'x' * 39 + b'y')
+    assert same_file(tmp_path / 'a', tmp_path / 'b')
+    assert not same_file(tmp_path / 'a', tmp_path / 'c')
+    assert compare(tmp_path / 'a', tmp_path / 'b').identical
+
+    (tmp_path / 'local').write_text('set number\nset hlsearch\n')
+    (tmp_path / 'repo').write_text('set number\nset incsearch\n')
+    [text] = compare(tmp_path / 'local', tmp_path / 'repo').diffs
+    assert text.change == 'modified'
+    assert '-set hlsearch\n' in text.lines
+    assert '+set incsearch\n' in text.lines
+    assert compare(tmp_path / 'local', tmp_path / 'repo', first=True).diffs[0].lines == []
+
+    for side, extra in (('home', 'only-here'), ('dotfiles', 'only-there')):
+        (tmp_path / side / 'nvim').mkdir(parents=True)
+        (tmp_path / side / 'nvim' / 'init.lua').write_text('vim.o.number = true\n')
+        (tmp_path / side / 'nvim' / 'spell.bin').write_bytes(b'\0' + side.encode())
+        (tmp_path / side / extra).write_text('')
+    changes = {(d.source.name, d.change) for d in compare(tmp_path / 'home', tmp_path / 'dotfiles').diffs}
+    assert changes == {('only-here', 'only_source'), ('only-there', 'only_target'), ('spell.bin', 'binary')}
+
+
+def test_identical_conflicts_are_replaced_without_backup(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, console: Console
+) -> None:
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    (tmp_path / 'dotfiles').mkdir()
+    (tmp_path / 'dotfiles' / 'zshrc').write_text('setopt autocd\n')
+    (tmp_path / 'dotfiles' / 'vimrc').write_text('set number\n')
+    (tmp_path / '.zshrc').write_text('setopt autocd\n')
+    (tmp_path / '.vimrc').write_text('set nonumber\n')
+    config = {str(tmp_path / '.zshrc'): str(tmp_path / 'dotfiles' / 'zshrc')}
+    config[str(tmp_path / '.vimrc')] = str(tmp_path / 'dotfiles' / 'vimrc')
+
+    states = scan_symlinks(config)
+    identical = identical_sources(states)
+    assert identical == {tmp_path / '.zshrc'}
+
+    txn = Transaction.begin(states, identical=identical)
+    assert [entry.backup is None for entry in txn.header.entries] == [True, False]
+    txn.apply(console)
+    assert all(state.status == 'CORRECT' for state in scan_symlinks(config))
+
+    txn.rollback(console)
+    assert not (tmp_path / '.zshrc').is_symlink()
+    assert (tmp_path / '.zshrc').read_text() == 'setopt autocd\n'
+    assert (tmp_path / '.vimrc').read_text() == 'set nonumber\n'
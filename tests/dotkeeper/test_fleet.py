@@ -0,0 +1,58 @@
+import os
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from dotkeeper.backupstore import BackupStore
+from dotkeeper.fleet import apply_fleet, read_roots
+
+
+def test_apply_fleet_links_every_root(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, console: Console
+) -> None:
+    # Worker processes inherit the environment, so their transactions stay inside tmp_path too.
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    dotfiles = tmp_path / 'dotfiles'
+    (dotfiles / 'config' / 'nvim').mkdir(parents=True)
+    (dotfiles / 'zshrc').write_text('setopt autocd\n')
+    (dotfiles / 'gitconfig').write_text('[user]\n  name = ci\n')
+    (dotfiles / 'config' / 'nvim' / 'init.lua').write_text('vim.o.number = true\n')
+    config = tmp_path / 'config.yml'
+    config.write_text(
+        'dotfiles:\n'
+        f'  links:\n    $HOME/.zshrc: {dotfiles}/zshrc\n'
+        f'    ~/.gitconfig: {{target: {dotfiles}/gitconfig, mode: copy}}\n'
+        f'  trees:\n    - source: ~/.config\n      target: {dotfiles}/config\n'
+    )
+
+    homes = tmp_path / 'homes'
+    (homes / 'ci').mkdir(parents=True)
+    (homes / 'web').mkdir()
+    (homes / 'web' / '.zshrc').write_text('# local\n')
+    # Identical to the repository, so it is replaced without a backup.
+    (homes / 'ci' / '.zshrc').write_text('setopt autocd\n')
+    (homes / 'web' / '.gitconfig').write_text('[user]\n  name = web\n')
+    roots_file = tmp_path / 'roots.txt'
+    roots_file.write_text(f'# service accounts\n{homes / "web"}\n\n{homes / "ci"}\n')
+    roots = read_roots(f'{homes / "ci"},', roots_file)
+    assert roots == [homes / 'ci', homes / 'web']
+
+    home = os.environ['HOME']
+    store = BackupStore(tmp_path / 'store')
+    assert apply_fleet(console, config, roots, processes=2, assume_yes=True, store_root=store.root)
+    assert os.environ['HOME'] == home
+
+    for root in roots:
+        assert os.readlink(root / '.zshrc') == str(dotfiles / 'zshrc')
+        assert os.readlink(root / '.config' / 'nvim' / 'init.lua') == str(
+            dotfiles / 'config' / 'nvim' / 'init.lua'
+        )
+        assert not (root / '.gitconfig').is_symlink()
+        assert (root / '.gitconfig').read_text() == '[user]\n  name = ci\n'
+    roots_backed_up = sorted(root for snapshot in store.snapshots() for root in snapshot.roots)
+    assert roots_backed_up == [str(homes / 'web' / '.gitconfig'), str(homes / 'web' / '.zshrc')]
+
+    # A second run finds nothing to do.
+    assert apply_fleet(console, config, roots, processes=2, store_root=store.root)
+    assert len(store.snapshots()) == 2
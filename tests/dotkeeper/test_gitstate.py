@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from dotkeeper.gitstate import GitChanges, find_git_dir, read_head, read_index
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+
+def git(repo: Path, *args: str) -> str:
+    env = {**os.environ, 'GIT_CONFIG_GLOBAL': os.devnull, 'GIT_CONFIG_NOSYSTEM': '1'}
+    return subprocess.run(
+        ['git', '-c', 'user.name=dk', '-c', 'user.email=dk@example.com', *args],
+        cwd=repo,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    repo = tmp_path / 'dotfiles'
+    for path in (
+        'zsh/.zshrc',
+        'nvim/init.lua',
+        'nvim/lua/plugins/very-long-directory-name/lsp.lua',
+        'gitconfig',
+    ):
+        (repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / path).write_text(path)
+    git(repo, 'init', '-q', '-b', 'main')
+    git(repo, 'add', '.')
+    git(repo, 'commit', '-q', '-m', 'Initial')
+    return repo
+
+
+@pytest.mark.parametrize('version', [2, 3, 4])
+def test_read_index_matches_git(repo: Path, version: int) -> None:
+    (repo / 'new.lua').write_text('')
+    git(repo, 'add', '--intent-to-add', 'new.lua')  # an extended entry, which makes git write version 3
+    git(repo, 'update-index', '--index-version', str(version))
+    git(repo, 'pack-refs', '--all')
+
+    root, git_dir = find_git_dir(repo / 'nvim' / 'lua') or (None, None)
+    assert (root, git_dir) == (repo, repo / '.git')
+    assert read_head(git_dir) == git(repo, 'rev-parse', 'HEAD').strip()
+    expected = {
+        line.split('\t')[1]: line.split()[1] for line in git(repo, 'ls-files', '--stage').splitlines()
+    }
+    assert {path: entry.oid for path, entry in read_index(git_dir).items()} == expected
+
+
+def test_changes_since_recorded_state(repo: Path) -> None:
+    changes = GitChanges.open(repo / 'zsh')
+    assert changes is not None
+    assert changes.changed(None) is None
+    recorded = changes.state
+    assert GitChanges(repo, repo / '.git').changed(recorded) == set()
+
+    (repo / 'zsh' / '.zshrc').write_text('unstaged edit')
+    (repo / 'gitconfig').write_text('committed edit')
+    git(repo, 'commit', '-q', '-am', 'Edit gitconfig')
+    (repo / 'nvim' / 'init.lua').unlink()
+    (repo / 'extra.lua').write_text('staged')
+    git(repo, 'add', 'extra.lua')
+
+    # Rewriting a file with the same content replaces its inode, which links to it would notice.
+    lsp = repo / 'nvim' / 'lua' / 'plugins' / 'very-long-directory-name' / 'lsp.lua'
+    lsp.with_suffix('.tmp').write_text(lsp.read_text())
+    lsp.with_suffix('.tmp').replace(lsp)
+
+    changes = GitChanges(repo, repo / '.git')
+    assert changes.changed(recorded) == {
+        repo / 'zsh' / '.zshrc',
+        repo / 'gitconfig',
+        repo / 'nvim' / 'init.lua',
+        repo / 'extra.lua',
+        lsp,
+    }
+    assert changes.is_tracked(repo / 'gitconfig')
+    assert not changes.is_tracked(repo / 'nvim' / 'init.lua')
+    assert changes.changed(changes.state) == set()
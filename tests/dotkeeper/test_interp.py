@@ -0,0 +1,25 @@
+import pytest
+
+from dotkeeper.interp import Interpolator, MissingVariablesError
+
+
+def test_interpolator() -> None:
+    interpolator = Interpolator({'HOME': '/home/user', 'EMPTY': '', 'NESTED': '$HOME'})
+
+    assert interpolator.interpolate('$HOME/.bashrc') == '/home/user/.bashrc'
+    assert interpolator.interpolate('${HOME}x costs $$5, $ {') == '/home/userx costs $5, $ {'
+    assert interpolator.interpolate('${EMPTY:-fallback}/${UNSET:-~/x}') == 'fallback/~/x'
+    # Substituted values are not expanded again.
+    assert interpolator.interpolate('$NESTED') == '$HOME'
+    assert interpolator.used == {'HOME': '/home/user', 'EMPTY': '', 'UNSET': None, 'NESTED': '$HOME'}
+
+
+def test_interpolator_reports_all_missing_variables() -> None:
+    config = {'$A/x': ['$B', {'k': '${C}'}], 'ok': 1}
+
+    with pytest.raises(MissingVariablesError) as exc_info:
+        Interpolator({'C': 'c'}).expand(config)
+
+    assert exc_info.value.names == ('A', 'B')
+    assert isinstance(exc_info.value, KeyError)
+    assert str(exc_info.value) == 'Undefined environment variables: A, B'
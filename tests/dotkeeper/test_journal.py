@@ -0,0 +1,106 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from rich.console import Console
+
+from dotkeeper import backup
+from dotkeeper.cli import scan_symlinks
+from dotkeeper.journal import Transaction
+
+
+@pytest.fixture
+def config(fs: FakeFilesystem) -> dict[str, str]:
+    # Two sources share a basename, which used to collide in the backup directory.
+    fs.create_file('/home/user/dotfiles/git/config', contents='git')
+    fs.create_file('/home/user/dotfiles/nvim/config', contents='nvim')
+    fs.create_file('/home/user/.config/git/config', contents='old git')
+    fs.create_file('/home/user/.config/nvim/config', contents='old nvim')
+    return {
+        '/home/user/.config/git/config': '/home/user/dotfiles/git/config',
+        '/home/user/.config/nvim/config': '/home/user/dotfiles/nvim/config',
+    }
+
+
+def test_rollback_restores_same_named_sources(config: dict[str, str], console: Console) -> None:
+    txn = Transaction.begin(scan_symlinks(config))
+    txn.apply(console)
+    for source, target in config.items():
+        assert Path(source).resolve() == Path(target)
+
+    txn.rollback(console)
+    assert Path('/home/user/.config/git/config').read_text() == 'old git'
+    assert Path('/home/user/.config/nvim/config').read_text() == 'old nvim'
+    assert not txn.path.exists()
+    assert Transaction.pending() == []
+
+
+def test_recover_interrupted_transaction(
+    config: dict[str, str], console: Console, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    txn = Transaction.begin(scan_symlinks(config))
+    real_swap = Transaction._swap
+    calls = 0
+
+    def crash(self: Transaction, *args: object) -> None:
+        nonlocal calls
+        if (calls := calls + 1) == 2:
+            raise KeyboardInterrupt
+        real_swap(self, *args)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(Transaction, '_swap', crash)
+    with pytest.raises(KeyboardInterrupt):
+        txn.apply(console)
+    monkeypatch.undo()
+
+    assert Transaction.pending() == [txn.path]
+    assert Path('/home/user/.config/git/config').is_symlink()
+    assert not Path('/home/user/.config/nvim/config').is_symlink()
+
+    recovered = Transaction.load(txn.path)
+    assert recovered.completed == {0: 'linked'}
+    recovered.apply(console)
+    recovered.commit()
+
+    for source, target in config.items():
+        assert Path(source).resolve() == Path(target)
+    assert Transaction.pending() == []
+
+
+def test_recover_crash_mid_copy(
+    fs: FakeFilesystem, console: Console, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Transactions on another filesystem, so the directory is copied into its backup rather than moved.
+    fs.add_mount_point('/mnt/data')
+    for i in range(5):
+        fs.create_file(f'/home/user/.config/nvim/f{i}.lua', contents=str(i))
+    fs.create_dir('/home/user/dotfiles/nvim')
+    config = {'/home/user/.config/nvim': '/home/user/dotfiles/nvim'}
+    txn = Transaction.begin(scan_symlinks(config), root=Path('/mnt/data/transactions'))
+
+    real_backup_file = backup._backup_file
+    calls = 0
+
+    def crash(*args: Any) -> None:
+        nonlocal calls
+        if (calls := calls + 1) == 2:
+            raise KeyboardInterrupt
+        real_backup_file(*args)
+
+    monkeypatch.setattr(backup, '_backup_file', crash)
+    with pytest.raises(KeyboardInterrupt):
+        txn.apply(console)
+    monkeypatch.undo()
+
+    nvim = Path('/home/user/.config/nvim')
+    assert sorted(path.name for path in nvim.iterdir()) == [f'f{i}.lua' for i in range(5)]
+
+    recovered = Transaction.load(txn.path)
+    assert recovered.completed == {}
+    recovered.apply(console)
+    assert nvim.resolve() == Path('/home/user/dotfiles/nvim')
+
+    recovered.rollback(console)
+    assert not nvim.is_symlink()
+    assert [(nvim / f'f{i}.lua').read_text() for i in range(5)] == [str(i) for i in range(5)]
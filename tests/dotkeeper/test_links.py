@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+
+from pyfakefs.fake_filesystem import FakeFilesystem
+
+from dotkeeper.bench import synthetic_states
+from dotkeeper.links import LinkState, LinkTable, SyscallCounter
+
+
+def test_link_state_syscalls(fs: FakeFilesystem) -> None:
+    source = Path('/home/user/.bashrc')
+    target = Path('/home/user/dotfiles/.bashrc')
+    fs.create_file(target, contents='# bashrc content')
+
+    counter = SyscallCounter()
+    state = LinkState.scan(source, target, counter=counter)
+    assert state.status == 'MISSING'
+    assert not state.source_present
+    assert state.target_exists
+    assert counter.total == 2
+
+    fs.create_symlink(source, target)
+    counter = SyscallCounter()
+    state = LinkState.scan(source, target, counter=counter)
+    assert state.status == 'CORRECT'
+    assert state.source_is_symlink
+    assert state.link_dest == str(target)
+    assert counter.snapshot() == {'stat': 1, 'lstat': 1, 'readlink': 1}
+
+
+def test_link_state_follows_relative_links(fs: FakeFilesystem) -> None:
+    source = Path('/home/user/.vimrc')
+    target = Path('/home/user/dotfiles/.vimrc')
+    fs.create_file(target)
+    fs.create_symlink(source, 'dotfiles/.vimrc')
+
+    counter = SyscallCounter()
+    assert LinkState.scan(source, target, counter=counter).status == 'CORRECT'
+    assert counter.total == 4
+
+
+def test_link_state_dangling_and_directories(fs: FakeFilesystem) -> None:
+    target = Path('/home/user/dotfiles/nvim')
+
+    fs.create_symlink('/home/user/.dangling', target)
+    assert LinkState.scan(Path('/home/user/.dangling'), target).status == 'MISSING'
+    assert LinkState.scan(Path('/home/user/.dangling'), target).source_present
+
+    fs.create_dir('/home/user/.config/nvim')
+    state = LinkState.scan(Path('/home/user/.config/nvim'), target)
+    assert state.status == 'NONLINK'
+    assert state.source_is_dir
+    assert not state.target_exists
+
+    os.remove('/home/user/.dangling')
+    assert LinkState.scan(Path('/home/user/.dangling'), target).status == 'MISSING'
+
+
+def test_link_removed_while_scanned(fs: FakeFilesystem) -> None:
+    source, target = Path('/home/user/.bashrc'), Path('/home/user/dotfiles/.bashrc')
+    fs.create_file(target)
+    fs.create_symlink(source, target)
+
+    class Racing:
+        stat = staticmethod(os.stat)
+        readlink = staticmethod(os.readlink)
+
+        @staticmethod
+        def lstat(path: Path | str) -> os.stat_result:
+            # Someone else removes the link right after it was lstat'ed.
+            result = os.lstat(path)
+            os.remove(path)
+            return result
+
+    state = LinkState.scan(source, target, fs=Racing())
+    assert state.status == 'MISSING'
+    assert not state.source_present
+
+
+def test_link_table_round_trips_states() -> None:
+    states = list(synthetic_states(20))
+    table = LinkTable(states)
+
+    assert len(table) == 20
+    assert list(table) == states
+    assert table[-1] == states[-1]
+    assert list(table[2:4]) == states[2:4]
+    assert table.counts() == {'CORRECT': 14, 'MISSING': 2, 'NONLINK': 2, 'INCORRECT': 2}
+
+    pending = table.select('MISSING', 'NONLINK')
+    assert [state.status for state in pending] == ['MISSING', 'NONLINK'] * 2
+    assert pending.source(0) == str(states[7].source)
+    # Link values that repeat the target share one string object.
+    assert table._link_dests[0] is table._targets[0]
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from rich.console import Console
+
+from dotkeeper.backupstore import BackupStore
+from dotkeeper.cli import scan_symlinks
+from dotkeeper.plan import PlanDrift, apply_plan, build_plan, dump_plan, load_plan, verify_planned_link
+
+
+@pytest.fixture
+def config(fs: FakeFilesystem) -> dict[str, str]:
+    dotfiles = Path('/home/user/dotfiles')
+    for name in ('.bashrc', '.vimrc', '.zshrc'):
+        fs.create_file(dotfiles / name, contents=name)
+    fs.create_symlink('/home/user/.bashrc', dotfiles / '.bashrc')
+    fs.create_file('/home/user/.vimrc', contents='local')
+    return {f'/home/user/{name}': str(dotfiles / name) for name in ('.bashrc', '.vimrc', '.zshrc')}
+
+
+def test_plan_round_trip(config: dict[str, str]) -> None:
+    plan = build_plan(scan_symlinks(config))
+
+    assert [(link.source, link.status) for link in plan.links] == [
+        ('/home/user/.vimrc', 'NONLINK'),
+        ('/home/user/.zshrc', 'MISSING'),
+    ]
+    assert not plan.missing_targets
+
+    Path('/home/user/plan.json').write_bytes(dump_plan(plan))
+    assert load_plan('/home/user/plan.json') == plan
+
+    Path('/home/user/plan.json').write_text('{"host": "h", "links": [], "version": 99}')
+    with pytest.raises(ValueError, match='Unsupported plan version'):
+        load_plan('/home/user/plan.json')
+
+
+def test_apply_plan_without_prompts(config: dict[str, str], console: Console) -> None:
+    plan = build_plan(scan_symlinks(config))
+    store = BackupStore(Path('/home/user/backups'))
+
+    assert apply_plan(console, plan, assume_yes=True, store=store) == 0
+    [snapshot] = store.snapshots()
+    assert snapshot.roots == ['/home/user/.vimrc']
+    for source, target in config.items():
+        assert Path(source).resolve() == Path(target)
+
+    # Re-applying a plan that already took effect is a no-op rather than drift.
+    assert apply_plan(console, plan, assume_yes=True) == 0
+
+
+def test_apply_plan_skips_drifted_links(fs: FakeFilesystem, config: dict[str, str], console: Console) -> None:
+    plan = build_plan(scan_symlinks(config))
+    fs.create_file('/home/user/.zshrc', contents='created after planning')
+
+    with pytest.raises(PlanDrift, match='created'):
+        verify_planned_link(plan.links[1])
+
+    assert apply_plan(console, plan, assume_yes=True) == 1
+    assert Path('/home/user/.vimrc').is_symlink()
+    assert Path('/home/user/.zshrc').read_text() == 'created after planning'
+
+
+def test_unreadable_links_count_as_drift(
+    fs: FakeFilesystem, config: dict[str, str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fs.create_symlink('/home/user/.zshrc', '/home/user/dotfiles/.bashrc')
+    [_, link] = build_plan(scan_symlinks(config)).links
+    assert link.status == 'INCORRECT'
+
+    def removed(path: str) -> str:
+        raise FileNotFoundError(2, 'No such file or directory', path)
+
+    def denied(path: str) -> str:
+        raise PermissionError(13, 'Permission denied', path)
+
+    # Removed between the lstat and the readlink.
+    monkeypatch.setattr('dotkeeper.plan.os.readlink', removed)
+    with pytest.raises(PlanDrift, match='removed'):
+        verify_planned_link(link)
+    monkeypatch.setattr('dotkeeper.plan.os.readlink', denied)
+    with pytest.raises(PlanDrift, match='Permission denied'):
+        verify_planned_link(link)
+
+
+def test_apply_plan_warns_about_missing_targets(
+    config: dict[str, str], console: Console, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    plan = build_plan(scan_symlinks(config))
+    Path('/home/user/dotfiles/.zshrc').unlink()
+    questions: list[str] = []
+
+    def ask(question: str, *args: object, **kwargs: object) -> bool:
+        questions.append(question)
+        return False
+
+    monkeypatch.setattr('rich.prompt.Confirm.ask', ask)
+    with console.capture() as captured:
+        assert apply_plan(console, plan) == 0
+    assert 'do not exist' in captured.get()
+    assert '.zshrc' in captured.get()
+    assert questions == ['Continue anyway?']
+    assert not Path('/home/user/.vimrc').is_symlink()
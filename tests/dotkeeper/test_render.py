@@ -0,0 +1,84 @@
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from rich.console import Console
+
+from dotkeeper import cli, render
+from dotkeeper.cli import iter_symlinks, manage_symlinks
+from dotkeeper.links import LinkState
+from dotkeeper.render import JsonlRenderer, SummaryRenderer, TableRenderer
+
+
+def _config(fs: FakeFilesystem) -> dict[str, str]:
+    fs.create_file('/home/user/dotfiles/.bashrc')
+    fs.create_symlink('/home/user/.bashrc', '/home/user/dotfiles/.bashrc')
+    fs.create_file('/home/user/.vimrc')
+    return {
+        '/home/user/.bashrc': '/home/user/dotfiles/.bashrc',
+        '/home/user/.vimrc': '/home/user/dotfiles/.vimrc',
+        '/home/user/.zshrc': '/home/user/dotfiles/.zshrc',
+    }
+
+
+def test_table_renderer_pages(fs: FakeFilesystem) -> None:
+    console = Console(file=io.StringIO(), width=100, color_system=None)
+
+    with TableRenderer(console, page_size=2) as renderer:
+        renderer.extend(iter_symlinks(_config(fs)))
+
+    lines = console.file.getvalue().splitlines()  # type: ignore[attr-defined]
+    assert [line.split()[0] for line in lines[1:]] == [
+        'Source',
+        '/home/user/.bashrc',
+        '/home/user/.vimrc',
+        'Source',
+        '/home/user/.zshrc',
+    ]
+    assert lines[2].split()[2:] == ['CORRECT', 'EXISTS']
+    assert lines[5].split()[2:] == ['MISSING', 'MISSING']
+
+
+def test_summary_and_jsonl_renderers(fs: FakeFilesystem) -> None:
+    console = Console(file=io.StringIO(), color_system=None)
+    stream = io.BytesIO()
+
+    with SummaryRenderer(console) as summary, JsonlRenderer(stream) as jsonl:
+        for state in iter_symlinks(_config(fs), workers=2):
+            summary.add(state)
+            jsonl.add(state)
+
+    assert console.file.getvalue().splitlines() == [  # type: ignore[attr-defined]
+        '3 links (CORRECT: 1, MISSING: 1, NONLINK: 1)',
+        '2 targets do not exist',
+    ]
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records[1] == {
+        'source': '/home/user/.vimrc',
+        'target': '/home/user/dotfiles/.vimrc',
+        'status': 'NONLINK',
+        'target_exists': False,
+    }
+    assert [Path(record['source']).name for record in records] == ['.bashrc', '.vimrc', '.zshrc']
+
+
+def test_apply_prints_rows_while_scanning(fs: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(render, '_BATCH_ROWS', 1)
+    monkeypatch.setattr('rich.prompt.Confirm.ask', lambda *args, **kwargs: False)
+    console = Console(file=io.StringIO(), width=100, color_system=None)
+    printed = []
+
+    def scan(*args: object, **kwargs: object) -> Iterator[LinkState]:
+        for state in iter_symlinks(*args, **kwargs):  # type: ignore[arg-type]
+            yield state
+            printed.append(str(state.source) in console.file.getvalue())  # type: ignore[attr-defined]
+
+    monkeypatch.setattr(cli, 'iter_symlinks', scan)
+    manage_symlinks(console, _config(fs))
+    assert printed == [True, True, True]
+
+    with pytest.raises(TypeError, match='abstract'):
+        render._BatchingRenderer()  # type: ignore[abstract]
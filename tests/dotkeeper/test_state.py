@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import pytest
+
+from dotkeeper.cli import scan_symlinks
+from dotkeeper.links import SyscallCounter
+from dotkeeper.state import LinkIndex
+
+
+@pytest.fixture
+def home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    monkeypatch.setattr('dotkeeper.state.RACY_WINDOW_NS', 0)
+    (tmp_path / 'dotfiles').mkdir()
+    (tmp_path / 'dotfiles' / '.bashrc').write_text('# bashrc')
+    (tmp_path / 'dotfiles' / '.vimrc').write_text('# vimrc')
+    (tmp_path / 'home').mkdir()
+    (tmp_path / 'home' / '.bashrc').symlink_to(tmp_path / 'dotfiles' / '.bashrc')
+    return tmp_path
+
+
+def test_link_index_reuses_unchanged_links(home: Path) -> None:
+    config = {
+        str(home / 'home' / '.bashrc'): str(home / 'dotfiles' / '.bashrc'),
+        str(home / 'home' / '.vimrc'): str(home / 'dotfiles' / '.vimrc'),
+    }
+
+    index = LinkIndex.load()
+    first = scan_symlinks(config, workers=1, index=index)
+    index.save()
+    assert [state.status for state in first] == ['CORRECT', 'MISSING']
+    assert index.reused == 0
+
+    counter = SyscallCounter()
+    index = LinkIndex.load()
+    second = scan_symlinks(config, workers=1, counter=counter, index=index)
+    index.save()
+    assert second == first
+    assert index.reused == 2
+    assert counter.snapshot() == {'stat': 2}  # one per distinct parent directory
+
+    (home / 'home' / '.vimrc').symlink_to(home / 'dotfiles' / '.vimrc')
+    index = LinkIndex.load()
+    third = scan_symlinks(config, workers=1, index=index)
+    assert [state.status for state in third] == ['CORRECT', 'CORRECT']
+    assert index.reused == 0
+
+
+def test_link_index_full_and_discard(home: Path) -> None:
+    config = {str(home / 'home' / '.bashrc'): str(home / 'dotfiles' / '.bashrc')}
+
+    index = LinkIndex.load()
+    scan_symlinks(config, index=index)
+    index.save()
+
+    index = LinkIndex.load(full=True)
+    scan_symlinks(config, index=index)
+    assert index.reused == 0
+    index.discard([home / 'home' / '.bashrc'])
+    index.save()
+
+    index = LinkIndex.load()
+    scan_symlinks(config, index=index)
+    assert index.reused == 0
+
+    config = {str(home / 'home' / '.bashrc'): str(home / 'dotfiles' / '.vimrc')}
+    index.save()
+    index = LinkIndex.load()
+    assert [state.status for state in scan_symlinks(config, index=index)] == ['INCORRECT']
+    assert index.reused == 0
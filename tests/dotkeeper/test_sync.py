@@ -0,0 +1,90 @@
+import errno
+import os
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from dotkeeper import sync
+from dotkeeper.backupstore import BackupStore
+from dotkeeper.models import Config
+from dotkeeper.sync import SyncReport, apply_copy, copy_file, plan_copy, sync_copies
+
+
+def test_copy_mode_syncs_only_changes(tmp_path: Path, console: Console) -> None:
+    dotfiles, home = tmp_path / 'dotfiles', tmp_path / 'home'
+    (dotfiles / 'app' / 'themes').mkdir(parents=True)
+    (dotfiles / 'app' / 'settings.json').write_text('{"theme": "dark"}\n')
+    (dotfiles / 'app' / 'themes' / 'dark.json').write_text('{}\n')
+    (dotfiles / 'app' / 'current').symlink_to('themes/dark.json')
+    (home / '.app').mkdir(parents=True)
+    (home / '.app' / 'settings.json').write_text('{"theme": "light"}\n')
+    (home / '.app' / 'state.db').write_text('kept')
+
+    config = Config.from_dict(
+        {
+            'dotfiles': {
+                'links': {
+                    str(home / '.zshrc'): str(dotfiles / 'zshrc'),
+                    str(home / '.app'): {'target': str(dotfiles / 'app'), 'mode': 'copy'},
+                }
+            }
+        }
+    )
+    assert config.all_links() == {str(home / '.zshrc'): str(dotfiles / 'zshrc')}
+    copies = config.copies()
+    assert copies == {str(home / '.app'): str(dotfiles / 'app')}
+
+    store = BackupStore(tmp_path / 'store')
+    assert sync_copies(console, copies, assume_yes=True, store=store)
+    assert (home / '.app' / 'settings.json').read_text() == '{"theme": "dark"}\n'
+    assert (home / '.app' / 'themes' / 'dark.json').read_text() == '{}\n'
+    assert os.readlink(home / '.app' / 'current') == 'themes/dark.json'
+    assert (home / '.app' / 'state.db').read_text() == 'kept'
+    assert (
+        os.stat(home / '.app' / 'settings.json').st_mtime_ns
+        == os.stat(dotfiles / 'app' / 'settings.json').st_mtime_ns
+    )
+    [snapshot] = store.snapshots()
+    assert snapshot.roots == [str(home / '.app' / 'settings.json')]
+
+    # Nothing changed, so nothing is read or written.
+    assert plan_copy(home / '.app', dotfiles / 'app') == ([], 2)
+
+    # A rewrite with the same contents only needs its metadata fixed; a real change is copied alone.
+    (dotfiles / 'app' / 'themes' / 'dark.json').write_text('{}\n')
+    (dotfiles / 'app' / 'settings.json').write_text('{"theme": "dusk"}\n')
+    actions, _ = plan_copy(home / '.app', dotfiles / 'app')
+    assert [(action.destination.name, action.action) for action in actions] == [
+        ('settings.json', 'copy'),
+        ('dark.json', 'metadata'),
+    ]
+    report = SyncReport()
+    apply_copy(actions, report)
+    assert report.copied == 1
+    assert (home / '.app' / 'settings.json').read_text() == '{"theme": "dusk"}\n'
+    assert plan_copy(home / '.app', dotfiles / 'app') == ([], 2)
+
+
+def test_copy_file_falls_back_when_zero_copy_is_unsupported(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def unsupported(*_args: object) -> int:
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    origin = tmp_path / 'origin'
+    origin.write_bytes(os.urandom(3 << 20))
+    origin.chmod(0o600)
+    (tmp_path / 'destination').symlink_to(origin)
+
+    strategy, size = copy_file(origin, tmp_path / 'destination')
+    assert strategy in {'copy_file_range', 'sendfile'}
+    assert size == 3 << 20
+
+    monkeypatch.setattr(sync.os, 'copy_file_range', unsupported, raising=False)
+    monkeypatch.setattr(sync.os, 'sendfile', unsupported, raising=False)
+    assert copy_file(origin, tmp_path / 'copy') == ('read', 3 << 20)
+    for copy in (tmp_path / 'destination', tmp_path / 'copy'):
+        assert not copy.is_symlink()
+        assert copy.read_bytes() == origin.read_bytes()
+        assert copy.stat().st_mode == origin.stat().st_mode
@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from dotkeeper.credentials import CredentialResolver, MemoryBackend
+from dotkeeper.templates import BYTECODE_DIR, TemplateEngine
+
+
+@pytest.fixture
+def dotfiles(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    root = tmp_path / 'dotfiles'
+    (root / 'git').mkdir(parents=True)
+    (root / 'base.j2').write_text('[user]\n  name = {{ user }}\n{% block extra %}{% endblock %}')
+    (root / 'git' / 'gitconfig.j2').write_text(
+        "{% extends 'base.j2' %}{% block extra %}[core]\n  editor = {{ editor }}\n{% endblock %}"
+    )
+    (root / 'netrc.j2').write_text("password {{ secret('mem://work/netrc') }}\n")
+    return root
+
+
+def test_render_only_writes_changes(dotfiles: Path, tmp_path: Path) -> None:
+    home = tmp_path / 'home'
+    templates = {home / '.gitconfig': dotfiles / 'git' / 'gitconfig.j2'}
+
+    def render(editor: str) -> dict[str, list[Path]]:
+        engine = TemplateEngine(templates, context={'user': 'alice', 'editor': editor}, root=dotfiles)
+        report = engine.render()
+        assert not report.errors
+        return report.results
+
+    assert render('vim') == {'rendered': [home / '.gitconfig']}
+    assert (home / '.gitconfig').read_text() == '[user]\n  name = alice\n[core]\n  editor = vim\n'
+    assert any((tmp_path / 'cache' / BYTECODE_DIR).iterdir())
+
+    os.utime(home / '.gitconfig', ns=(0, 0))
+    mtime = (home / '.gitconfig').stat().st_mtime_ns
+    assert render('vim') == {'unchanged': [home / '.gitconfig']}
+    assert (home / '.gitconfig').stat().st_mtime_ns == mtime
+
+    assert render('nano') == {'rendered': [home / '.gitconfig']}
+    assert 'editor = nano' in (home / '.gitconfig').read_text()
+
+
+def test_render_secrets_in_one_batch(dotfiles: Path, tmp_path: Path) -> None:
+    backend = MemoryBackend({'mem://work/netrc': 's3cret'})
+    templates = {
+        tmp_path / 'home' / '.netrc': dotfiles / 'netrc.j2',
+        tmp_path / 'other' / '.netrc': dotfiles / 'netrc.j2',
+        tmp_path / 'home' / '.gitconfig': dotfiles / 'git' / 'gitconfig.j2',
+    }
+    resolver = CredentialResolver([backend])
+    engine = TemplateEngine(templates, context={'user': 'alice'}, resolver=resolver, root=dotfiles)
+    report = engine.render()
+
+    assert backend.batches == [['mem://work/netrc']]
+    assert (tmp_path / 'home' / '.netrc').read_text() == 'password s3cret\n'
+    assert (tmp_path / 'home' / '.netrc').stat().st_mode & 0o777 == 0o600
+    assert report.count('rendered') == 2
+    assert list(report.errors) == [tmp_path / 'home' / '.gitconfig']
+    assert "'editor' is undefined" in report.errors[tmp_path / 'home' / '.gitconfig']
+
+
+def test_secret_from_included_template_is_private(dotfiles: Path, tmp_path: Path) -> None:
+    (dotfiles / 'creds.j2').write_text("token = {{ secret ('mem://work/token') }}\n")
+    (dotfiles / 'netrc.j2').write_text("{% include 'creds.j2' %}")
+    (dotfiles / 'netrc.j2').chmod(0o644)
+    output = tmp_path / 'home' / '.netrc'
+    resolver = CredentialResolver([MemoryBackend({'mem://work/token': 's3cret'})])
+
+    report = TemplateEngine(
+        {output: dotfiles / 'netrc.j2'}, context={}, resolver=resolver, root=dotfiles
+    ).render()
+    assert not report.errors
+    assert output.read_text() == 'token = s3cret\n'
+    assert output.stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,45 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from dotkeeper import tracing
+from dotkeeper.backup import backup_item
+
+
+@pytest.mark.parametrize('name', ['trace.json', 'trace.jsonl'])
+def test_spans_count_filesystem_calls_and_bytes(tmp_path: Path, name: str) -> None:
+    source = tmp_path / '.zshrc'
+    source.write_text('x' * 100)
+
+    with tracing.trace(tmp_path / name):
+        with tracing.span('outer', host_group='laptops'):
+            with tracing.span('backup') as span:
+                assert span is not None
+                backup_item(source, tmp_path / 'backup')
+            tracing.count({'lstat': 3})
+        with pytest.raises(FileNotFoundError), tracing.span('failing'):
+            os.rename(tmp_path / 'missing', tmp_path / 'elsewhere')
+    with tracing.span('untraced') as span:
+        assert span is None
+
+    if name.endswith('.jsonl'):
+        spans = {
+            event['span']: event for event in map(json.loads, (tmp_path / name).read_text().splitlines())
+        }
+    else:
+        trace = json.loads((tmp_path / name).read_text())
+        assert trace['otherData']['host']
+        spans = {event['name']: event['args'] for event in trace['traceEvents'] if event['ph'] == 'X'}
+        assert all(event['dur'] >= 0 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+    assert sorted(spans) == ['backup', 'failing', 'outer']
+    assert spans['backup']['bytes_copied'] == 100
+    assert spans['backup']['fs']['shutil.copyfile'] == 1
+    assert spans['outer']['host_group'] == 'laptops'
+    assert spans['outer']['bytes_copied'] == 100
+    assert spans['outer']['fs']['lstat'] == 3
+    assert spans['outer']['fs_ops'] == spans['backup']['fs_ops'] + 3
+    assert spans['failing']['error'] == 'FileNotFoundError'
+    assert spans['failing']['fs'] == {'os.rename': 1}
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from dotkeeper.models import Config, TreeRule
+from dotkeeper.trees import PatternSet, expand_tree_rules, walk_tree
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / 'dotfiles' / 'config'
+    for path in (
+        'nvim/init.lua',
+        'nvim/.init.lua.swp',
+        'nvim/lazy-lock.json',
+        'git/config',
+        'git/.git/HEAD',
+        'alacritty/alacritty.toml',
+        'alacritty/themes/dark.toml',
+    ):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(path)
+    return root
+
+
+def test_walk_tree_prunes_excluded_directories(tree: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    include = PatternSet(['*.lua', '*.toml', 'git/*'])
+    exclude = PatternSet(['.git', '*.swp', 'alacritty/themes'])
+
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr('os.scandir', lambda path: scanned.append(path) or scandir(path))
+
+    assert sorted(walk_tree(str(tree), include, exclude)) == [
+        'alacritty/alacritty.toml',
+        'git/config',
+        'nvim/init.lua',
+    ]
+    assert not any('.git' in path or 'themes' in path for path in scanned)
+    assert sorted(walk_tree(str(tree), PatternSet([]), PatternSet([]))) == [
+        'alacritty/alacritty.toml',
+        'alacritty/themes/dark.toml',
+        'git/.git/HEAD',
+        'git/config',
+        'nvim/.init.lua.swp',
+        'nvim/init.lua',
+        'nvim/lazy-lock.json',
+    ]
+
+
+def test_tree_rules_feed_links(tree: Path, tmp_path: Path) -> None:
+    home = tmp_path / 'home'
+    rule = TreeRule(source=str(home / '.config'), target=str(tree), exclude=['.git', '*.swp', 'nvim/lazy-*'])
+    assert expand_tree_rules([rule]) == {
+        str(home / '.config' / path): str(tree / path)
+        for path in ('alacritty/alacritty.toml', 'alacritty/themes/dark.toml', 'git/config', 'nvim/init.lua')
+    }
+
+    config = Config.from_dict(
+        {
+            'dotfiles': {
+                'links': {str(home / '.config' / 'git' / 'config'): '/elsewhere'},
+                'trees': [rule.model_dump()],
+            }
+        }
+    )
+    links = config.all_links()
+    assert len(links) == 4
+    assert links[str(home / '.config' / 'git' / 'config')] == '/elsewhere'
+
+
+def test_explicit_links_override_trees_under_tilde(
+    tree: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    home = tmp_path / 'home'
+    monkeypatch.setenv('HOME', str(home))
+    config = Config.from_dict(
+        {
+            'dotfiles': {
+                'links': {'~/.config/git/config': '/elsewhere'},
+                'trees': [{'source': '~/.config', 'target': str(tree), 'include': ['git/*']}],
+            }
+        }
+    )
+    assert config.all_links() == {str(home / '.config' / 'git' / 'config'): '/elsewhere'}
+    assert config.all_links(home='/srv/ci') == {'/srv/ci/.config/git/config': '/elsewhere'}
+
+
+def test_copies_are_not_tree_links(tree: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    home = tmp_path / 'home'
+    monkeypatch.setenv('HOME', str(home))
+    config = Config.from_dict(
+        {
+            'dotfiles': {
+                'links': {'~/.config/git/config': {'target': str(tree / 'git' / 'config'), 'mode': 'copy'}},
+                'trees': [{'source': '~/.config', 'target': str(tree), 'include': ['git/*', '*.lua']}],
+            }
+        }
+    )
+    assert config.all_links() == {
+        str(home / '.config' / 'nvim' / 'init.lua'): str(tree / 'nvim' / 'init.lua')
+    }
+    assert config.copies() == {'~/.config/git/config': str(tree / 'git' / 'config')}
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pyrage
+import pytest
+
+from dotkeeper.vault import SecretStore, cipher_path, generate_identity, load_identity
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> SecretStore:
+    monkeypatch.setattr('dotkeeper.cache.get_cache_dir', lambda: tmp_path / 'cache')
+    generate_identity(tmp_path / 'identity.txt')
+    return SecretStore(tmp_path / 'identity.txt', workers=2)
+
+
+def test_encrypt_and_decrypt_skip_unchanged(tmp_path: Path, store: SecretStore) -> None:
+    secrets = [tmp_path / '.netrc', tmp_path / '.pgpass']
+    for path in secrets:
+        path.write_text(f'secret {path.name}')
+
+    assert store.encrypt(secrets).count('encrypted') == 2
+    ciphertext = cipher_path(secrets[0]).read_bytes()
+    assert b'secret' not in ciphertext
+    assert store.encrypt(secrets).count('unchanged') == 2
+    assert cipher_path(secrets[0]).read_bytes() == ciphertext
+
+    for path in secrets:
+        path.unlink()
+    report = SecretStore(store.identity_path).decrypt([*secrets, tmp_path / '.missing'])
+    assert report.count('decrypted') == 2
+    assert report.count('missing') == 1
+    assert secrets[1].read_text() == 'secret .pgpass'
+    assert secrets[1].stat().st_mode & 0o777 == 0o600
+
+    # Nothing changed: the identity is not even loaded.
+    fresh = SecretStore(tmp_path / 'does-not-exist')
+    assert fresh.decrypt(secrets).count('unchanged') == 2
+
+    # Local edits are never overwritten by a decrypt.
+    secrets[0].write_text('edited')
+    assert fresh.decrypt(secrets).results == {'modified': [secrets[0]], 'unchanged': [secrets[1]]}
+    assert secrets[0].read_text() == 'edited'
+
+
+def test_load_passphrase_protected_identity(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    generate_identity(tmp_path / 'plain.txt')
+    protected = tmp_path / 'protected.age'
+    protected.write_bytes(b'age-encryption.org/v1\n-> scrypt ...')
+
+    with pytest.raises(ValueError, match='passphrase-protected'):
+        load_identity(protected)
+
+    # Real scrypt unlocking takes seconds; only the unlock count matters here.
+    def unlock(data: bytes, passphrase: str) -> bytes:
+        assert data.startswith(b'age-encryption.org/')
+        assert passphrase == 'hunter2'  # noqa: S105
+        return (tmp_path / 'plain.txt').read_bytes()
+
+    monkeypatch.setattr(pyrage.passphrase, 'decrypt', unlock)
+    calls = []
+    store = SecretStore(protected, passphrase=lambda: calls.append(1) or 'hunter2')
+    assert str(store.identity) == str(load_identity(tmp_path / 'plain.txt'))
+    assert str(store.identity.to_public()) in (tmp_path / 'plain.txt').read_text()
+    assert calls == [1]
@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from dotkeeper.backupstore import BackupStore
+from dotkeeper.links import LinkState
+from dotkeeper.watch import LinkWatcher, watch_links
+
+pytestmark = pytest.mark.skipif(sys.platform != 'linux', reason='inotify is Linux only')
+
+
+@pytest.fixture
+def links(tmp_path: Path) -> list[tuple[Path, Path]]:
+    (tmp_path / 'dotfiles').mkdir()
+    (tmp_path / 'home').mkdir()
+    pairs = []
+    for name in ('.bashrc', '.vimrc'):
+        target = tmp_path / 'dotfiles' / name
+        target.write_text(name)
+        (tmp_path / 'home' / name).symlink_to(target)
+        pairs.append((tmp_path / 'home' / name, target))
+    return pairs
+
+
+def test_watcher_reports_only_affected_links(links: list[tuple[Path, Path]]) -> None:
+    (bashrc, _), (vimrc, vimrc_target) = links
+
+    with LinkWatcher(links) as watcher:
+        assert watcher.watched == 2
+        assert watcher.poll(timeout=0) == []
+
+        # A tool replacing the managed symlink with a regular file.
+        tmp = bashrc.with_name('.bashrc.tmp')
+        tmp.write_text('rewritten')
+        tmp.replace(bashrc)
+        changes = watcher.poll(timeout=5)
+        assert [(old.source, old.status, new.status) for old, new in changes] == [
+            (bashrc, 'CORRECT', 'NONLINK')
+        ]
+
+        vimrc_target.unlink()
+        changes = watcher.poll(timeout=5)
+        assert [(new.source, new.status) for _, new in changes] == [(vimrc, 'MISSING')]
+        assert watcher.states[bashrc].status == 'NONLINK'
+
+
+def test_repairs_back_up_to_the_given_store(
+    links: list[tuple[Path, Path]], tmp_path: Path, monkeypatch: pytest.MonkeyPatch, console: Console
+) -> None:
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'data'))
+    (bashrc, target), _ = links
+    store = BackupStore(tmp_path / 'store')
+    real_poll = LinkWatcher.poll
+    polls = 0
+
+    def poll(self: LinkWatcher) -> list[tuple[LinkState, LinkState]]:
+        nonlocal polls
+        if (polls := polls + 1) > 1:
+            raise KeyboardInterrupt
+        bashrc.unlink()
+        bashrc.write_text('rewritten')
+        return real_poll(self, timeout=5)
+
+    monkeypatch.setattr(LinkWatcher, 'poll', poll)
+    watch_links(console, links, repair=True, store=store)
+
+    assert bashrc.resolve() == target
+    [snapshot] = store.snapshots()
+    assert snapshot.roots == [str(bashrc)]